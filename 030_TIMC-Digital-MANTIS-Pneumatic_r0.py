@@ -12,14 +12,46 @@
 # The purge channels do not use a solenoid. Mechanical relays provide power
 # to the pressure regulators, and the solenoids are controlled by solid
 # state relays.
+#
+# Update:
+#   Channels are opened by the attachment engine as the Phidget Manager finds them on the network instead of
+#   waiting 5 seconds on each one. Buttons are enabled once their channel attaches and the regulator set
+#   pressure is re-applied if a hub reconnects.
+#   Set pressure, regulator power and solenoid commands are queued to a dispatcher instead of being sent from
+#   the Tk handlers. Only the newest set pressure is sent when the slider moves faster than the network.
+#   Pressures, set pressures, low pressure alarms, regulator power and solenoid states are recorded to
+#   memory-mapped segment files under ./telemetry (timc_telemetry), TIMC_TELEMETRY=off turns the recording off.
+#   F2 opens a strip chart of the last 5 minutes of every channel pressure (timc_chart).
+#   The pressure polls of all channels run in one 200 ms tick of a scheduler with a single Tk after hook
+#   (timc_tk) instead of one root.after chain per channel, its lateness per task is printed on exit.
+#   Powering a channel down no longer sleeps in the Tk handler: zero pressure, cut the regulator power and restore
+#   the scale are timed steps on the scheduler, so the GUI stays live and several channels can power down at once.
+#   SAFE ALL sets every powered channel to zero pressure at once after one confirmation, waits until the pressure
+#   readings have dropped below SAFE_PRESSURE and then powers all the regulators off, and shows how long it took.
+#   The pressure inputs stream their readings (PRESSURE_INTERVAL) to change handlers that store them in one shared
+#   buffer; a single 200 ms display tick shows the newest reading of every channel, so the GUI thread no longer
+#   reads nine sensors over the network five times a second. Every reading is recorded and charted as it arrives.
+#   Timed work belonging to a channel is owned by it: starting it again replaces the running task instead of adding
+#   a second loop. F3 prints the scheduled tasks per channel with their rate and the reading rate of every channel.
+#   A lag monitor beats every 10 ms on the Tk thread; when the GUI is blocked for more than 100 ms the Tk thread
+#   stack is printed while it is stuck, and a lag histogram and the stall locations are printed on exit.
+#   HOLD on a channel regulates it closed loop (timc_pressure): every 100 ms one PI update of all channels trims the
+#   regulator command against the measured pressure, so the channel reaches its set pressure faster and holds it
+#   against a leak. The trim is limited to +/- 15 PSI and the command never goes above the top of the channel's set
+#   pressure scale; unchecked channels and vented channels are set open loop.
+#   Phidget channel classes come from timc_devices, run with TIMC_BACKEND=sim to use the simulated cabinet.
 
 from tkinter import *
-from Phidget22.Devices.VoltageRatioInput import *
-from Phidget22.Devices.DigitalOutput import *
-from Phidget22.Devices.VoltageOutput import *
-from Phidget22.Net import *
+from timc_devices import VoltageRatioInput, DigitalOutput, VoltageOutput, Net, PhidgetServerType, link_regulator
+from timc_devices import ChannelSpec, AttachmentEngine, CommandDispatcher
+from timc_telemetry import open_recorder
+from timc_chart import StripChart
+from timc_tk import Scheduler, LagMonitor, HIGH
+from timc_current import CurrentBuffer
+from timc_pressure import PressureLoop
 from tkinter import messagebox
 import time
+import numpy as np
 
 rainbow = ['SteelBlue1', 'DarkGoldenrod1', 'PaleGreen3','LightBlue3','DarkSlateGray3', 'MistyRose3','LightYellow3', 'dark khaki', 'LightSalmon2', 'chocolate1']
 blue_checkers = ['LightSkyBlue1', 'LightSkyBlue3','LightSkyBlue1', 'LightSkyBlue3','LightSkyBlue1', 'LightSkyBlue3','LightSkyBlue1', 'LightSkyBlue3','LightSkyBlue1', 'LightSkyBlue3']
@@ -32,6 +64,24 @@ orange_checkers = ['DarkOrange2', 'DarkOrange4','DarkOrange2', 'DarkOrange4','Da
 MAXPR = 130.5 #Default maximum pressure of the ITV1050-21N2BL4 Pressure regulator
 MINPR = 0.0
 
+#Time between the steps of a channel power down (ms): zero pressure, regulator power off, scale restored
+POWER_DOWN_STEP = 500
+
+#SAFE ALL waits for every channel to read below SAFE_PRESSURE (PSI), for at most VENT_TIMEOUT (s)
+SAFE_PRESSURE = 2.0
+VENT_TIMEOUT = 10.0
+
+#Pressure readings are streamed every PRESSURE_INTERVAL ms and shown every PRESSURE_TICK ms
+PRESSURE_INTERVAL = 100
+PRESSURE_TICK = 200
+
+#Closed loop channels are trimmed every LOOP_TICK ms, a reading older than LOOP_STALE (s) is not regulated on
+LOOP_TICK = 100
+LOOP_STALE = 0.5
+
+#Air channel states
+OFF, ON, POWERING_DOWN = 0, 1, 2
+
 #System A
 SN = "030"
 HUB1 = 538774
@@ -97,10 +147,37 @@ HYD_ROP = [INTER, 0]
 #Line required to look for Phidget devices on the network
 Net.enableServerDiscovery(PhidgetServerType.PHIDGETSERVER_DEVICEREMOTE)
 
+#All periodic and delayed work of the Tk thread, one root.after hook for the earliest deadline
+scheduler = Scheduler()
+#Stalls of the Tk thread over 100 ms are reported with the stack they were in
+monitor = LagMonitor(interval=10, threshold=100)
+
+#Channels are opened by the attachment engine as the Phidget Manager finds them on the network
+#Commands from the GUI are sent by the dispatcher threads so the Tk handlers do not wait on the network
+dispatcher = CommandDispatcher()
+engine = AttachmentEngine(dispatcher)
+
+#Pressures, set pressures, regulator power and solenoid states are recorded for the whole session
+recorder = open_recorder('Pneumatic_' + SN)
+dispatcher.observers.append(recorder.command)
+chart = StripChart('Pressure - S/N: ' + SN, 'PSI', rainbow, scheduler)
+
+#Newest pressure readings of every channel, written by the VoltageRatioInput change handlers
+pressures = CurrentBuffer(max_axes=9, capacity=64, windows=(1.0,))
+pneumatic_frames = []
+#Closed loop trim of the regulator commands, per channel enable (HOLD)
+regulation = PressureLoop(max_channels=9, high=MAXPR)
+
+def reading_spec(reg_get):
+    #One of the VINT Hubs on the SBC is used and needs special configuration
+    if reg_get[0] == SBCH:
+        return ChannelSpec(VoltageRatioInput, reg_get[0], 0, reg_get[1], is_hub_port_device=True)
+    return ChannelSpec(VoltageRatioInput, reg_get[0], None, reg_get[1])
+
 class SetupMainWindow:
     def __init__(self):
         self.gui_width = 450
-        self.gui_height = 695
+        self.gui_height = 730
 
 class MainWindow:
     def __init__(self, master, parameters):
@@ -112,6 +189,10 @@ class MainWindow:
         #Create Frame for Pneumatics Control
         self.out1 = PneumaticControlFrame(self.master, blue_checkers)
 
+        #F2 opens/closes the pressure strip chart, F3 lists the scheduled tasks and reading rates
+        self.master.bind('<KeyPress-F2>', lambda event: chart.toggle(self.master))
+        self.master.bind('<KeyPress-F3>', lambda event: list_tasks())
+
 class popupWindow(object):
     def __init__(self, master):
         top=self.top=Toplevel(master)
@@ -136,7 +217,7 @@ class PneumaticFrame1:
         self.master = master
         self.frame_name = StringVar()
         self.frame_name.set(initial_name)
-        self.state = 0
+        self.state = OFF
         self.fontType = "Comic Sans"
         self.activeColor = 'SpringGreen4'
         self.frameColor = color
@@ -154,6 +235,8 @@ class PneumaticFrame1:
         self.custom_label = Label(self.frame, textvariable=self.frame_name, font=(self.fontType, 14), bg=color)
         self.label = Label(self.frame, text=initial_name, bg=color)
         self.lock = Checkbutton(self.frame, text="LOCK", bg=color, variable = self.lock_flag, command= self.lock)
+        self.hold_flag = IntVar()
+        self.hold = Checkbutton(self.frame, text="HOLD", bg=color, variable=self.hold_flag, command=self.toggle_hold)
 
         #Init the pressure scale to the default value
         self.set_pressure_scale.set(PSI)
@@ -161,7 +244,8 @@ class PneumaticFrame1:
 
         self.frame.rowconfigure(0, minsize=30)
         self.custom_label.grid(row=0, column=0, columnspan=2, sticky=S)
-        self.set_label.grid(column=0, row=1, columnspan=2)
+        self.set_label.grid(column=0, row=1)
+        self.hold.grid(column=1, row=1)
         self.frame.rowconfigure(2, minsize=50)
         self.power.grid(column=0, row=2)
         self.observed_pressure.grid(column=1, row=2)
@@ -172,93 +256,132 @@ class PneumaticFrame1:
         self.label.grid(column=0, row=5)
         self.lock.grid(column=1, row=5)
 
+        #Power stays disabled until the regulator power relay has attached
+        self.setpoint = float(PSI)
+        self.channel_name = initial_name
+        self.observed = None
+        self.power.config(state=DISABLED)
+
         # Connect to Phidget Solid State Relay for solinoid control
-        self.solenoid_switch = DigitalOutput()
-        self.solenoid_switch.setDeviceSerialNumber(sol[0])
-        self.solenoid_switch.setIsHubPortDevice(False)
-        self.solenoid_switch.setHubPort(sol[1])
-        self.solenoid_switch.setChannel(sol[2])
-        self.solenoid_switch.openWaitForAttachment(5000)
+        self.solenoid_switch = engine.bind(ChannelSpec(DigitalOutput, sol[0], sol[1], sol[2]))
+        recorder.watch(self.solenoid_switch, 'setState', initial_name + ' solenoid', 'state')
 
         #Connect to Phidget Solid State Relay for regulator power control
-        self.reg_switch = DigitalOutput()
-        self.reg_switch.setDeviceSerialNumber(reg_pwr[0])
-        self.reg_switch.setIsHubPortDevice(False)
-        self.reg_switch.setHubPort(reg_pwr[1])
-        self.reg_switch.setChannel(reg_pwr[2])
-        self.reg_switch.openWaitForAttachment(5000)
+        self.reg_switch = engine.bind(ChannelSpec(DigitalOutput, reg_pwr[0], reg_pwr[1], reg_pwr[2]),
+                                      lambda: engine.post(self.enable_power), lambda: engine.post(self.disable_power))
 
         #Connect to Phidget Voltage Ouptut for pressure control
-        self.pressure_ctrl = VoltageOutput()
-        self.pressure_ctrl.setDeviceSerialNumber(reg_set[0])
-        self.pressure_ctrl.setIsHubPortDevice(False)
-        self.pressure_ctrl.setHubPort(reg_set[1])
-        self.pressure_ctrl.setChannel(reg_set[2])
-        self.pressure_ctrl.openWaitForAttachment(5000)
+        self.pressure_ctrl = engine.bind(ChannelSpec(VoltageOutput, reg_set[0], reg_set[1], reg_set[2]), self.apply_pressure)
 
         #Connect to Phidget Analog Input for pressure reading
-        self.pressure_reading = VoltageRatioInput()
-        self.pressure_reading.setDeviceSerialNumber(reg_get[0])
-
-        #One of the VINT Hubs on the SBC is used and needs special configuration
-        if reg_get[0] == SBCH:
-            self.pressure_reading.setIsHubPortDevice(True)
-            self.pressure_reading.setHubPort(0)
-
-        self.pressure_reading.setChannel(reg_get[1])
-        self.pressure_reading.openWaitForAttachment(5000)
+        self.pressure_index = pressures.register(initial_name)
+        pneumatic_frames.append(self)
+        #HOLD never commands more than the operator could set on the scale
+        regulation.configure(self.pressure_index, high=float(self.set_pressure_scale.cget('to')))
+        regulation.set(self.pressure_index, self.setpoint)
+        self.pressure_reading = engine.bind(reading_spec(reg_get), self.on_reading_attach)
+        engine.remember(self.pressure_reading, 'setDataInterval', PRESSURE_INTERVAL)
+
+        #Telemetry channels, the regulator power and solenoid are recorded as they are commanded
+        self.pressure_channel = recorder.channel(initial_name + ' pressure', 'pressure', 'PSI')
+        self.setpoint_channel = recorder.channel(initial_name + ' set pressure', 'setpoint', 'PSI')
+        self.alarm_channel = recorder.channel(initial_name + ' low pressure', 'alarm')
+        self.chart_series = chart.series(initial_name)
+        recorder.watch(self.reg_switch, 'setState', initial_name + ' power', 'state')
+        recorder.watch(self.pressure_ctrl, 'setVoltage', initial_name + ' command', 'command', 'V')
+        self.hold_channel = recorder.channel(initial_name + ' hold', 'state')
+        link_regulator(reg_pwr, reg_set, reg_get)
+
+    #Called on the Phidget event thread, restores the last command when the regulator output (re)attaches
+    def apply_pressure(self):
+        self.pressure_ctrl.setVoltage(float(regulation.sent[self.pressure_index]) * 5 / (MAXPR - MINPR))
+
+    #Called on the Phidget event thread, every reading from then on arrives at update_reading
+    def on_reading_attach(self):
+        self.pressure_reading.setVoltageRatioChangeTrigger(0.0)
+        self.pressure_reading.setOnVoltageRatioChangeHandler(self.update_reading)
+
+    #Called on the Phidget event thread for every reading: stored for the display tick and regulation, and recorded
+    #and charted at the full rate with the time it arrived while the regulator is powered
+    def update_reading(self, trash, ratio):
+        PSI = ratio * 165.63 - 30.855
+        pressures.add(self.pressure_index, PSI)
+        if self.state != OFF and dispatcher.latest(self.reg_switch, 'setState', False):
+            recorder.record(self.pressure_channel, PSI)
+            recorder.record(self.alarm_channel, PSI < (self.setpoint - 3))
+            chart.add(self.chart_series, PSI)
+
+    def enable_power(self):
+        if not self.lock_flag.get():
+            self.power.config(state=NORMAL)
+
+    def disable_power(self):
+        self.power.config(state=DISABLED)
 
     def toggle_pwr(self):
-        #Turn on air channel
-        if self.state == 0:
+        if not self.reg_switch.getAttached():
+            return
+        #Turn on air channel, a click while the channel is powering down is ignored
+        if self.state == OFF:
             #Turn on power to regulator and show active button color
             self.power.config(bg=self.activeColor)
-            self.reg_switch.setState(True)
+            dispatcher.submit(self.reg_switch, 'setState', True)
 
             #Enable Extend and Retract buttons
             self.extend.config(state=NORMAL)
             self.retract.config(state=NORMAL)
 
-            #Start monitoring air pressure
-            self.update_pressure()
-
             #Change state of air channel
-            self.state = 1
+            self.state = ON
 
-        #Turn off air channel
-        elif self.state == 1:
-            remember_state = self.set_pressure_scale.get()
+        #Turn off air channel, the power down steps run on the scheduler
+        elif self.state == ON:
             messagebox.showinfo(self.frame_name.get()+" Warning",
                                 "Pressure will be set to zero. Acknowledge that " +self.frame_name.get()+" is in a safe configuration")
-            # Change pressure to zero
-            self.set_pressure_scale.set(0)
-            self.set_pressure(0)
-            time.sleep(0.5)
-            self.frame.update()
-            self.reg_switch.setState(False)
-            time.sleep(0.5)
-            self.set_pressure_scale.set(remember_state)
-
-            #Turn off power to reguluator and remove active button color
-            self.power.config(bg="SystemButtonFace")
-
-            #Turn off power to solenoid which changes the state to Extend, disable buttons
-            self.extend.config(state=DISABLED, bg=self.activeColor)
-            self.retract.config(state=DISABLED, bg="SystemButtonFace")
-            self.solenoid_extend()
-
-            #Update air channel state
-            self.state = 0
+            self.power_down()
+
+    def power_down(self):
+        remember_state = self.vent()
+        scheduler.sequence([(POWER_DOWN_STEP, self.cut_power),
+                            (POWER_DOWN_STEP, lambda: self.finish_power_down(remember_state))],
+                           name='power down', owner=self.channel_name)
+
+    #Change pressure to zero with the regulator still powered, returns the set pressure to restore afterwards
+    def vent(self):
+        self.state = POWERING_DOWN
+        remember_state = self.set_pressure_scale.get()
+        self.set_pressure_scale.set(0)
+        self.set_pressure(0)
+        return remember_state
+
+    def cut_power(self):
+        dispatcher.submit(self.reg_switch, 'setState', False)
+
+    def finish_power_down(self, remember_state):
+        self.set_pressure_scale.set(remember_state)
+
+        #Turn off power to reguluator and remove active button color
+        self.power.config(bg="SystemButtonFace")
+
+        #Turn off power to solenoid which changes the state to Extend, disable buttons
+        self.extend.config(state=DISABLED, bg=self.activeColor)
+        self.retract.config(state=DISABLED, bg="SystemButtonFace")
+        self.solenoid_extend()
+
+        #Update air channel state
+        self.state = OFF
 
     def solenoid_retract(self):
         self.extend.config(bg="SystemButtonFace")
         self.retract.config(bg=self.activeColor)
-        self.solenoid_switch.setState(True)
+        if self.solenoid_switch.getAttached():
+            dispatcher.submit(self.solenoid_switch, 'setState', True)
 
     def solenoid_extend(self):
         self.retract.config(bg="SystemButtonFace")
         self.extend.config(bg=self.activeColor)
-        self.solenoid_switch.setState(False)
+        if self.solenoid_switch.getAttached():
+            dispatcher.submit(self.solenoid_switch, 'setState', False)
 
     def get_label_input(self):
         self.window = popupWindow(self.master)
@@ -279,53 +402,70 @@ class PneumaticFrame1:
         range = MAXPR - MINPR
         # Calculate volts/PSI, the maximum control voltage the regulator will accept is 5V
         ratio = 5 / range
-        self.pressure_ctrl.setVoltage(float(val) * ratio)
-
-    def update_pressure(self):
-        if self.reg_switch.getState():
-            try:
-                val = float(self.pressure_reading.getSensorValue())
-                PSI = val * 165.63 - 30.855
-                PSI = round(PSI,2)
-                self.pressure.set(PSI)
-                # Low pressure check
-                if PSI < (self.set_pressure_scale.get() - 3):
-                    if self.frame.cget('bg') == "Red":
-                        self.frame.config(bg=self.frameColor)
-                        self.set_pressure_scale.config(bg=self.frameColor)
-                        self.custom_label.config(bg=self.frameColor)
-                        self.label.config(bg=self.frameColor)
-                        self.lock.config(bg=self.frameColor)
-                    else:
-                        self.frame.config(bg='Red')
-                        self.set_pressure_scale.config(bg="Red")
-                        self.custom_label.config(bg="Red")
-                        self.label.config(bg="Red")
-                        self.lock.config(bg="Red")
-                if PSI > (self.set_pressure_scale.get() - 3):
-                    if self.frame.cget('bg') == "Red":
-                        self.frame.config(bg=self.frameColor)
-                        self.set_pressure_scale.config(bg=self.frameColor)
-                        self.custom_label.config(bg=self.frameColor)
-                        self.label.config(bg=self.frameColor)
-                        self.lock.config(bg=self.frameColor)
-
-            except:
-                print("Init Air Pressure")
-            root.after(200, self.update_pressure)
+        self.setpoint = float(val)
+        recorder.record(self.setpoint_channel, self.setpoint)
+        #A channel on HOLD keeps its trim, regulate_pressures corrects it from the next tick
+        command = regulation.set(self.pressure_index, self.setpoint)
+        if self.pressure_ctrl.getAttached():
+            dispatcher.submit(self.pressure_ctrl, 'setVoltage', command * ratio, stop=command == 0)
+
+    #Unchecking HOLD returns the channel to its open loop command on the next regulation tick
+    def toggle_hold(self):
+        regulation.enabled[self.pressure_index] = bool(self.hold_flag.get())
+        recorder.record(self.hold_channel, self.hold_flag.get())
+
+    #Called by show_pressures on the display tick with the newest reading (None before the first), no Phidget I/O:
+    #the regulator power is taken from the last command and the channel state. A channel being vented
+    #(POWERING_DOWN) is still shown, SAFE ALL waits on its reading.
+    def update_pressure(self, PSI):
+        if not dispatcher.latest(self.reg_switch, 'setState', False):
+            self.pressure.set("")
+            self.observed = None
+        elif self.state != OFF and PSI is not None:
+            PSI = round(PSI, 2)
+            self.observed = PSI
+            self.pressure.set(PSI)
+            # Low pressure check
+            if PSI < (self.set_pressure_scale.get() - 3):
+                if self.frame.cget('bg') == "Red":
+                    self.frame.config(bg=self.frameColor)
+                    self.set_pressure_scale.config(bg=self.frameColor)
+                    self.custom_label.config(bg=self.frameColor)
+                    self.label.config(bg=self.frameColor)
+                    self.lock.config(bg=self.frameColor)
+                    self.hold.config(bg=self.frameColor)
+                else:
+                    self.frame.config(bg='Red')
+                    self.set_pressure_scale.config(bg="Red")
+                    self.custom_label.config(bg="Red")
+                    self.label.config(bg="Red")
+                    self.lock.config(bg="Red")
+                    self.hold.config(bg="Red")
+            if PSI > (self.set_pressure_scale.get() - 3):
+                if self.frame.cget('bg') == "Red":
+                    self.frame.config(bg=self.frameColor)
+                    self.set_pressure_scale.config(bg=self.frameColor)
+                    self.custom_label.config(bg=self.frameColor)
+                    self.label.config(bg=self.frameColor)
+                    self.lock.config(bg=self.frameColor)
+                    self.hold.config(bg=self.frameColor)
         else:
             self.pressure.set("")
+
     def lock(self):
         if self.lock_flag.get() == True:
             self.extend.config(state="disabled")
             self.retract.config(state="disabled")
             self.set_pressure_scale.config(state="disabled")
             self.power.config(state="disable")
+            self.hold.config(state="disabled")
         elif self.lock_flag.get() == False:
             self.extend.config(state="normal")
             self.retract.config(state="normal")
             self.set_pressure_scale.config(state="normal")
-            self.power.config(state="normal")
+            self.hold.config(state="normal")
+            if self.reg_switch.getAttached():
+                self.power.config(state="normal")
 class PneumaticFrame2:
     def __init__(self, master, initial_name, top_name, color, sol, reg_pwr, reg_set, reg_get, PSI):
         self.frame = Frame(master, borderwidth=2, relief=SUNKEN, bg=color)
@@ -333,7 +473,7 @@ class PneumaticFrame2:
         self.master = master
         self.frame_name = StringVar()
         self.frame_name.set(initial_name)
-        self.state = 0
+        self.state = OFF
         self.fontType = "Comic Sans"
         self.activeColor = 'SpringGreen4'
         self.frameColor = color
@@ -354,6 +494,8 @@ class PneumaticFrame2:
         self.custom_label = Label(self.frame, textvariable=self.frame_name, font=(self.fontType, 14), bg=color)
         self.label = Label(self.frame, text=initial_name, bg=color)
         self.lock = Checkbutton(self.frame, text="LOCK", bg=color, variable=self.lock_flag, command=self.lock)
+        self.hold_flag = IntVar()
+        self.hold = Checkbutton(self.frame, text="HOLD", bg=color, variable=self.hold_flag, command=self.toggle_hold)
         self.frame_name.set(top_name)
 
         # Init the pressure scale to the default value.
@@ -363,10 +505,12 @@ class PneumaticFrame2:
             self.lock.select()
             self.set_pressure_scale.config(state="disabled")
             self.power.config(state="disable")
+            self.hold.config(state="disabled")
 
         self.frame.rowconfigure(0, minsize=30)
         self.custom_label.grid(row=0, column=0, columnspan=2, sticky=S)
-        self.set_label.grid(column=0, row=1, columnspan=2)
+        self.set_label.grid(column=0, row=1)
+        self.hold.grid(column=1, row=1)
         self.frame.rowconfigure(2, minsize=50)
         self.power.grid(column=0, row=2)
         self.observed_pressure.grid(column=1, row=2)
@@ -375,84 +519,122 @@ class PneumaticFrame2:
         self.label.grid(column=0, row=5)
         self.lock.grid(column=1, row=5)
 
+        #Power stays disabled until the regulator power relay has attached
+        self.setpoint = float(PSI)
+        self.channel_name = initial_name
+        self.observed = None
+        self.power.config(state=DISABLED)
+
         # Connect to Phidget Solid State Relay for solinoid control
         if self.frame_name.get() == "Hydro":
-            self.solenoid_switch = DigitalOutput()
-            self.solenoid_switch.setDeviceSerialNumber(sol[0])
-            self.solenoid_switch.setIsHubPortDevice(False)
-            self.solenoid_switch.setHubPort(sol[1])
-            self.solenoid_switch.setChannel(sol[2])
-            self.solenoid_switch.openWaitForAttachment(5000)
+            self.solenoid_switch = engine.bind(ChannelSpec(DigitalOutput, sol[0], sol[1], sol[2]))
+            recorder.watch(self.solenoid_switch, 'setState', initial_name + ' solenoid', 'state')
 
         #Connect to Phidget Solid State Relay for regulator power control
-        self.reg_switch = DigitalOutput()
-        self.reg_switch.setDeviceSerialNumber(reg_pwr[0])
-        self.reg_switch.setIsHubPortDevice(False)
-        self.reg_switch.setHubPort(reg_pwr[1])
-        self.reg_switch.setChannel(reg_pwr[2])
-        self.reg_switch.openWaitForAttachment(5000)
+        self.reg_switch = engine.bind(ChannelSpec(DigitalOutput, reg_pwr[0], reg_pwr[1], reg_pwr[2]),
+                                      lambda: engine.post(self.enable_power), lambda: engine.post(self.disable_power))
 
         #Connect to Phidget Voltage Ouptut for pressure control
-        self.pressure_ctrl = VoltageOutput()
-        self.pressure_ctrl.setDeviceSerialNumber(reg_set[0])
-        self.pressure_ctrl.setIsHubPortDevice(False)
-        self.pressure_ctrl.setHubPort(reg_set[1])
-        self.pressure_ctrl.setChannel(reg_set[2])
-        self.pressure_ctrl.openWaitForAttachment(5000)
+        self.pressure_ctrl = engine.bind(ChannelSpec(VoltageOutput, reg_set[0], reg_set[1], reg_set[2]), self.apply_pressure)
 
         #Connect to Phidget Analog Input for pressure reading
-        self.pressure_reading = VoltageRatioInput()
-        self.pressure_reading.setDeviceSerialNumber(reg_get[0])
-
-        #One of the VINT Hubs on the SBC is used and needs special configuration
-        if reg_get[0] == SBCH:
-            self.pressure_reading.setIsHubPortDevice(True)
-            self.pressure_reading.setHubPort(0)
-
-        self.pressure_reading.setChannel(reg_get[1])
-        self.pressure_reading.openWaitForAttachment(5000)
+        self.pressure_index = pressures.register(initial_name)
+        pneumatic_frames.append(self)
+        #HOLD never commands more than the operator could set on the scale
+        regulation.configure(self.pressure_index, high=float(self.set_pressure_scale.cget('to')))
+        regulation.set(self.pressure_index, self.setpoint)
+        self.pressure_reading = engine.bind(reading_spec(reg_get), self.on_reading_attach)
+        engine.remember(self.pressure_reading, 'setDataInterval', PRESSURE_INTERVAL)
+
+        #Telemetry channels, the regulator power and solenoid are recorded as they are commanded
+        self.pressure_channel = recorder.channel(initial_name + ' pressure', 'pressure', 'PSI')
+        self.setpoint_channel = recorder.channel(initial_name + ' set pressure', 'setpoint', 'PSI')
+        self.alarm_channel = recorder.channel(initial_name + ' low pressure', 'alarm')
+        self.chart_series = chart.series(initial_name)
+        recorder.watch(self.reg_switch, 'setState', initial_name + ' power', 'state')
+        recorder.watch(self.pressure_ctrl, 'setVoltage', initial_name + ' command', 'command', 'V')
+        self.hold_channel = recorder.channel(initial_name + ' hold', 'state')
+        link_regulator(reg_pwr, reg_set, reg_get)
+
+    #Called on the Phidget event thread, restores the last command when the regulator output (re)attaches
+    def apply_pressure(self):
+        self.pressure_ctrl.setVoltage(float(regulation.sent[self.pressure_index]) * 5 / (MAXPR - MINPR))
+
+    #Called on the Phidget event thread, every reading from then on arrives at update_reading
+    def on_reading_attach(self):
+        self.pressure_reading.setVoltageRatioChangeTrigger(0.0)
+        self.pressure_reading.setOnVoltageRatioChangeHandler(self.update_reading)
+
+    #Called on the Phidget event thread for every reading: stored for the display tick and regulation, and recorded
+    #and charted at the full rate with the time it arrived while the regulator is powered
+    def update_reading(self, trash, ratio):
+        PSI = ratio * 165.63 - 30.855
+        pressures.add(self.pressure_index, PSI)
+        if self.state != OFF and dispatcher.latest(self.reg_switch, 'setState', False):
+            recorder.record(self.pressure_channel, PSI)
+            recorder.record(self.alarm_channel, PSI < (self.setpoint - 3))
+            chart.add(self.chart_series, PSI)
+
+    def enable_power(self):
+        if not self.lock_flag.get():
+            self.power.config(state=NORMAL)
+
+    def disable_power(self):
+        self.power.config(state=DISABLED)
 
     def toggle_pwr(self):
-        #Turn on air channel
-        if self.state == 0:
+        if not self.reg_switch.getAttached():
+            return
+        #Turn on air channel, a click while the channel is powering down is ignored
+        if self.state == OFF:
             #Turn on power to regulator and show active button color
             self.power.config(bg=self.activeColor)
-            self.reg_switch.setState(True)
-            if self.frame_name.get() == "Hydro":
-                self.solenoid_switch.setState(True)
-
-            #Start monitoring air pressure
-            self.update_pressure()
+            dispatcher.submit(self.reg_switch, 'setState', True)
+            if self.frame_name.get() == "Hydro" and self.solenoid_switch.getAttached():
+                dispatcher.submit(self.solenoid_switch, 'setState', True)
 
             #Change state of air channel
-            self.state = 1
+            self.state = ON
 
-        #Turn off air channel
-        elif self.state == 1:
-            remember_state = self.set_pressure_scale.get()
+        #Turn off air channel, the power down steps run on the scheduler
+        elif self.state == ON:
             if self.frame_name.get() != "Hydro":
                 messagebox.showinfo(self.frame_name.get() + " Warning",
                                     "Pressure will be set to zero. Acknowledge that " + self.frame_name.get() + " is in a safe configuration")
+            self.power_down()
+
+    def power_down(self):
+        remember_state = self.vent()
+        scheduler.sequence([(POWER_DOWN_STEP, self.cut_power),
+                            (POWER_DOWN_STEP, lambda: self.finish_power_down(remember_state))],
+                           name='power down', owner=self.channel_name)
+
+    #Change pressure to zero with the regulator still powered, returns the set pressure to restore afterwards
+    def vent(self):
+        self.state = POWERING_DOWN
+        remember_state = self.set_pressure_scale.get()
+        self.set_pressure_scale.set(0)
+        self.set_pressure(0)
+        return remember_state
+
+    def cut_power(self):
+        dispatcher.submit(self.reg_switch, 'setState', False)
+
+    def finish_power_down(self, remember_state):
+        self.set_pressure_scale.set(remember_state)
+        if self.frame_name.get() == "Hydro":
+            if self.solenoid_switch.getAttached():
+                dispatcher.submit(self.solenoid_switch, 'setState', False)
+            self.lock.select()
+            self.set_pressure_scale.config(state="disabled")
+            self.power.config(state="disable")
+            self.hold.config(state="disabled")
+
+        #Turn off power to reguluator and remove active button color
+        self.power.config(bg="SystemButtonFace")
 
-            # Change pressure to zero
-            self.set_pressure_scale.set(0)
-            self.set_pressure(0)
-            time.sleep(0.5)
-            self.frame.update()
-            self.reg_switch.setState(False)
-            time.sleep(0.5)
-            self.set_pressure_scale.set(remember_state)
-            if self.frame_name.get() == "Hydro":
-                self.solenoid_switch.setState(False)
-                self.lock.select()
-                self.set_pressure_scale.config(state="disabled")
-                self.power.config(state="disable")
-
-            #Turn off power to reguluator and remove active button color
-            self.power.config(bg="SystemButtonFace")
-
-            #Update air channel state
-            self.state = 0
+        #Update air channel state
+        self.state = OFF
 
     def get_label_input(self):
         self.window = popupWindow(self.master)
@@ -473,39 +655,53 @@ class PneumaticFrame2:
         range = MAXPR - MINPR
         # Calculate volts/PSI
         ratio = 5 / range
-        self.pressure_ctrl.setVoltage(float(val) * ratio)
-
-    def update_pressure(self):
-        if self.reg_switch.getState():
-            try:
-                val = float(self.pressure_reading.getSensorValue())
-                PSI = val * 165.63 - 30.855
-                PSI = round(PSI, 2)
-                self.pressure.set(PSI)
-                #Low pressure check
-                if PSI < (self.set_pressure_scale.get() - 3):
-                    if self.frame.cget('bg') == "Red":
-                        self.frame.config(bg=self.frameColor)
-                        self.set_pressure_scale.config(bg=self.frameColor)
-                        self.custom_label.config(bg=self.frameColor)
-                        self.label.config(bg=self.frameColor)
-                        self.lock.config(bg=self.frameColor)
-                    else:
-                        self.frame.config(bg = 'Red')
-                        self.set_pressure_scale.config(bg = "Red")
-                        self.custom_label.config(bg = "Red")
-                        self.label.config(bg="Red")
-                        self.lock.config(bg="Red")
-                if PSI > (self.set_pressure_scale.get() - 3):
-                    if self.frame.cget('bg') == "Red":
-                        self.frame.config(bg=self.frameColor)
-                        self.set_pressure_scale.config(bg=self.frameColor)
-                        self.custom_label.config(bg=self.frameColor)
-                        self.label.config(bg=self.frameColor)
-                        self.lock.config(bg=self.frameColor)
-            except:
-                print("Init Air Pressure")
-            root.after(200, self.update_pressure)
+        self.setpoint = float(val)
+        recorder.record(self.setpoint_channel, self.setpoint)
+        #A channel on HOLD keeps its trim, regulate_pressures corrects it from the next tick
+        command = regulation.set(self.pressure_index, self.setpoint)
+        if self.pressure_ctrl.getAttached():
+            dispatcher.submit(self.pressure_ctrl, 'setVoltage', command * ratio, stop=command == 0)
+
+    #Unchecking HOLD returns the channel to its open loop command on the next regulation tick
+    def toggle_hold(self):
+        regulation.enabled[self.pressure_index] = bool(self.hold_flag.get())
+        recorder.record(self.hold_channel, self.hold_flag.get())
+
+    #Called by show_pressures on the display tick with the newest reading (None before the first), no Phidget I/O:
+    #the regulator power is taken from the last command and the channel state. A channel being vented
+    #(POWERING_DOWN) is still shown, SAFE ALL waits on its reading.
+    def update_pressure(self, PSI):
+        if not dispatcher.latest(self.reg_switch, 'setState', False):
+            self.pressure.set("")
+            self.observed = None
+        elif self.state != OFF and PSI is not None:
+            PSI = round(PSI, 2)
+            self.observed = PSI
+            self.pressure.set(PSI)
+            # Low pressure check
+            if PSI < (self.set_pressure_scale.get() - 3):
+                if self.frame.cget('bg') == "Red":
+                    self.frame.config(bg=self.frameColor)
+                    self.set_pressure_scale.config(bg=self.frameColor)
+                    self.custom_label.config(bg=self.frameColor)
+                    self.label.config(bg=self.frameColor)
+                    self.lock.config(bg=self.frameColor)
+                    self.hold.config(bg=self.frameColor)
+                else:
+                    self.frame.config(bg='Red')
+                    self.set_pressure_scale.config(bg="Red")
+                    self.custom_label.config(bg="Red")
+                    self.label.config(bg="Red")
+                    self.lock.config(bg="Red")
+                    self.hold.config(bg="Red")
+            if PSI > (self.set_pressure_scale.get() - 3):
+                if self.frame.cget('bg') == "Red":
+                    self.frame.config(bg=self.frameColor)
+                    self.set_pressure_scale.config(bg=self.frameColor)
+                    self.custom_label.config(bg=self.frameColor)
+                    self.label.config(bg=self.frameColor)
+                    self.lock.config(bg=self.frameColor)
+                    self.hold.config(bg=self.frameColor)
         else:
             self.pressure.set("")
 
@@ -513,9 +709,12 @@ class PneumaticFrame2:
         if self.lock_flag.get() == True:
             self.set_pressure_scale.config(state="disabled")
             self.power.config(state="disable")
+            self.hold.config(state="disabled")
         elif self.lock_flag.get() == False:
             self.set_pressure_scale.config(state="normal")
-            self.power.config(state="normal")
+            self.hold.config(state="normal")
+            if self.reg_switch.getAttached():
+                self.power.config(state="normal")
 
 class PneumaticControlFrame:
     def __init__(self, master, colorArray):
@@ -548,7 +747,99 @@ class PneumaticControlFrame:
         out7 = PneumaticFrame2(frame7, "Purge #1", "Standard Purge", 'DarkOliveGreen3', 0, PG1_RP, PG1_RSP, PG1_ROP, 25)
         out8 = PneumaticFrame2(frame8, "Purge #2", "Wrist Purge", 'DarkOliveGreen2', 0, PG2_RP, PG2_RSP, PG2_ROP, 25)
         out9 = PneumaticFrame2(frame9, "Hydro", "Hydro", 'DarkOrange2', HYD_RP, HYD_S, HYD_RSP, HYD_ROP, 95)
+        self.channels = [out1, out2, out3, out4, out5, out6, out7, out8, out9]
+
+        self.safe_all_btn = Button(master, text="SAFE ALL", command=self.safe_all)
+        self.safe_status = Label(master, text="")
+        self.safe_all_btn.grid(row=3, column=0)
+        self.safe_status.grid(row=3, column=1, columnspan=2, sticky=W)
+        self.vent_check = None
+
+    #Every powered channel to zero pressure, regulators off once the readings show they have vented
+    def safe_all(self):
+        channels = [channel for channel in self.channels if channel.state == ON]
+        if not channels:
+            self.safe_status.config(text="All channels are off")
+            return
+        if not messagebox.askokcancel("Safe All Warning", "Pressure will be set to zero and the regulators powered off "
+                                      "on all channels. Acknowledge that the system is in a safe configuration"):
+            return
+        self.safe_all_btn.config(state=DISABLED)
+        self.safe_status.config(text="Venting %d channels" % len(channels))
+        start = time.perf_counter()
+        remembered = [(channel, channel.vent()) for channel in channels]
+        self.vent_check = scheduler.every(100, lambda: self.check_vented(remembered, start), name='vent check',
+                                          owner='SAFE ALL')
+
+    def check_vented(self, remembered, start):
+        #A channel without a reading does not hold up the others
+        waiting = [channel for channel, remember_state in remembered
+                   if channel.observed is not None and channel.observed > SAFE_PRESSURE]
+        if waiting and time.perf_counter() - start < VENT_TIMEOUT:
+            return
+        scheduler.cancel(self.vent_check)
+        for channel, remember_state in remembered:
+            channel.cut_power()
+        scheduler.after(POWER_DOWN_STEP, lambda: self.finish_safe_all(remembered, start, waiting), name='power off',
+                        owner='SAFE ALL')
+
+    def finish_safe_all(self, remembered, start, waiting):
+        for channel, remember_state in remembered:
+            channel.finish_power_down(remember_state)
+        report = "%d channels safe in %.1f s" % (len(remembered), time.perf_counter() - start)
+        if waiting:
+            report += ", not below %.0f PSI: %s" % (SAFE_PRESSURE, ", ".join(channel.frame_name.get() for channel in waiting))
+        print(report)
+        self.safe_status.config(text=report)
+        self.safe_all_btn.config(state=NORMAL)
+
+#One display tick for the pressures of all channels
+def show_pressures():
+    latest = pressures.latest()
+    for pneumatic_frame in pneumatic_frames:
+        index = pneumatic_frame.pressure_index
+        pneumatic_frame.update_pressure(float(latest[index]) if pressures.samples[index] else None)
+
+
+#One closed loop update of all channels, only channels on HOLD that are powered and reading are trimmed
+def regulate_pressures():
+    now = time.perf_counter()
+    count = len(pneumatic_frames)
+    fresh = pressures.times[:count].max(axis=1) >= now - LOOP_STALE
+    powered = np.array([pneumatic_frame.state == ON for pneumatic_frame in pneumatic_frames])
+    for index in regulation.update(now, pressures.latest(), fresh & powered):
+        pneumatic_frame = pneumatic_frames[index]
+        if pneumatic_frame.pressure_ctrl.getAttached():
+            dispatcher.submit(pneumatic_frame.pressure_ctrl, 'setVoltage',
+                              float(regulation.command[index]) * 5 / (MAXPR - MINPR))
+
+
+#Scheduled tasks per channel, and how many readings each channel has streamed since the last listing
+last_listing = [time.perf_counter(), [0] * 9]
+def list_tasks():
+    now = time.perf_counter()
+    print(scheduler.listing())
+    print('Pressure readings since the last listing (%.0f s):' % (now - last_listing[0]))
+    for pneumatic_frame in pneumatic_frames:
+        index = pneumatic_frame.pressure_index
+        rate = (pressures.samples[index] - last_listing[1][index]) / (now - last_listing[0])
+        hold = ''
+        if regulation.enabled[index]:
+            hold = ', HOLD trim %+.2f PSI' % (regulation.command[index] - regulation.setpoint[index])
+        print('  %-28s %6.1f readings/s, data interval %d ms%s' % (pneumatic_frame.channel_name, rate, PRESSURE_INTERVAL, hold))
+    last_listing[:] = [now, list(pressures.samples)]
+
 
 root = Tk()
 TIMC = MainWindow(root, SetupMainWindow())
+engine.start()
+scheduler.start(root)
+monitor.start(scheduler)
+engine.pump(scheduler)
+scheduler.every(PRESSURE_TICK, show_pressures, name='pressure display')
+scheduler.every(LOOP_TICK, regulate_pressures, HIGH, 'pressure loop')
 root.mainloop()
+recorder.close()
+monitor.stop()
+print(scheduler.report())
+print(monitor.report())
@@ -20,14 +20,53 @@
 #   Added another RJ overview camera.
 #   Added exception for running the GUI offline.
 #   Changed key binding definitions such that either camera may be operated via the gamepad.
+#
+# Revision TC Update:
+#   Phidget channels are opened in the background instead of waiting 5 seconds on each one in turn. The GUI is
+#   built immediately and each widget is enabled once the channel it drives has attached.
+#   A Phidget Manager announces the channels on the network and each channel is opened when it appears, so a
+#   missing hub no longer delays startup (off-line mode) and its widgets enable if it is plugged in later.
+#   Widgets are disabled while their channel is detached. A detached channel is re-opened in the background with
+#   exponential backoff; on reattach the axis is stopped and its current limit and acceleration are restored, the
+#   camera motion outputs are zeroed and the camera power and light levels are restored.
+#   Jog, pan/tilt, focus/zoom and light commands are queued to a dispatcher instead of being sent from the Tk
+#   handlers. Each output only keeps its newest setpoint and stop commands are sent first, so a slow network no
+#   longer freezes the GUI or builds up a backlog of stale moves.
+#   The keyboard/gamepad keys are read into a set of held keys and turned into axis and camera commands on a 50 Hz
+#   tick (timc_input). Only changes are sent, so a held key is one command instead of an autorepeat stream.
+#   The all stop (focus lost or Escape) writes zero to every axis and camera motion output at the same time
+#   instead of one after the other, including the camera not linked to the gamepad, and prints how long it took.
+#   Phidget handlers no longer touch Tk, Phidget callbacks are queued to one Tk pump drained in batches (timc_tk).
+#   The motor current readings of all axes are stored in one NumPy ring buffer (timc_current); mean, RMS, peak and
+#   slope over 1 s, 10 s and 60 s are computed for all axes at once every 100 ms and the display shows the 1 s mean.
+#   The motor over current lockout is an I2t thermal model of every axis updated on the same tick, replacing the
+#   3 s timer that was cancelled and re-armed on every current reading. The 3 s over half the current limit / 8 s
+#   lockout rule is kept next to it as a backstop for a stall between half and the full limit, which the I2t model is
+#   slow to trip on.
+#   Motor current is read every 50 ms while an axis is commanded or drawing current and every 1 s when idle, instead
+#   of every 100 ms from all axes all the time.
+#   Motor currents, commanded velocities, lockouts and camera commands are recorded to memory-mapped segment files
+#   under ./telemetry (timc_telemetry), TIMC_TELEMETRY=off turns the recording off.
+#   F2 opens a strip chart of the last 5 minutes of every motor current (timc_chart).
+#   The input tick, Phidget callback pump, current display, strip chart and delayed starts run from one scheduler
+#   with a single Tk after hook (timc_tk), its lateness per task is printed on exit.
+#   Timed work belonging to an axis is owned by it: starting it again (e.g. on a reconnect) replaces the pending
+#   task instead of adding another. F3 prints the scheduled tasks per axis and the current reading rate of every axis.
+#   A lag monitor beats every 10 ms on the Tk thread; when the GUI is blocked for more than 100 ms the Tk thread
+#   stack is printed while it is stuck, and a lag histogram and the stall locations are printed on exit.
+#   Phidget channel classes come from timc_devices, run with TIMC_BACKEND=sim to use the simulated cabinet.
 
 
 from tkinter import *
-from Phidget22.Devices.DCMotor import *
-from Phidget22.Devices.CurrentInput import *
-from Phidget22.Devices.DigitalOutput import *
-from Phidget22.Devices.VoltageOutput import *
-from Phidget22.Net import *
+import time
+import numpy as np
+from timc_devices import DCMotor, CurrentInput, DigitalOutput, VoltageOutput, Net, PhidgetServerType
+from timc_devices import ChannelSpec, AttachmentEngine, CommandDispatcher, StopPath
+from timc_input import KeyStateEngine
+from timc_current import CurrentBuffer, ThermalModel, OverCurrentTimer, AdaptiveSampling
+from timc_telemetry import open_recorder
+from timc_chart import StripChart
+from timc_tk import Scheduler, LagMonitor, LOW
 
 rainbow = ['SteelBlue1', 'DarkGoldenrod1', 'PaleGreen3', 'LightBlue3', 'DarkSlateGray3', 'MistyRose3', 'LightYellow3', 'dark khaki',
            'LightSalmon2', 'chocolate1']
@@ -104,6 +143,59 @@ HUB3 = 671893
 # Current Multiplier
 MULT = 1
 
+# Rev TC Note: time allowed for the hubs to show up on the network before they are reported as off-line
+HUB_PROBE_TIME = 2.0
+
+# Rev TC Note: all periodic and delayed work of the Tk thread, one root.after hook for the earliest deadline
+scheduler = Scheduler()
+# Rev TC Note: a blocked Tk thread delays jog releases, stalls over 100 ms are reported with the stack they were in
+monitor = LagMonitor(interval=10, threshold=100)
+
+# Channels are opened by the attachment engine as the Phidget Manager finds them on the network
+# Rev TC Note: commands from the GUI are sent by the dispatcher threads, a Tk handler never waits on the network
+dispatcher = CommandDispatcher()
+engine = AttachmentEngine(dispatcher)
+# Rev TC Note: the all stop writes every motion output at once from its own threads
+stops = StopPath(dispatcher)
+# Held keys are turned into axis and camera commands on a 50 Hz tick, only changes are sent
+keys = KeyStateEngine(dispatcher)
+# Rev TC Note: the current readings of all axes go into one buffer, the statistics are updated every CURRENT_TICK ms
+currents = CurrentBuffer()
+axis_frames = []
+CURRENT_TICK = 100
+
+# Rev TC Note: motor over current protection, an I2t model of every axis updated on the same tick. The defaults trip
+# after about 3 s at the current limit and release after about 7 s. At 60 % of the limit the model takes 12 s and just
+# above 50 % it never trips, so the earlier rule (3 s over half the limit, locked out for 8 s) still runs as a backstop.
+THERMAL_TAU = 10.0  # s, motor thermal time constant
+THERMAL_RATED = 0.5  # continuous current as a fraction of the current limit
+thermal = ThermalModel(tau=THERMAL_TAU)
+backstop = OverCurrentTimer(fraction=0.5, hold=3.0, lockout=8.0)
+
+# Rev TC Note: current readings every 50 ms while an axis is commanded or drawing current, every 1 s once it has been
+# idle for 2 s. A commanded axis is always sampled fast, so the over current trip time is unchanged.
+sampling = AdaptiveSampling(fast=50, slow=1000, threshold=0.1, hold=2.0)
+
+# Rev TC Note: currents, commanded velocities, lockouts and camera commands are recorded for the whole session
+recorder = open_recorder('Electrical_' + SN)
+dispatcher.observers.append(recorder.command)
+chart = StripChart('Motor Current - S/N: ' + SN, 'A', rainbow, scheduler)
+
+
+def enable_widgets(widgets):
+    for widget in widgets:
+        widget.config(state=NORMAL)
+
+
+def disable_widgets(widgets):
+    for widget in widgets:
+        widget.config(state=DISABLED)
+
+
+def when_enabled(func):
+    # Disabled buttons still deliver mouse events, ignore them until the channel behind the button has attached
+    return lambda event: None if str(event.widget.cget('state')) == DISABLED else func()
+
 
 class SetupMainWindow:
     def __init__(self):
@@ -120,75 +212,43 @@ class MainWindow:
         # Create Frame for Pnematics Control
         self.out0 = ControlFrame(master, blue_checkers)
 
-        # Base Key Tool Movements
-        master.bind('<KeyPress-w>', lambda event: self.out0.out2.jog("+"))
-        master.bind('<KeyRelease-w>', lambda event: self.out0.out2.jog("0"))
-        master.bind('<KeyPress-s>', lambda event: self.out0.out2.jog("-"))
-        master.bind('<KeyRelease-s>', lambda event: self.out0.out2.jog("0"))
-        master.bind('<KeyPress-d>', lambda event: self.out0.out1.jog("+"))
-        master.bind('<KeyRelease-d>', lambda event: self.out0.out1.jog("0"))
-        master.bind('<KeyPress-a>', lambda event: self.out0.out1.jog("-"))
-        master.bind('<KeyRelease-a>', lambda event: self.out0.out1.jog("0"))
-
-        # Vard Key Tool Movements
-        master.bind('<KeyPress-5>', lambda event: self.out0.out4.jog("+"))
-        master.bind('<KeyRelease-5>', lambda event: self.out0.out4.jog("0"))
-        master.bind('<KeyPress-2>', lambda event: self.out0.out4.jog("-"))
-        master.bind('<KeyRelease-2>', lambda event: self.out0.out4.jog("0"))
-        master.bind('<KeyPress-3>', lambda event: self.out0.out3.jog("+"))
-        master.bind('<KeyRelease-3>', lambda event: self.out0.out3.jog("0"))
-        master.bind('<KeyPress-1>', lambda event: self.out0.out3.jog("-"))
-        master.bind('<KeyRelease-1>', lambda event: self.out0.out3.jog("0"))
-
-        # Camera Movements
-        # Revision B Note: Action on key strike for camera made more general in order to control mult. cameras.
-        master.bind('<KeyPress-Left>', lambda event: self.out0.pan_move_gen("L"))
-        master.bind('<KeyRelease-Left>', lambda event: self.out0.pan_move_gen("0"))
-        master.bind('<KeyPress-Right>', lambda event: self.out0.pan_move_gen("R"))
-        master.bind('<KeyRelease-Right>', lambda event: self.out0.pan_move_gen("0"))
-        master.bind('<KeyPress-Up>', lambda event: self.out0.tilt_move_gen("-"))
-        master.bind('<KeyRelease-Up>', lambda event: self.out0.tilt_move_gen("0"))
-        master.bind('<KeyPress-Down>', lambda event: self.out0.tilt_move_gen("+"))
-        master.bind('<KeyRelease-Down>', lambda event: self.out0.tilt_move_gen("0"))
-
-        master.bind('<KeyPress-plus>', lambda event: self.out0.zoom_gen("+"))
-        master.bind('<KeyRelease-plus>', lambda event: self.out0.zoom_gen("0"))
-        master.bind('<KeyPress-minus>', lambda event: self.out0.zoom_gen("-"))
-        master.bind('<KeyRelease-minus>', lambda event: self.out0.zoom_gen("0"))
-
-        master.bind('<KeyPress-Insert>', lambda event: self.out0.focus_gen("+"))
-        master.bind('<KeyRelease-Insert>', lambda event: self.out0.focus_gen("0"))
-        master.bind('<KeyPress-Delete>', lambda event: self.out0.focus_gen("-"))
-        master.bind('<KeyRelease-Delete>', lambda event: self.out0.focus_gen("0"))
-
-        # Mast Movements
-        master.bind('<KeyPress-Prior>', lambda event: self.out0.out5.jog("+"))
-        master.bind('<KeyRelease-Prior>', lambda event: self.out0.out5.jog("0"))
-        master.bind('<KeyPress-Next>', lambda event: self.out0.out5.jog("-"))
-        master.bind('<KeyRelease-Next>', lambda event: self.out0.out5.jog("0"))
-        master.bind('<KeyPress-i>', lambda event: self.out0.out7.jog("+"))
-        master.bind('<KeyRelease-i>', lambda event: self.out0.out7.jog("0"))
-        master.bind('<KeyPress-k>', lambda event: self.out0.out7.jog("-"))
-        master.bind('<KeyRelease-k>', lambda event: self.out0.out7.jog("0"))
-        master.bind('<KeyPress-l>', lambda event: self.out0.out6.jog("+"))
-        master.bind('<KeyRelease-l>', lambda event: self.out0.out6.jog("0"))
-        master.bind('<KeyPress-j>', lambda event: self.out0.out6.jog("-"))
-        master.bind('<KeyRelease-j>', lambda event: self.out0.out6.jog("0"))
+        # Rev TC Note: the keys are read by the input engine on a fixed tick instead of one binding per key press/release
+        out0 = self.out0
+        key_map = [
+            # Base Key Tool Movements
+            ('w', out0.out2.jog_outputs, "+"), ('s', out0.out2.jog_outputs, "-"),
+            ('d', out0.out1.jog_outputs, "+"), ('a', out0.out1.jog_outputs, "-"),
+            # Vard Key Tool Movements
+            ('5', out0.out4.jog_outputs, "+"), ('2', out0.out4.jog_outputs, "-"),
+            ('3', out0.out3.jog_outputs, "+"), ('1', out0.out3.jog_outputs, "-"),
+            # Camera Movements
+            # Revision B Note: Action on key strike for camera made more general in order to control mult. cameras.
+            ('Left', out0.pan_outputs_gen, "L"), ('Right', out0.pan_outputs_gen, "R"),
+            ('Up', out0.tilt_outputs_gen, "-"), ('Down', out0.tilt_outputs_gen, "+"),
+            ('plus', out0.zoom_outputs_gen, "+"), ('minus', out0.zoom_outputs_gen, "-"),
+            ('Insert', out0.focus_outputs_gen, "+"), ('Delete', out0.focus_outputs_gen, "-"),
+            # Mast Movements
+            ('Prior', out0.out5.jog_outputs, "+"), ('Next', out0.out5.jog_outputs, "-"),
+            ('i', out0.out7.jog_outputs, "+"), ('k', out0.out7.jog_outputs, "-"),
+            ('l', out0.out6.jog_outputs, "+"), ('j', out0.out6.jog_outputs, "-"),
+        ]
+        for keysym, control, direction in key_map:
+            keys.map(keysym, control, direction)
+        keys.attach(master)
 
         # Rev 2 Note: Adding a section to prevent a runaway condition
-        master.bind('<FocusOut>', lambda event: self.all_stop())
+        master.bind('<FocusOut>', lambda event: self.all_stop('User has navigated away from interface'))
+        # Rev TC Note: Escape stops everything as well
+        master.bind('<KeyPress-Escape>', lambda event: self.all_stop('All stop key pressed'))
+        # Rev TC Note: F2 opens/closes the motor current strip chart, F3 lists the scheduled tasks and reading rates
+        master.bind('<KeyPress-F2>', lambda event: chart.toggle(master))
+        master.bind('<KeyPress-F3>', lambda event: list_tasks())
 
-    def all_stop(self):
-        print('\n \n User has navigated away from interface\n    Stopping all axis movement \n \n')
-        self.out0.out1.jog("0")
-        self.out0.out2.jog("0")
-        self.out0.out3.jog("0")
-        self.out0.out4.jog("0")
-        self.out0.out5.jog("0")
-        self.out0.out6.jog("0")
-        self.out0.out7.jog("0")
-        self.out0.pan_move_gen("0")
-        self.out0.tilt_move_gen("0")
+    # Rev TC Note: every axis and the pan/tilt/focus/zoom of both cameras, whether or not linked to the gamepad
+    def all_stop(self, reason):
+        keys.release_all()
+        stops.trigger()
+        print('\n \n ' + reason + '\n    Stopping all axis movement \n \n')
 
 
 class popupWindow(object):
@@ -274,45 +334,66 @@ class AxisFrame:
         self.label.grid(column=0, row=6)
 
         # TIMC added to measure if the user has been stressing out the VART vert motor too long
-        self.current_timer = None
         self.motor_locked_out = False
 
+        # Rev TC Note: readings go to the shared current buffer, the display shows their 1 s average
+        self.current_index = currents.register(initial_name)
+        thermal.configure(self.current_index, rated=THERMAL_RATED * self.current_limit)
+        backstop.configure(self.current_index, self.current_limit)
+        axis_frames.append(self)
+        self.jog_pos_btn.config(state=DISABLED)
+        self.jog_neg_btn.config(state=DISABLED)
+
         # Connect to Phidget Motor Driver
-        try:
-            self.axis = DCMotor()
-            self.axis.setDeviceSerialNumber(serial_number)
-            self.axis.setIsHubPortDevice(False)
-            self.axis.setHubPort(port)
-            self.axis.setChannel(0)
-            self.axis.openWaitForAttachment(5000)
-            self.axis.setAcceleration(self.acceleration)
-            self.axis.setCurrentLimit(self.current_limit)   # TIMC bug found in which all motors have 2A limit until config window is opened
-
-            self.axis_current = CurrentInput()
-            self.axis_current.setDeviceSerialNumber(serial_number)
-            self.axis_current.setIsHubPortDevice(False)
-            self.axis_current.setHubPort(port)
-            self.axis_current.setChannel(0)
-            self.axis_current.openWaitForAttachment(5000)
-            self.axis_current.setDataInterval(100)  # TIMC updated from 200 to 100
-            self.axis_current.setCurrentChangeTrigger(0.0)
-            self.current_data_points = []  # TIMC moving average of current values final size to be 10
-            # With the update interval being 100 ms, the call handler for current change should not be attached until data is ready
-            root.after(100, self.init_current_readings)
-
-            # Bind user button press of jog button to movement method
-            self.jog_pos_btn.bind('<ButtonPress-1>', lambda event: self.jog("+"))
-            self.jog_pos_btn.bind('<ButtonRelease-1>', lambda event: self.jog("0"))
-            self.jog_neg_btn.bind('<ButtonPress-1>', lambda event: self.jog("-"))
-            self.jog_neg_btn.bind('<ButtonRelease-1>', lambda event: self.jog("0"))
-        except:
-            print('Running in off-line mode.')
+        # Rev TC Note: the channels attach in the background, settings are applied from the attach handlers
+        self.axis = engine.bind(ChannelSpec(DCMotor, serial_number, port, 0), self.on_axis_attach, self.on_axis_detach,
+                                safe_state={'setTargetVelocity': 0})
+        stops.add(self.axis, 'setTargetVelocity', 0)
+        recorder.watch(self.axis, 'setTargetVelocity', initial_name + ' velocity', 'velocity', 'duty')
+        self.current_channel = recorder.channel(initial_name + ' current', 'current', 'A')
+        self.lockout_channel = recorder.channel(initial_name + ' lockout', 'lockout')
+        self.chart_series = chart.series(initial_name)
+        self.axis_current = engine.bind(ChannelSpec(CurrentInput, serial_number, port, 0), self.on_current_attach)
+        # The data interval is chosen by the adaptive sampling in show_currents, the axis starts idle
+        engine.remember(self.axis_current, 'setDataInterval', sampling.slow)
+        # Written by the engine on every attach, so a reconnect restores them without re-opening the config window
+        engine.remember(self.axis, 'setAcceleration', self.acceleration)
+        engine.remember(self.axis, 'setCurrentLimit', self.current_limit)   # TIMC bug found in which all motors have 2A limit until config window is opened
+
+    # Called on the Phidget event thread after the engine has stopped the axis and restored its settings
+    def on_axis_attach(self):
+        engine.post(self.enable_jog)
+
+    def on_axis_detach(self):
+        engine.post(lambda: disable_widgets([self.jog_pos_btn, self.jog_neg_btn]))
+
+    def on_current_attach(self):
+        self.axis_current.setCurrentChangeTrigger(0.0)
+        # The call handler for current change should not be attached until data is ready
+        engine.post(lambda: scheduler.after(100, self.init_current_readings, name='current start', owner=self.axis_name))
+
+    def enable_jog(self):
+        if str(self.jog_pos_btn.cget('state')) == NORMAL:
+            return
+        self.jog_pos_btn.config(state=NORMAL)
+        self.jog_neg_btn.config(state=NORMAL)
+        # Bind user button press of jog button to movement method
+        self.jog_pos_btn.bind('<ButtonPress-1>', lambda event: self.jog("+"))
+        self.jog_pos_btn.bind('<ButtonRelease-1>', lambda event: self.jog("0"))
+        self.jog_neg_btn.bind('<ButtonPress-1>', lambda event: self.jog("-"))
+        self.jog_neg_btn.bind('<ButtonRelease-1>', lambda event: self.jog("0"))
 
     # TIMC handler must be started after the main loop starts
     def init_current_readings(self):
         self.axis_current.setOnCurrentChangeHandler(self.update_current)
 
     def jog(self, direction):
+        if not self.axis.getAttached():
+            return
+        dispatcher.submit_all(self.jog_outputs(direction))
+
+    # Rev TC Note: the velocity for a jog direction, also evaluated on every tick of the keyboard input engine
+    def jog_outputs(self, direction):
         # Calculate the speed as a percentage of the maximum velocity
         velocity = float(self.speed.get()) * self.max_velocity
         # Apply invert if necessary
@@ -320,45 +401,30 @@ class AxisFrame:
             velocity *= -1
 
         # Command Movement
-        if direction == "+":
-            if not self.motor_locked_out:
-                self.axis.setTargetVelocity(velocity)
-        elif direction == "-":
-            if not self.motor_locked_out:
-                self.axis.setTargetVelocity(-1 * velocity)
-        elif direction == "0":
-            self.axis.setTargetVelocity(0)
+        if direction == "+" and not self.motor_locked_out:
+            return [(self.axis, 'setTargetVelocity', velocity)]
+        elif direction == "-" and not self.motor_locked_out:
+            return [(self.axis, 'setTargetVelocity', -1 * velocity)]
+        return [(self.axis, 'setTargetVelocity', 0)]
 
+    # Rev TC Note: runs on the Phidget event thread, the reading is only stored
     def update_current(self, trash, value):
-        list_length = len(self.current_data_points)
-        # Calculate the moving average over 10 points
-        if list_length == 10:
-            self.current_data_points.pop(0)
-            self.current_data_points.append(value)
-            new_average = sum(self.current_data_points) / 10
-        else:
-            self.current_data_points.append(value)
-            new_average = sum(self.current_data_points) / (list_length + 1)
-        # Reset the over current timer if the current is below half the allowable limit
-        if abs(new_average) < abs(0.5 * self.current_limit):
-            self.reset_current_timer()
-        self.current_text.set(abs(round(new_average, 3)))
-
-    def reset_current_timer(self):
-        if self.current_timer is not None:
-            root.after_cancel(self.current_timer)
-        # Set a timer that will expire after 3 seconds of the user commanding a high current condition
-        self.current_timer = root.after(3000, self.init_motor_lockout)
+        currents.add(self.current_index, value)
+        recorder.record(self.current_channel, value)
+        chart.add(self.chart_series, value)
 
+    # Rev TC Note: called by show_currents when the thermal model or the backstop trips, it is released once neither
+    # holds the axis any more
     def init_motor_lockout(self):
         self.motor_locked_out = True
-        self.axis.setTargetVelocity(0)
+        recorder.record(self.lockout_channel, 1)
+        dispatcher.submit(self.axis, 'setTargetVelocity', 0, stop=True)
         self.jog_pos_btn.configure(background="red")
         self.jog_neg_btn.configure(background="red")
-        root.after(8000, self.disable_motor_lockout)
 
     def disable_motor_lockout(self):
         self.motor_locked_out = False
+        recorder.record(self.lockout_channel, 0)
         self.jog_pos_btn.configure(background="light grey")
         self.jog_neg_btn.configure(background="light grey")
 
@@ -375,9 +441,11 @@ class AxisFrame:
         self.acceleration = self.window.acceleration
         self.invert = self.window.invert.get()
 
-        # Update Phidget parameters
-        self.axis.setCurrentLimit(self.current_limit)
-        self.axis.setAcceleration(self.acceleration)
+        # Update Phidget parameters, the engine applies them on attach if the axis is not attached yet
+        engine.apply(self.axis, 'setCurrentLimit', self.current_limit)
+        engine.apply(self.axis, 'setAcceleration', self.acceleration)
+        thermal.configure(self.current_index, rated=THERMAL_RATED * self.current_limit)
+        backstop.configure(self.current_index, self.current_limit)
 
 
 class ControlFrame:
@@ -519,191 +587,83 @@ class ControlFrame:
         self.ckbx_gamepad_cam2.grid(row=3, column=1, columnspan=2)
 
         # Connect to Phidget Devices
-        # CAMERA 1 COMMANDS
-        try:
-            self.power_cam1 = DigitalOutput()
-            self.power_cam1.setDeviceSerialNumber(HUB2)
-            self.power_cam1.setIsHubPortDevice(False)
-            self.power_cam1.setHubPort(1)
-            self.power_cam1.setChannel(0)
-            self.power_cam1.openWaitForAttachment(5000)
-
-            self.manual_select_cam1 = DigitalOutput()
-            self.manual_select_cam1.setDeviceSerialNumber(HUB2)
-            self.manual_select_cam1.setIsHubPortDevice(False)
-            self.manual_select_cam1.setHubPort(1)
-            self.manual_select_cam1.setChannel(1)
-            self.manual_select_cam1.openWaitForAttachment(5000)
-
-            self.near_cam1 = DigitalOutput()
-            self.near_cam1.setDeviceSerialNumber(HUB2)
-            self.near_cam1.setIsHubPortDevice(False)
-            self.near_cam1.setHubPort(1)
-            self.near_cam1.setChannel(2)
-            self.near_cam1.openWaitForAttachment(5000)
-
-            self.far_cam1 = DigitalOutput()
-            self.far_cam1.setDeviceSerialNumber(HUB2)
-            self.far_cam1.setIsHubPortDevice(False)
-            self.far_cam1.setHubPort(1)
-            self.far_cam1.setChannel(3)
-            self.far_cam1.openWaitForAttachment(5000)
-            self.wide_cam1 = DigitalOutput()
-            self.wide_cam1.setDeviceSerialNumber(HUB2)
-            self.wide_cam1.setIsHubPortDevice(False)
-            self.wide_cam1.setHubPort(1)
-            self.wide_cam1.setChannel(4)
-            self.wide_cam1.openWaitForAttachment(5000)
-
-            self.tele_cam1 = DigitalOutput()
-            self.tele_cam1.setDeviceSerialNumber(HUB2)
-            self.tele_cam1.setIsHubPortDevice(False)
-            self.tele_cam1.setHubPort(1)
-            self.tele_cam1.setChannel(5)
-            self.tele_cam1.openWaitForAttachment(5000)
-
-            self.left_light_cam1 = VoltageOutput()
-            self.left_light_cam1.setDeviceSerialNumber(HUB2)
-            self.left_light_cam1.setIsHubPortDevice(False)
-            self.left_light_cam1.setHubPort(2)
-            self.left_light_cam1.setChannel(0)
-            self.left_light_cam1.openWaitForAttachment(5000)
-
-            self.right_light_cam1 = VoltageOutput()
-            self.right_light_cam1.setDeviceSerialNumber(HUB2)
-            self.right_light_cam1.setIsHubPortDevice(False)
-            self.right_light_cam1.setHubPort(3)
-            self.right_light_cam1.setChannel(0)
-            self.right_light_cam1.openWaitForAttachment(5000)
-
-            self.pan_cam1 = VoltageOutput()
-            self.pan_cam1.setDeviceSerialNumber(HUB2)
-            self.pan_cam1.setIsHubPortDevice(False)
-            self.pan_cam1.setHubPort(5)
-            self.pan_cam1.setChannel(0)
-            self.pan_cam1.openWaitForAttachment(5000)
-
-            self.tilt_cam1 = VoltageOutput()
-            self.tilt_cam1.setDeviceSerialNumber(HUB2)
-            self.tilt_cam1.setIsHubPortDevice(False)
-            self.tilt_cam1.setHubPort(4)
-            self.tilt_cam1.setChannel(0)
-            self.tilt_cam1.openWaitForAttachment(5000)
-        except:
-            print('Running in off-line mode.')
-
-        # CAMERA 2 COMMANDS
-        try:
-            self.power_cam2 = DigitalOutput()
-            self.power_cam2.setDeviceSerialNumber(HUB3)
-            self.power_cam2.setIsHubPortDevice(False)
-            self.power_cam2.setHubPort(1)
-            self.power_cam2.setChannel(0)
-            self.power_cam2.openWaitForAttachment(5000)
-
-            self.manual_select_cam2 = DigitalOutput()
-            self.manual_select_cam2.setDeviceSerialNumber(HUB3)
-            self.manual_select_cam2.setIsHubPortDevice(False)
-            self.manual_select_cam2.setHubPort(1)
-            self.manual_select_cam2.setChannel(1)
-            self.manual_select_cam2.openWaitForAttachment(5000)
-
-            self.near_cam2 = DigitalOutput()
-            self.near_cam2.setDeviceSerialNumber(HUB3)
-            self.near_cam2.setIsHubPortDevice(False)
-            self.near_cam2.setHubPort(1)
-            self.near_cam2.setChannel(2)
-            self.near_cam2.openWaitForAttachment(5000)
-
-            self.far_cam2 = DigitalOutput()
-            self.far_cam2.setDeviceSerialNumber(HUB3)
-            self.far_cam2.setIsHubPortDevice(False)
-            self.far_cam2.setHubPort(1)
-            self.far_cam2.setChannel(3)
-            self.far_cam2.openWaitForAttachment(5000)
-            self.wide_cam2 = DigitalOutput()
-            self.wide_cam2.setDeviceSerialNumber(HUB3)
-            self.wide_cam2.setIsHubPortDevice(False)
-            self.wide_cam2.setHubPort(1)
-            self.wide_cam2.setChannel(4)
-            self.wide_cam2.openWaitForAttachment(5000)
-
-            self.tele_cam2 = DigitalOutput()
-            self.tele_cam2.setDeviceSerialNumber(HUB3)
-            self.tele_cam2.setIsHubPortDevice(False)
-            self.tele_cam2.setHubPort(1)
-            self.tele_cam2.setChannel(5)
-            self.tele_cam2.openWaitForAttachment(5000)
-
-            self.left_light_cam2 = VoltageOutput()
-            self.left_light_cam2.setDeviceSerialNumber(HUB3)
-            self.left_light_cam2.setIsHubPortDevice(False)
-            self.left_light_cam2.setHubPort(2)
-            self.left_light_cam2.setChannel(0)
-            self.left_light_cam2.openWaitForAttachment(5000)
-
-            self.right_light_cam2 = VoltageOutput()
-            self.right_light_cam2.setDeviceSerialNumber(HUB3)
-            self.right_light_cam2.setIsHubPortDevice(False)
-            self.right_light_cam2.setHubPort(3)
-            self.right_light_cam2.setChannel(0)
-            self.right_light_cam2.openWaitForAttachment(5000)
-
-            self.pan_cam2 = VoltageOutput()
-            self.pan_cam2.setDeviceSerialNumber(HUB3)
-            self.pan_cam2.setIsHubPortDevice(False)
-            self.pan_cam2.setHubPort(5)
-            self.pan_cam2.setChannel(0)
-            self.pan_cam2.openWaitForAttachment(5000)
-
-            self.tilt_cam2 = VoltageOutput()
-            self.tilt_cam2.setDeviceSerialNumber(HUB3)
-            self.tilt_cam2.setIsHubPortDevice(False)
-            self.tilt_cam2.setHubPort(4)
-            self.tilt_cam2.setChannel(0)
-            self.tilt_cam2.openWaitForAttachment(5000)
-        except:
-            print('Running in off-line mode.')
+        # Rev TC Note: channel name, type, hub, port, channel, the widgets that stay disabled until it attaches and the
+        # state written when it (re)attaches. Power and light levels are remembered and restored instead.
+        off = {'setState': False}
+        zero = {'setVoltage': 0}
+        camera_channels = [
+            # CAMERA 1 COMMANDS
+            ("power_cam1", DigitalOutput, HUB2, 1, 0, [self.btn_power_cam1], None),
+            ("manual_select_cam1", DigitalOutput, HUB2, 1, 1, [self.btn_ms_cam1], off),
+            ("near_cam1", DigitalOutput, HUB2, 1, 2, [self.btn_near_cam1], off),
+            ("far_cam1", DigitalOutput, HUB2, 1, 3, [self.btn_far_cam1], off),
+            ("wide_cam1", DigitalOutput, HUB2, 1, 4, [self.btn_wide_cam1], off),
+            ("tele_cam1", DigitalOutput, HUB2, 1, 5, [self.btn_tele_cam1], off),
+            ("left_light_cam1", VoltageOutput, HUB2, 2, 0, [self.left_light_scale_cam1], None),
+            ("right_light_cam1", VoltageOutput, HUB2, 3, 0, [self.right_light_scale_cam1], None),
+            ("pan_cam1", VoltageOutput, HUB2, 5, 0, [self.btn_pan_left_cam1, self.btn_pan_right_cam1], zero),
+            ("tilt_cam1", VoltageOutput, HUB2, 4, 0, [self.btn_tilt_up_cam1, self.btn_tilt_down_cam1], zero),
+            # CAMERA 2 COMMANDS
+            ("power_cam2", DigitalOutput, HUB3, 1, 0, [self.btn_power_cam2], None),
+            ("manual_select_cam2", DigitalOutput, HUB3, 1, 1, [self.btn_ms_cam2], off),
+            ("near_cam2", DigitalOutput, HUB3, 1, 2, [self.btn_near_cam2], off),
+            ("far_cam2", DigitalOutput, HUB3, 1, 3, [self.btn_far_cam2], off),
+            ("wide_cam2", DigitalOutput, HUB3, 1, 4, [self.btn_wide_cam2], off),
+            ("tele_cam2", DigitalOutput, HUB3, 1, 5, [self.btn_tele_cam2], off),
+            ("left_light_cam2", VoltageOutput, HUB3, 2, 0, [self.left_light_scale_cam2], None),
+            ("right_light_cam2", VoltageOutput, HUB3, 3, 0, [self.right_light_scale_cam2], None),
+            ("pan_cam2", VoltageOutput, HUB3, 5, 0, [self.btn_pan_left_cam2, self.btn_pan_right_cam2], zero),
+            ("tilt_cam2", VoltageOutput, HUB3, 4, 0, [self.btn_tilt_up_cam2, self.btn_tilt_down_cam2], zero),
+        ]
+        for name, channel_class, serial_number, port, ch, widgets, safe_state in camera_channels:
+            disable_widgets(widgets)
+            setattr(self, name, engine.bind(ChannelSpec(channel_class, serial_number, port, ch),
+                                            lambda w=widgets: engine.post(lambda: enable_widgets(w)),
+                                            lambda w=widgets: engine.post(lambda: disable_widgets(w)), safe_state))
+            # The camera motion outputs are the ones with a safe state, the all stop returns them to it
+            for setter, value in (safe_state or {}).items():
+                stops.add(getattr(self, name), setter, value)
+                recorder.watch(getattr(self, name), setter, name, 'camera')
 
         # Camera 1 button binding:
-        self.btn_near_cam1.bind('<ButtonPress-1>', lambda event: self.focus_cam1("+"))
-        self.btn_near_cam1.bind('<ButtonRelease-1>', lambda event: self.focus_cam1("0"))
-        self.btn_far_cam1.bind('<ButtonPress-1>', lambda event: self.focus_cam1("-"))
-        self.btn_far_cam1.bind('<ButtonRelease-1>', lambda event: self.focus_cam1("0"))
-        self.btn_wide_cam1.bind('<ButtonPress-1>', lambda event: self.zoom_cam1("-"))
-        self.btn_wide_cam1.bind('<ButtonRelease-1>', lambda event: self.zoom_cam1("0"))
-        self.btn_tele_cam1.bind('<ButtonPress-1>', lambda event: self.zoom_cam1("+"))
-        self.btn_tele_cam1.bind('<ButtonRelease-1>', lambda event: self.zoom_cam1("0"))
-        self.btn_ms_cam1.bind('<ButtonPress-1>', lambda event: self.focus_type_cam1("ON"))
-        self.btn_ms_cam1.bind('<ButtonRelease-1>', lambda event: self.focus_type_cam1("OFF"))
-        self.btn_tilt_up_cam1.bind('<ButtonPress-1>', lambda event: self.tilt_move_cam1("-"))
-        self.btn_tilt_up_cam1.bind('<ButtonRelease-1>', lambda event: self.tilt_move_cam1("0"))
-        self.btn_tilt_down_cam1.bind('<ButtonPress-1>', lambda event: self.tilt_move_cam1("+"))
-        self.btn_tilt_down_cam1.bind('<ButtonRelease-1>', lambda event: self.tilt_move_cam1("0"))
-        self.btn_pan_right_cam1.bind('<ButtonPress-1>', lambda event: self.pan_move_cam1("R"))
-        self.btn_pan_right_cam1.bind('<ButtonRelease-1>', lambda event: self.pan_move_cam1("0"))
-        self.btn_pan_left_cam1.bind('<ButtonPress-1>', lambda event: self.pan_move_cam1("L"))
-        self.btn_pan_left_cam1.bind('<ButtonRelease-1>', lambda event: self.pan_move_cam1("0"))
+        self.btn_near_cam1.bind('<ButtonPress-1>', when_enabled(lambda: self.focus_cam1("+")))
+        self.btn_near_cam1.bind('<ButtonRelease-1>', when_enabled(lambda: self.focus_cam1("0")))
+        self.btn_far_cam1.bind('<ButtonPress-1>', when_enabled(lambda: self.focus_cam1("-")))
+        self.btn_far_cam1.bind('<ButtonRelease-1>', when_enabled(lambda: self.focus_cam1("0")))
+        self.btn_wide_cam1.bind('<ButtonPress-1>', when_enabled(lambda: self.zoom_cam1("-")))
+        self.btn_wide_cam1.bind('<ButtonRelease-1>', when_enabled(lambda: self.zoom_cam1("0")))
+        self.btn_tele_cam1.bind('<ButtonPress-1>', when_enabled(lambda: self.zoom_cam1("+")))
+        self.btn_tele_cam1.bind('<ButtonRelease-1>', when_enabled(lambda: self.zoom_cam1("0")))
+        self.btn_ms_cam1.bind('<ButtonPress-1>', when_enabled(lambda: self.focus_type_cam1("ON")))
+        self.btn_ms_cam1.bind('<ButtonRelease-1>', when_enabled(lambda: self.focus_type_cam1("OFF")))
+        self.btn_tilt_up_cam1.bind('<ButtonPress-1>', when_enabled(lambda: self.tilt_move_cam1("-")))
+        self.btn_tilt_up_cam1.bind('<ButtonRelease-1>', when_enabled(lambda: self.tilt_move_cam1("0")))
+        self.btn_tilt_down_cam1.bind('<ButtonPress-1>', when_enabled(lambda: self.tilt_move_cam1("+")))
+        self.btn_tilt_down_cam1.bind('<ButtonRelease-1>', when_enabled(lambda: self.tilt_move_cam1("0")))
+        self.btn_pan_right_cam1.bind('<ButtonPress-1>', when_enabled(lambda: self.pan_move_cam1("R")))
+        self.btn_pan_right_cam1.bind('<ButtonRelease-1>', when_enabled(lambda: self.pan_move_cam1("0")))
+        self.btn_pan_left_cam1.bind('<ButtonPress-1>', when_enabled(lambda: self.pan_move_cam1("L")))
+        self.btn_pan_left_cam1.bind('<ButtonRelease-1>', when_enabled(lambda: self.pan_move_cam1("0")))
 
         # Camera 2 button binding:
-        self.btn_near_cam2.bind('<ButtonPress-1>', lambda event: self.focus_cam2("+"))
-        self.btn_near_cam2.bind('<ButtonRelease-1>', lambda event: self.focus_cam2("0"))
-        self.btn_far_cam2.bind('<ButtonPress-1>', lambda event: self.focus_cam2("-"))
-        self.btn_far_cam2.bind('<ButtonRelease-1>', lambda event: self.focus_cam2("0"))
-        self.btn_wide_cam2.bind('<ButtonPress-1>', lambda event: self.zoom_cam2("-"))
-        self.btn_wide_cam2.bind('<ButtonRelease-1>', lambda event: self.zoom_cam2("0"))
-        self.btn_tele_cam2.bind('<ButtonPress-1>', lambda event: self.zoom_cam2("+"))
-        self.btn_tele_cam2.bind('<ButtonRelease-1>', lambda event: self.zoom_cam2("0"))
-        self.btn_ms_cam2.bind('<ButtonPress-1>', lambda event: self.focus_type_cam2("ON"))
-        self.btn_ms_cam2.bind('<ButtonRelease-1>', lambda event: self.focus_type_cam2("OFF"))
-        self.btn_tilt_up_cam2.bind('<ButtonPress-1>', lambda event: self.tilt_move_cam2("-"))
-        self.btn_tilt_up_cam2.bind('<ButtonRelease-1>', lambda event: self.tilt_move_cam2("0"))
-        self.btn_tilt_down_cam2.bind('<ButtonPress-1>', lambda event: self.tilt_move_cam2("+"))
-        self.btn_tilt_down_cam2.bind('<ButtonRelease-1>', lambda event: self.tilt_move_cam2("0"))
-        self.btn_pan_right_cam2.bind('<ButtonPress-1>', lambda event: self.pan_move_cam2("R"))
-        self.btn_pan_right_cam2.bind('<ButtonRelease-1>', lambda event: self.pan_move_cam2("0"))
-        self.btn_pan_left_cam2.bind('<ButtonPress-1>', lambda event: self.pan_move_cam2("L"))
-        self.btn_pan_left_cam2.bind('<ButtonRelease-1>', lambda event: self.pan_move_cam2("0"))
+        self.btn_near_cam2.bind('<ButtonPress-1>', when_enabled(lambda: self.focus_cam2("+")))
+        self.btn_near_cam2.bind('<ButtonRelease-1>', when_enabled(lambda: self.focus_cam2("0")))
+        self.btn_far_cam2.bind('<ButtonPress-1>', when_enabled(lambda: self.focus_cam2("-")))
+        self.btn_far_cam2.bind('<ButtonRelease-1>', when_enabled(lambda: self.focus_cam2("0")))
+        self.btn_wide_cam2.bind('<ButtonPress-1>', when_enabled(lambda: self.zoom_cam2("-")))
+        self.btn_wide_cam2.bind('<ButtonRelease-1>', when_enabled(lambda: self.zoom_cam2("0")))
+        self.btn_tele_cam2.bind('<ButtonPress-1>', when_enabled(lambda: self.zoom_cam2("+")))
+        self.btn_tele_cam2.bind('<ButtonRelease-1>', when_enabled(lambda: self.zoom_cam2("0")))
+        self.btn_ms_cam2.bind('<ButtonPress-1>', when_enabled(lambda: self.focus_type_cam2("ON")))
+        self.btn_ms_cam2.bind('<ButtonRelease-1>', when_enabled(lambda: self.focus_type_cam2("OFF")))
+        self.btn_tilt_up_cam2.bind('<ButtonPress-1>', when_enabled(lambda: self.tilt_move_cam2("-")))
+        self.btn_tilt_up_cam2.bind('<ButtonRelease-1>', when_enabled(lambda: self.tilt_move_cam2("0")))
+        self.btn_tilt_down_cam2.bind('<ButtonPress-1>', when_enabled(lambda: self.tilt_move_cam2("+")))
+        self.btn_tilt_down_cam2.bind('<ButtonRelease-1>', when_enabled(lambda: self.tilt_move_cam2("0")))
+        self.btn_pan_right_cam2.bind('<ButtonPress-1>', when_enabled(lambda: self.pan_move_cam2("R")))
+        self.btn_pan_right_cam2.bind('<ButtonRelease-1>', when_enabled(lambda: self.pan_move_cam2("0")))
+        self.btn_pan_left_cam2.bind('<ButtonPress-1>', when_enabled(lambda: self.pan_move_cam2("L")))
+        self.btn_pan_left_cam2.bind('<ButtonRelease-1>', when_enabled(lambda: self.pan_move_cam2("0")))
 
     # Un-necessary, but nice to have.
     def game_pad_link_cam1(self):
@@ -715,126 +675,128 @@ class ControlFrame:
 
     # Camera 1 definitions:
     def toggle_power_cam1(self):
-        if self.power_cam1.getState() == True:
-            self.power_cam1.setState(False)
+        # Rev TC Note: the state last commanded, the channel may not have been written yet
+        if engine.recall(self.power_cam1, 'setState', False) == True:
+            engine.apply(self.power_cam1, 'setState', False)
             self.btn_power_cam1.config(bg="SystemButtonFace")
-        elif self.power_cam1.getState() == False:
-            self.power_cam1.setState(True)
+        elif engine.recall(self.power_cam1, 'setState', False) == False:
+            engine.apply(self.power_cam1, 'setState', True)
             self.btn_power_cam1.config(bg=self.activeColor)
 
     def update_left_intensity_cam1(self, val):
-        self.left_light_cam1.setVoltage(float(val))
+        engine.apply(self.left_light_cam1, 'setVoltage', float(val))
 
     def update_right_intensity_cam1(self, val):
-        self.right_light_cam1.setVoltage(float(val))
+        engine.apply(self.right_light_cam1, 'setVoltage', float(val))
 
     def focus_cam1(self, direction):
         if direction == "+":
-            self.near_cam1.setState(TRUE)
+            dispatcher.submit(self.near_cam1, 'setState', True)
         elif direction == "-":
-            self.far_cam1.setState(TRUE)
+            dispatcher.submit(self.far_cam1, 'setState', True)
         elif direction == "0":
-            self.far_cam1.setState(FALSE)
-            self.near_cam1.setState(FALSE)
+            dispatcher.submit(self.far_cam1, 'setState', False, stop=True)
+            dispatcher.submit(self.near_cam1, 'setState', False, stop=True)
 
     def zoom_cam1(self, direction):
         if direction == "+":
-            self.tele_cam1.setState(TRUE)
+            dispatcher.submit(self.tele_cam1, 'setState', True)
         elif direction == "-":
-            self.wide_cam1.setState(TRUE)
+            dispatcher.submit(self.wide_cam1, 'setState', True)
         elif direction == "0":
-            self.tele_cam1.setState(FALSE)
-            self.wide_cam1.setState(FALSE)
+            dispatcher.submit(self.tele_cam1, 'setState', False, stop=True)
+            dispatcher.submit(self.wide_cam1, 'setState', False, stop=True)
 
     def pan_move_cam1(self, direction):
         voltage = float(self.pan_speed_cam1.get())
         if self.invert_pan_cam1.get():
             voltage *= -1
         if direction == "R":
-            self.pan_cam1.setVoltage(voltage)
+            dispatcher.submit(self.pan_cam1, 'setVoltage', voltage)
         elif direction == "L":
-            self.pan_cam1.setVoltage(-1 * voltage)
+            dispatcher.submit(self.pan_cam1, 'setVoltage', -1 * voltage)
             print('camera 1 panning left :)')
         elif direction == "0":
-            self.pan_cam1.setVoltage(0)
+            dispatcher.submit(self.pan_cam1, 'setVoltage', 0, stop=True)
 
     def tilt_move_cam1(self, direction):
         voltage = float(self.tilt_speed_cam1.get())
         if self.invert_tilt_cam1.get():
             voltage *= -1
         if direction == "+":
-            self.tilt_cam1.setVoltage(voltage)
+            dispatcher.submit(self.tilt_cam1, 'setVoltage', voltage)
         elif direction == "-":
-            self.tilt_cam1.setVoltage(-1 * voltage)
+            dispatcher.submit(self.tilt_cam1, 'setVoltage', -1 * voltage)
         elif direction == "0":
-            self.tilt_cam1.setVoltage(0)
+            dispatcher.submit(self.tilt_cam1, 'setVoltage', 0, stop=True)
 
     def focus_type_cam1(self, state):
         if state == "ON":
-            self.manual_select_cam1.setState(True)
+            dispatcher.submit(self.manual_select_cam1, 'setState', True)
         elif state == "OFF":
-            self.manual_select_cam1.setState(False)
+            dispatcher.submit(self.manual_select_cam1, 'setState', False)
 
     # Camera 2 definitions:
     def toggle_power_cam2(self):
-        if self.power_cam2.getState() == True:
-            self.power_cam2.setState(False)
+        # Rev TC Note: the state last commanded, the channel may not have been written yet
+        if engine.recall(self.power_cam2, 'setState', False) == True:
+            engine.apply(self.power_cam2, 'setState', False)
             self.btn_power_cam2.config(bg="SystemButtonFace")
-        elif self.power_cam2.getState() == False:
-            self.power_cam2.setState(True)
+        elif engine.recall(self.power_cam2, 'setState', False) == False:
+            engine.apply(self.power_cam2, 'setState', True)
             self.btn_power_cam2.config(bg=self.activeColor)
 
     def update_left_intensity_cam2(self, val):
-        self.left_light_cam2.setVoltage(float(val))
+        engine.apply(self.left_light_cam2, 'setVoltage', float(val))
 
     def update_right_intensity_cam2(self, val):
-        self.right_light_cam2.setVoltage(float(val))
+        engine.apply(self.right_light_cam2, 'setVoltage', float(val))
 
     def focus_cam2(self, direction):
         if direction == "+":
-            self.near_cam2.setState(TRUE)
+            dispatcher.submit(self.near_cam2, 'setState', True)
         elif direction == "-":
-            self.far_cam2.setState(TRUE)
+            dispatcher.submit(self.far_cam2, 'setState', True)
         elif direction == "0":
-            self.far_cam2.setState(FALSE)
-            self.near_cam2.setState(FALSE)
+            dispatcher.submit(self.far_cam2, 'setState', False, stop=True)
+            dispatcher.submit(self.near_cam2, 'setState', False, stop=True)
 
     def zoom_cam2(self, direction):
         if direction == "+":
-            self.tele_cam2.setState(TRUE)
+            dispatcher.submit(self.tele_cam2, 'setState', True)
         elif direction == "-":
-            self.wide_cam2.setState(TRUE)
+            dispatcher.submit(self.wide_cam2, 'setState', True)
         elif direction == "0":
-            self.tele_cam2.setState(FALSE)
-            self.wide_cam2.setState(FALSE)
+            dispatcher.submit(self.tele_cam2, 'setState', False, stop=True)
+            dispatcher.submit(self.wide_cam2, 'setState', False, stop=True)
 
     def pan_move_cam2(self, direction):
         voltage = float(self.pan_speed_cam2.get())
         if self.invert_pan_cam2.get():
             voltage *= -1
         if direction == "R":
-            self.pan_cam2.setVoltage(voltage)
+            dispatcher.submit(self.pan_cam2, 'setVoltage', voltage)
         elif direction == "L":
-            self.pan_cam2.setVoltage(-1 * voltage)
+            dispatcher.submit(self.pan_cam2, 'setVoltage', -1 * voltage)
         elif direction == "0":
-            self.pan_cam2.setVoltage(0)
+            dispatcher.submit(self.pan_cam2, 'setVoltage', 0, stop=True)
 
     def tilt_move_cam2(self, direction):
         voltage = float(self.tilt_speed_cam2.get())
         if self.invert_tilt_cam2.get():
             voltage *= -1
         if direction == "+":
-            self.tilt_cam2.setVoltage(voltage)
+            dispatcher.submit(self.tilt_cam2, 'setVoltage', voltage)
         elif direction == "-":
-            self.tilt_cam2.setVoltage(-1 * voltage)
+            dispatcher.submit(self.tilt_cam2, 'setVoltage', -1 * voltage)
         elif direction == "0":
-            self.tilt_cam2.setVoltage(0)
+            dispatcher.submit(self.tilt_cam2, 'setVoltage', 0, stop=True)
 
     def focus_type_cam2(self, state):
         if state == "ON":
-            self.manual_select_cam2.setState(True)
+            dispatcher.submit(self.manual_select_cam2, 'setState', True)
         elif state == "OFF":
-            self.manual_select_cam2.setState(False)
+            dispatcher.submit(self.manual_select_cam2, 'setState', False)
 
     # Un-neccesary, but nice to have the notice.
     def game_pad_link_cam2(self):
@@ -844,89 +806,116 @@ class ControlFrame:
         else:
             print('Camera 2 is dis-connected from the gamepad.')
 
-    def focus_gen(self, direction):
+    # Rev TC Note: the *_outputs_gen methods give the outputs of the cameras linked to the gamepad for a direction, the
+    # keyboard input engine evaluates them on every tick and the *_gen methods send them straight away
+    def linked_cameras(self):
+        cameras = []
         if self.game_pad_cam1.get():
-            if direction == "+":
-                self.near_cam1.setState(TRUE)
-            elif direction == "-":
-                self.far_cam1.setState(TRUE)
-            elif direction == "0":
-                self.far_cam1.setState(FALSE)
-                self.near_cam1.setState(FALSE)
+            cameras.append("cam1")
         if self.game_pad_cam2.get():
-            if direction == "+":
-                self.near_cam2.setState(TRUE)
-            elif direction == "-":
-                self.far_cam2.setState(TRUE)
-            elif direction == "0":
-                self.far_cam2.setState(FALSE)
-                self.near_cam2.setState(FALSE)
+            cameras.append("cam2")
+        return cameras
+
+    def focus_outputs_gen(self, direction):
+        outputs = []
+        for cam in self.linked_cameras():
+            outputs.append((getattr(self, "near_" + cam), 'setState', direction == "+"))
+            outputs.append((getattr(self, "far_" + cam), 'setState', direction == "-"))
+        return outputs
+
+    def zoom_outputs_gen(self, direction):
+        outputs = []
+        for cam in self.linked_cameras():
+            outputs.append((getattr(self, "tele_" + cam), 'setState', direction == "+"))
+            outputs.append((getattr(self, "wide_" + cam), 'setState', direction == "-"))
+        return outputs
+
+    def pan_outputs_gen(self, direction):
+        outputs = []
+        for cam in self.linked_cameras():
+            voltage = float(getattr(self, "pan_speed_" + cam).get())
+            if getattr(self, "invert_pan_" + cam).get():
+                voltage *= -1
+            outputs.append((getattr(self, "pan_" + cam), 'setVoltage', {"R": voltage, "L": -1 * voltage}.get(direction, 0)))
+        return outputs
+
+    def tilt_outputs_gen(self, direction):
+        outputs = []
+        for cam in self.linked_cameras():
+            voltage = float(getattr(self, "tilt_speed_" + cam).get())
+            if getattr(self, "invert_tilt_" + cam).get():
+                voltage *= -1
+            outputs.append((getattr(self, "tilt_" + cam), 'setVoltage', {"+": voltage, "-": -1 * voltage}.get(direction, 0)))
+        return outputs
+
+    def focus_gen(self, direction):
+        dispatcher.submit_all(self.focus_outputs_gen(direction))
 
     def zoom_gen(self, direction):
-        if self.game_pad_cam1.get():
-            if direction == "+":
-                self.tele_cam1.setState(TRUE)
-            elif direction == "-":
-                self.wide_cam1.setState(TRUE)
-            elif direction == "0":
-                self.tele_cam1.setState(FALSE)
-                self.wide_cam1.setState(FALSE)
-        if self.game_pad_cam2.get():
-            if direction == "+":
-                self.tele_cam2.setState(TRUE)
-            elif direction == "-":
-                self.wide_cam2.setState(TRUE)
-            elif direction == "0":
-                self.tele_cam2.setState(FALSE)
-                self.wide_cam2.setState(FALSE)
+        dispatcher.submit_all(self.zoom_outputs_gen(direction))
 
     def pan_move_gen(self, direction):
-        if self.game_pad_cam1.get():
-            voltage = float(self.pan_speed_cam1.get())
-            if self.invert_pan_cam1.get():
-                voltage *= -1
-            if direction == "R":
-                self.pan_cam1.setVoltage(voltage)
-            elif direction == "L":
-                self.pan_cam1.setVoltage(-1 * voltage)
-            elif direction == "0":
-                self.pan_cam1.setVoltage(0)
-        if self.game_pad_cam2.get():
-            voltage = float(self.pan_speed_cam2.get())
-            if self.invert_pan_cam1.get():
-                voltage *= -1
-            if direction == "R":
-                self.pan_cam2.setVoltage(voltage)
-            elif direction == "L":
-                self.pan_cam2.setVoltage(-1 * voltage)
-            elif direction == "0":
-                self.pan_cam2.setVoltage(0)
+        dispatcher.submit_all(self.pan_outputs_gen(direction))
 
     def tilt_move_gen(self, direction):
-        if self.game_pad_cam1.get():
-            voltage = float(self.tilt_speed_cam1.get())
-            if self.invert_tilt_cam1.get():
-                voltage *= -1
-            if direction == "+":
-                self.tilt_cam1.setVoltage(voltage)
-            elif direction == "-":
-                self.tilt_cam1.setVoltage(-1 * voltage)
-            elif direction == "0":
-                self.tilt_cam1.setVoltage(0)
-
-        if self.game_pad_cam2.get():
-            voltage = float(self.tilt_speed_cam2.get())
-            if self.invert_tilt_cam1.get():
-                voltage *= -1
-            if direction == "+":
-                self.tilt_cam2.setVoltage(voltage)
-            elif direction == "-":
-                self.tilt_cam2.setVoltage(-1 * voltage)
-            elif direction == "0":
-                self.tilt_cam2.setVoltage(0)
+        dispatcher.submit_all(self.tilt_outputs_gen(direction))
+
+# Rev TC Note: one vectorised update of the current statistics, thermal model and backstop of every axis, then the
+# display. An axis is locked out while either protection holds it.
+def show_currents():
+    now = time.perf_counter()
+    stats = currents.update(now)[1.0]
+    axes = len(axis_frames)
+    was_locked = thermal.locked[:axes] | backstop.locked[:axes]
+    thermal.update(currents, now)
+    backstop.update(now, stats.mean[:axes])
+    locked = thermal.locked[:axes] | backstop.locked[:axes]
+    tripped = np.flatnonzero(locked & ~was_locked)
+    released = np.flatnonzero(was_locked & ~locked)
+    commanded = [dispatcher.latest(axis_frame.axis, 'setTargetVelocity', 0) != 0 for axis_frame in axis_frames]
+    for index in sampling.update(now, commanded, currents.latest()):
+        engine.apply(axis_frames[index].axis_current, 'setDataInterval', int(sampling.interval[index]))
+    for axis_frame in axis_frames:
+        index = axis_frame.current_index
+        if currents.samples[index] > 0:
+            axis_frame.current_text.set(abs(round(float(stats.mean[index]), 3)))
+        if index in tripped:
+            if thermal.locked[index]:
+                print('%s over current, locked out until the motor has cooled' % axis_frame.axis_name)
+            else:
+                print('%s over half the current limit for %g s, locked out for %g s' % (
+                    axis_frame.axis_name, backstop.hold, backstop.lockout))
+            axis_frame.init_motor_lockout()
+        elif index in released:
+            axis_frame.disable_motor_lockout()
+
+
+# Rev TC Note: scheduled tasks per axis, and how many current readings each axis has sent since the last listing
+last_listing = [time.perf_counter(), [0] * len(currents.samples)]
+def list_tasks():
+    now = time.perf_counter()
+    print(scheduler.listing())
+    print('Current readings since the last listing (%.0f s):' % (now - last_listing[0]))
+    for axis_frame in axis_frames:
+        index = axis_frame.current_index
+        rate = (currents.samples[index] - last_listing[1][index]) / (now - last_listing[0])
+        print('  %-28s %6.1f readings/s, data interval %d ms' % (axis_frame.axis_name, rate, sampling.interval[index]))
+    last_listing[:] = [now, list(currents.samples)]
 
 
 root = Tk()
 TIMC = MainWindow(root, SetupMainWindow())
+engine.start()
+scheduler.start(root)
+monitor.start(scheduler)
+engine.pump(scheduler)
+keys.start(scheduler)
+scheduler.every(CURRENT_TICK, show_currents, name='current display')
+scheduler.after(int(HUB_PROBE_TIME * 1000), lambda: engine.report_hubs({"HUB1": HUB1, "HUB2": HUB2, "HUB3": HUB3}, HUB_PROBE_TIME),
+                LOW, 'hub report')
 root.mainloop()
+recorder.close()
+monitor.stop()
+print(scheduler.report())
+print(monitor.report())
 print('Clean Exit')
@@ -0,0 +1,300 @@
+###################################################################
+# Tooling Inspection Motion Controller - Latency benchmark
+#
+# Description:
+#   Runs an Electrical controller revision against the simulated cabinet
+# (timc_sim) or the stand-in network server and drives it with synthetic
+# Tk events through its own bindings. The time from the event to the
+# command reaching the simulated hub is measured for:
+#     key_jog          <KeyPress-w> until BASE AUX moves, <KeyRelease-w> until it stops
+#     button_jog       <ButtonPress-1>/<ButtonRelease-1> on the BASE AUX jog button
+#     held_key         a 1 s hold of w with X11 autorepeat, commands sent to the hub
+#     all_stop         <FocusOut> with every axis moving until the last axis is stopped
+#   p50/p95/p99 and the number of commands per interaction are printed and
+# can be stored in a baseline file so revisions can be compared, e.g.
+#     python "TIMC-Latency Benchmark.py" 043_TIMC-Digital_MANTIS-Electrical_r3.py --save r3
+#     python "TIMC-Latency Benchmark.py" 046_TIMC-Digital_MANTIS-Electrical_rTC.py --save rTC --against r3
+#   --backend remote runs the stand-in server inside this process, use
+# --latency/--jitter/--loss to give it a slow network. The older revisions
+# import Phidget22 directly; the benchmark points those imports at the same
+# simulated channels, so no hardware or Phidget22 install is used.
+#   Tk needs a display (use Xvfb on a headless machine).
+
+import argparse
+import datetime
+import gc
+import importlib.util
+import json
+import os
+import runpy
+import sys
+import threading
+import time
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINES = os.path.join(HERE, 'timc_latency_baselines.json')
+TIMEOUT = 2.0
+SETTLE = 0.15
+
+
+# Arrivals of commands at the simulated hubs, fed by timc_sim.cabinet.command_listeners
+class CommandLog:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.commands = []
+
+    def listener(self, channel, setter, value):
+        with self.lock:
+            self.commands.append((time.perf_counter(), channel.serial_number, channel.hub_port, setter, value))
+
+    def since(self, start, address=None, setter='setTargetVelocity'):
+        with self.lock:
+            return [c for c in self.commands if c[0] >= start and c[3] == setter
+                    and (address is None or c[1:3] == address)]
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {}
+        self.timeouts = {}
+        self.commands = {}
+
+    def add(self, name, latency):
+        self.latencies.setdefault(name, [])
+        self.timeouts.setdefault(name, 0)
+        if latency is None:
+            self.timeouts[name] += 1
+        else:
+            self.latencies[name].append(latency)
+
+    def count(self, name, commands):
+        self.commands.setdefault(name, []).append(commands)
+
+    def summary(self):
+        summary = {}
+        for name in sorted(set(self.latencies) | set(self.commands)):
+            latencies = sorted(self.latencies.get(name, []))
+            entry = {'n': len(latencies), 'timeouts': self.timeouts.get(name, 0)}
+            for p in (50, 95, 99):
+                entry['p%d' % p] = percentile(latencies, p) * 1000 if latencies else None
+            if name in self.commands:
+                entry['commands'] = sum(self.commands[name]) / float(len(self.commands[name]))
+            summary[name] = entry
+        return summary
+
+
+def percentile(values, p):
+    index = min(len(values) - 1, max(0, int(round(p / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+# The r0-r3 revisions import Phidget22, point those modules at the simulated channel classes
+def alias_phidget22(backend):
+    names = {
+        'Phidget22.Devices.DCMotor': ['DCMotor'],
+        'Phidget22.Devices.CurrentInput': ['CurrentInput'],
+        'Phidget22.Devices.DigitalOutput': ['DigitalOutput'],
+        'Phidget22.Devices.VoltageOutput': ['VoltageOutput'],
+        'Phidget22.Devices.VoltageRatioInput': ['VoltageRatioInput'],
+        'Phidget22.Devices.Manager': ['Manager'],
+        'Phidget22.Net': ['Net', 'PhidgetServerType'],
+        'Phidget22.PhidgetServerType': ['PhidgetServerType'],
+        'Phidget22.PhidgetException': ['PhidgetException'],
+    }
+    for package in ('Phidget22', 'Phidget22.Devices'):
+        module = types.ModuleType(package)
+        module.__path__ = []
+        sys.modules[package] = module
+    for module_name, attributes in names.items():
+        module = types.ModuleType(module_name)
+        for attribute in attributes:
+            setattr(module, attribute, getattr(backend, attribute))
+        sys.modules[module_name] = module
+
+
+def start_standin(latency, jitter, loss):
+    path = os.path.join(HERE, 'TIMC-Phidget Standin Server.py')
+    spec = importlib.util.spec_from_file_location('timc_standin', path)
+    standin = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(standin)
+    server = standin.StandinServer(('localhost', 0), standin.Link(latency, jitter, loss, 200.0), False)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['TIMC_REMOTE'] = 'localhost:%d' % server.server_address[1]
+
+
+def pump_until(root, done, timeout=TIMEOUT):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        root.update()
+        if done():
+            return True
+        time.sleep(0.0005)
+    return False
+
+
+def pump_for(root, seconds):
+    pump_until(root, lambda: False, seconds)
+
+
+def address(axis_frame):
+    return (axis_frame.axis.getDeviceSerialNumber(), axis_frame.axis.getHubPort())
+
+
+# Time from an event until a command for the axis arrives whose value satisfies moving/stopped
+def measure(root, log, target, generate, arrived):
+    start = time.perf_counter()
+    generate()
+    if not pump_until(root, lambda: any(arrived(c[4]) for c in log.since(start, target))):
+        return None
+    return min(c[0] for c in log.since(start, target) if arrived(c[4])) - start
+
+
+def key_jog(root, log, results, axis_frames, target, repeat):
+    for i in range(repeat):
+        latency = measure(root, log, target, lambda: root.event_generate('<KeyPress>', keysym='w'), lambda v: v != 0)
+        results.add('key_jog press', latency)
+        # Revisions without keyboard bindings
+        if latency is None:
+            return
+        pump_for(root, SETTLE)
+        results.add('key_jog release', measure(root, log, target,
+                                               lambda: root.event_generate('<KeyRelease>', keysym='w'),
+                                               lambda v: v == 0))
+        pump_for(root, SETTLE)
+
+
+def button_jog(root, log, results, axis_frames, target, repeat):
+    button = [f for f in axis_frames if address(f) == target][0].jog_pos_btn
+    for i in range(repeat):
+        results.add('button_jog press', measure(root, log, target, lambda: button.event_generate('<ButtonPress-1>'),
+                                                lambda v: v != 0))
+        pump_for(root, SETTLE)
+        results.add('button_jog release', measure(root, log, target,
+                                                  lambda: button.event_generate('<ButtonRelease-1>'),
+                                                  lambda v: v == 0))
+        pump_for(root, SETTLE)
+
+
+# X11 autorepeat: a release immediately followed by a press every 33 ms while the key is held
+def held_key(root, log, results, axis_frames, target, repeat):
+    for i in range(max(1, repeat // 10)):
+        start = time.perf_counter()
+        root.event_generate('<KeyPress>', keysym='w')
+        while time.perf_counter() - start < 1.0:
+            pump_for(root, 0.033)
+            root.event_generate('<KeyRelease>', keysym='w')
+            root.event_generate('<KeyPress>', keysym='w')
+        root.event_generate('<KeyRelease>', keysym='w')
+        pump_for(root, 0.5)
+        results.count('held_key 1 s', len(log.since(start, target)))
+
+
+def all_stop(root, log, results, axis_frames, target, repeat):
+    addresses = [address(f) for f in axis_frames]
+    for i in range(repeat):
+        start = time.perf_counter()
+        for axis_frame in axis_frames:
+            axis_frame.jog_pos_btn.event_generate('<ButtonPress-1>')
+        pump_until(root, lambda: all(any(c[4] != 0 for c in log.since(start, a)) for a in addresses))
+        pump_for(root, SETTLE)
+        stop = time.perf_counter()
+        root.event_generate('<FocusOut>')
+        stopped = pump_until(root, lambda: all(any(c[4] == 0 for c in log.since(stop, a)) for a in addresses))
+        if stopped:
+            results.add('all_stop', max(min(c[0] for c in log.since(stop, a) if c[4] == 0) for a in addresses) - stop)
+            results.count('all_stop', len(log.since(stop)))
+        else:
+            results.add('all_stop', None)
+        for axis_frame in axis_frames:
+            axis_frame.jog_pos_btn.event_generate('<ButtonRelease-1>')
+        pump_for(root, SETTLE)
+        # Revisions without the FocusOut all stop
+        if not stopped:
+            return
+
+
+SCENARIOS = [key_jog, button_jog, held_key, all_stop]
+
+
+def print_summary(label, summary, baselines, against):
+    print('\n%s' % label)
+    print('%-20s %6s %8s %9s %9s %9s %9s' % ('interaction', 'n', 'timeouts', 'p50 ms', 'p95 ms', 'p99 ms', 'commands'))
+    for name, entry in summary.items():
+        cells = ['%9.1f' % entry[p] if entry[p] is not None else '%9s' % '-' for p in ('p50', 'p95', 'p99')]
+        commands = '%9.1f' % entry['commands'] if 'commands' in entry else '%9s' % '-'
+        line = '%-20s %6d %8d %s %s' % (name, entry['n'], entry['timeouts'], ' '.join(cells), commands)
+        old = baselines.get(against, {}).get('results', {}).get(name) if against else None
+        if old and old.get('p95') and entry['p95'] is not None:
+            line += '   p95 %+.0f %% vs %s' % ((entry['p95'] / old['p95'] - 1) * 100, against)
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Event to hub latency benchmark for the Electrical controllers')
+    parser.add_argument('script', help='controller revision, e.g. 046_TIMC-Digital_MANTIS-Electrical_rTC.py')
+    parser.add_argument('--backend', choices=['sim', 'remote'], default='sim')
+    parser.add_argument('--latency', type=float, default=0.0, help='stand-in one-way delay in ms')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--loss', type=float, default=0.0)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--save', metavar='LABEL', help='store the results in the baseline file under LABEL')
+    parser.add_argument('--against', metavar='LABEL', help='compare p95 with a stored baseline')
+    parser.add_argument('--baselines', default=BASELINES)
+    args = parser.parse_args()
+
+    os.environ['TIMC_BACKEND'] = args.backend
+    os.environ.setdefault('TIMC_SIM_LATENCY', '0.02')
+    if args.backend == 'remote':
+        start_standin(args.latency, args.jitter, args.loss)
+    sys.path.insert(0, HERE)
+    import timc_sim
+    backend = timc_sim
+    if args.backend == 'remote':
+        import timc_remote
+        backend = timc_remote
+    alias_phidget22(backend)
+    log = CommandLog()
+    timc_sim.cabinet.command_listeners.append(log.listener)
+    results = Results()
+
+    import tkinter
+
+    # The controller scripts end with root.mainloop(), the benchmark runs in its place
+    def run_benchmark(root, n=0):
+        hub2 = sys._getframe(1).f_globals['HUB2']
+        axis_frames = [o for o in gc.get_objects() if type(o).__name__ == 'AxisFrame' and hasattr(o, 'jog_pos_btn')]
+        root.update()
+        root.focus_force()
+        if not pump_until(root, lambda: all(f.axis.getAttached() for f in axis_frames), 10.0):
+            print('Not every axis attached, results will have timeouts')
+        pump_for(root, 1.0)
+        target = [address(f) for f in axis_frames if address(f) == (hub2, 0)][0]
+        for scenario in SCENARIOS:
+            print('Running %s' % scenario.__name__)
+            scenario(root, log, results, axis_frames, target, args.repeat)
+        root.destroy()
+
+    tkinter.Tk.mainloop = run_benchmark
+    runpy.run_path(os.path.join(HERE, args.script) if not os.path.exists(args.script) else args.script,
+                   run_name='__main__')
+
+    label = '%s (%s%s)' % (os.path.basename(args.script), args.backend,
+                           ', %.0f ms' % args.latency if args.backend == 'remote' else '')
+    summary = results.summary()
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+    print_summary(label, summary, baselines, args.against)
+    if args.save:
+        baselines[args.save] = {'script': os.path.basename(args.script), 'backend': args.backend,
+                                'latency_ms': args.latency, 'jitter_ms': args.jitter, 'loss': args.loss,
+                                'date': datetime.datetime.now().isoformat(timespec='seconds'), 'results': summary}
+        with open(args.baselines, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print('Saved as %s in %s' % (args.save, args.baselines))
+
+
+if __name__ == '__main__':
+    main()
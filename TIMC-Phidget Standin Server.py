@@ -0,0 +1,216 @@
+###################################################################
+# Tooling Inspection Motion Controller - Phidget network stand-in
+#
+# Description:
+#   Stands in for the remote Phidget hubs of a cabinet so the Electrical
+# and Pneumatic controllers can be run end to end on a laptop. Start this
+# server, then start a controller with TIMC_BACKEND=remote (and
+# TIMC_REMOTE=host:port if it is not on localhost:5661).
+#   The hubs are simulated by timc_sim; a hub serial number exists as soon
+# as a controller addresses one of its channels, so every system profile
+# (030-032, 040-046, TEST) is served without configuration.
+#   Every message in both directions is delayed by --latency ms +/-
+# --jitter ms. A lost packet (--loss, fraction 0-1) is modelled the way
+# TCP sees it: the message and everything behind it waits for a
+# retransmission (--rto ms, doubling for repeated losses). --drop-every
+# disconnects all clients periodically to exercise reconnect handling and
+# --log-commands prints the one-way delay of every command received.
+#
+# Example:
+#   python "TIMC-Phidget Standin Server.py" --latency 40 --jitter 15 --loss 0.02 --offline 671893
+
+import argparse
+import json
+import queue
+import random
+import socketserver
+import threading
+import time
+
+import timc_sim
+
+
+class Link:
+    def __init__(self, latency, jitter, loss, rto):
+        self.latency = latency / 1000.0
+        self.jitter = jitter / 1000.0
+        self.loss = loss
+        self.rto = rto / 1000.0
+
+    def delay(self):
+        delay = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        rto = self.rto
+        while random.random() < self.loss:
+            delay += rto
+            rto *= 2
+        return delay
+
+
+# Delivers messages in order after the link delay, a late message holds back the ones behind it like TCP does
+class DelayLine:
+    def __init__(self, link, deliver):
+        self.link = link
+        self.deliver = deliver
+        self.queue = queue.Queue()
+        self.last_due = 0.0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def put(self, message):
+        with self.lock:
+            due = max(self.last_due, time.perf_counter() + self.link.delay())
+            self.last_due = due
+        self.queue.put((due, message))
+
+    def run(self):
+        while True:
+            due, message = self.queue.get()
+            if message is None:
+                return
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            self.deliver(message)
+
+    def stop(self):
+        self.queue.put((0.0, None))
+
+
+class ClientHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        socketserver.StreamRequestHandler.setup(self)
+        self.server.clients.append(self)
+        self.send_lock = threading.Lock()
+        self.channels = {}
+        self.managers = []
+        self.outgoing = DelayLine(self.server.link, self.write)
+        self.incoming = DelayLine(self.server.link, self.handle_message)
+        print('Client connected from %s:%d' % self.client_address)
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                self.incoming.put(json.loads(line))
+            except ValueError:
+                print('Bad message from %s:%d' % self.client_address)
+
+    def finish(self):
+        print('Client %s:%d disconnected' % self.client_address)
+        self.server.clients.remove(self)
+        self.incoming.stop()
+        self.outgoing.stop()
+        for channel in self.channels.values():
+            channel.close()
+        for manager in self.managers:
+            manager.close()
+        socketserver.StreamRequestHandler.finish(self)
+
+    def send(self, message):
+        self.outgoing.put(message)
+
+    def write(self, message):
+        with self.send_lock:
+            try:
+                self.wfile.write((json.dumps(message) + '\n').encode())
+                self.wfile.flush()
+            except (OSError, ValueError):
+                pass
+
+    def handle_message(self, message):
+        op = message['op']
+        if op == 'create':
+            self.create(message['id'], message['address'])
+        elif op == 'open':
+            self.channels[message['id']].open()
+        elif op == 'close':
+            self.channels[message['id']].close()
+        elif op == 'call':
+            self.call(message)
+        elif op == 'manager':
+            manager = timc_sim.Manager()
+            manager.setOnAttachHandler(lambda m, a: self.send({'op': 'announce', 'address': list(a.address)}))
+            manager.setOnDetachHandler(lambda m, a: self.send({'op': 'withdraw', 'address': list(a.address)}))
+            self.managers.append(manager)
+            manager.open()
+        elif op == 'regulator':
+            timc_sim.link_regulator(*message['parts'])
+
+    def create(self, proxy_id, address):
+        if proxy_id in self.channels:
+            return
+        class_name, serial_number, hub_port, ch, is_hub_port_device = address
+        channel = getattr(timc_sim, class_name)()
+        channel.setDeviceSerialNumber(serial_number)
+        channel.setIsHubPortDevice(is_hub_port_device)
+        channel.setHubPort(hub_port)
+        channel.setOnAttachHandler(lambda c: self.send({'op': 'attach', 'id': proxy_id}))
+        channel.setOnDetachHandler(lambda c: self.send({'op': 'detach', 'id': proxy_id}))
+        # Inputs stream their values whether or not the controller has a change handler, like a network server
+        if isinstance(channel, timc_sim.SimInput):
+            channel.change_handler = lambda c, value: self.send({'op': 'event', 'id': proxy_id, 'value': value})
+        channel.setChannel(ch)
+        self.channels[proxy_id] = channel
+
+    def call(self, message):
+        channel = self.channels[message['id']]
+        if self.server.log_commands and 'sent' in message:
+            print('%-18s %-10s %-22s %8.1f ms' % (message['method'], channel.serial_number,
+                                                  message['args'], (time.time() - message['sent']) * 1000))
+        try:
+            value = getattr(channel, message['method'])(*message['args'])
+            self.send({'op': 'return', 'seq': message['seq'], 'value': value})
+        except timc_sim.PhidgetException as e:
+            self.send({'op': 'error', 'seq': message['seq'], 'code': e.code, 'details': e.details})
+
+
+class StandinServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, link, log_commands):
+        socketserver.ThreadingTCPServer.__init__(self, address, ClientHandler)
+        self.link = link
+        self.log_commands = log_commands
+        self.clients = []
+
+
+def drop_clients(server, interval):
+    while True:
+        time.sleep(interval)
+        print('Dropping all client connections')
+        for client in list(server.clients):
+            try:
+                client.connection.shutdown(2)
+            except OSError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in for the Phidget network server of a MANTIS cabinet')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5661)
+    parser.add_argument('--latency', type=float, default=0.0, help='one-way delay in ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- ms added to the delay')
+    parser.add_argument('--loss', type=float, default=0.0, help='fraction of packets lost and retransmitted')
+    parser.add_argument('--rto', type=float, default=200.0, help='retransmission timeout in ms')
+    parser.add_argument('--offline', type=int, nargs='*', default=[], help='hub serial numbers that are unplugged')
+    parser.add_argument('--drop-every', type=float, default=0.0, help='disconnect all clients every N seconds')
+    parser.add_argument('--log-commands', action='store_true')
+    args = parser.parse_args()
+
+    timc_sim.cabinet.offline.update(args.offline)
+    server = StandinServer((args.host, args.port), Link(args.latency, args.jitter, args.loss, args.rto),
+                           args.log_commands)
+    if args.drop_every > 0:
+        threading.Thread(target=drop_clients, args=(server, args.drop_every), daemon=True).start()
+    print('Stand-in server on %s:%d, latency %.0f +/- %.0f ms, loss %.1f %%'
+          % (args.host, args.port, args.latency, args.jitter, args.loss * 100))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print('Clean Exit')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+###################################################################
+# Tooling Inspection Motion Controller - Session replay
+#
+# Description:
+#   Plays back a recorded telemetry session (timc_telemetry) for review
+# after an inspection. The channels are shown grouped the way the
+# controller showed them: per axis the motor current, jog state (commanded
+# velocity) and over current lockout, per pneumatic channel the pressure,
+# set pressure, low pressure alarm, regulator power and command, HOLD and
+# solenoid, plus the camera outputs.
+#     python "TIMC-Session Replay.py" telemetry/20261018-020000_Electrical_046
+#     python "TIMC-Session Replay.py" Pneumatic_030       (newest matching session under ./telemetry)
+#   Play at 1x to 100x, or drag the timeline / enter a time to jump. A jump
+# seeks through the segment indexes (timc_telemetry.Playback) instead of
+# replaying from the start, so it takes the same time anywhere in a shift.
+
+import argparse
+import datetime
+import os
+import sys
+import time
+from tkinter import *
+
+import numpy as np
+
+import timc_telemetry
+
+SPEEDS = [1, 2, 5, 10, 20, 50, 100]
+FRAME_TIME = 50
+GROUP_COLUMNS = 7
+# Channel name suffixes, the rest of the name is the axis or pneumatic channel it belongs to
+SUFFIXES = [' set pressure', ' low pressure', ' current', ' velocity', ' lockout', ' pressure', ' power', ' command',
+            ' hold', ' solenoid']
+
+
+def split_name(channel):
+    for suffix in SUFFIXES:
+        if channel['name'].endswith(suffix):
+            return channel['name'][:-len(suffix)], suffix.strip()
+    return 'Cameras' if channel['kind'] == 'camera' else 'Other', channel['name']
+
+
+# Text and background of a channel value, by channel kind
+def show_value(kind, value):
+    if np.isnan(value):
+        return '-', 'light grey'
+    if kind == 'current':
+        return '%.3f A' % value, 'white'
+    if kind == 'velocity':
+        return ('%+.2f' % value, 'SpringGreen3') if value else ('STOP', 'white')
+    if kind == 'lockout':
+        return ('LOCKED', 'red') if value else ('ok', 'white')
+    if kind in ('pressure', 'setpoint'):
+        return '%.2f PSI' % value, 'white'
+    if kind == 'alarm':
+        return ('LOW', 'red') if value else ('ok', 'white')
+    if kind == 'state':
+        return ('ON', 'SpringGreen3') if value else ('OFF', 'white')
+    return '%.3g' % value, 'SpringGreen3' if value else 'white'
+
+
+def find_session(text, base):
+    if os.path.exists(os.path.join(text, 'channels.json')):
+        return timc_telemetry.Session(text)
+    found = [s for s in timc_telemetry.find_sessions(base) if text.lower() in s.name.lower()]
+    if not found:
+        sys.exit('No session under %s matches "%s"' % (base, text))
+    return found[-1]
+
+
+class ReplayWindow:
+    def __init__(self, master, session):
+        self.master = master
+        self.session = session
+        self.playback = timc_telemetry.Playback(session)
+        self.playing = False
+        self.last_frame = None
+        self.master.title('TIMC Session Replay - ' + session.name)
+
+        # One frame per axis / pneumatic channel, one row per recorded channel
+        groups = {}
+        self.cells = []
+        for channel in session.channels:
+            group, label = split_name(channel)
+            if group not in groups:
+                frame = Frame(master, borderwidth=2, relief=SUNKEN)
+                frame.grid(row=len(groups) // GROUP_COLUMNS, column=len(groups) % GROUP_COLUMNS, sticky=N + W + E,
+                           padx=2, pady=2)
+                Label(frame, text=group, font=('Comic Sans', 12)).grid(row=0, column=0, columnspan=2)
+                groups[group] = frame
+            frame = groups[group]
+            row = frame.grid_size()[1]
+            Label(frame, text=label).grid(row=row, column=0, sticky=W)
+            value = Label(frame, width=10, relief=SUNKEN)
+            value.grid(row=row, column=1)
+            self.cells.append((channel['kind'], value))
+
+        controls = Frame(master)
+        controls.grid(row=len(groups) // GROUP_COLUMNS + 1, column=0, columnspan=GROUP_COLUMNS, sticky=W + E)
+        self.play_btn = Button(controls, text='PLAY', width=6, command=self.toggle_play)
+        self.speed = IntVar()
+        self.speed.set(10)
+        speed_menu = OptionMenu(controls, self.speed, *SPEEDS)
+        self.position = DoubleVar()
+        duration = max(self.playback.t_end - self.playback.t_start, 0.1)
+        # Seek on drag/release rather than the scale command, which also fires when playback moves the scale
+        self.timeline = Scale(controls, orient=HORIZONTAL, from_=0, to=duration, resolution=0.1, showvalue=0,
+                              length=700, variable=self.position)
+        self.timeline.bind('<B1-Motion>', lambda event: self.seek(self.position.get()))
+        self.timeline.bind('<ButtonRelease-1>', lambda event: self.seek(self.position.get()))
+        self.clock = Label(controls, width=24, font=('Courier', 12))
+        self.goto = Entry(controls, width=20)
+        self.goto.bind('<Return>', lambda event: self.goto_time())
+        goto_btn = Button(controls, text='GO TO', command=self.goto_time)
+
+        self.play_btn.grid(row=0, column=0)
+        Label(controls, text='x').grid(row=0, column=1)
+        speed_menu.grid(row=0, column=2)
+        self.timeline.grid(row=0, column=3, padx=5)
+        self.clock.grid(row=0, column=4)
+        self.goto.grid(row=0, column=5)
+        goto_btn.grid(row=0, column=6)
+        master.bind('<KeyPress-space>', lambda event: self.toggle_play())
+
+        self.seek(0.0)
+        self.master.after(FRAME_TIME, self.frame)
+
+    def toggle_play(self):
+        self.playing = not self.playing
+        self.play_btn.config(text='PAUSE' if self.playing else 'PLAY')
+        self.last_frame = time.perf_counter()
+
+    def seek(self, offset):
+        self.playback.seek(self.playback.t_start + offset)
+        self.show(range(len(self.cells)))
+
+    # "HH:MM[:SS]" on the day the session started, or a full "YYYY-MM-DD HH:MM[:SS]"
+    def goto_time(self):
+        text = self.goto.get().strip()
+        day = datetime.datetime.fromtimestamp(self.playback.t_start).date()
+        for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%H:%M:%S', '%H:%M'):
+            try:
+                when = datetime.datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+            if not fmt.startswith('%Y'):
+                when = datetime.datetime.combine(day, when.time())
+            offset = min(max(time.mktime(when.timetuple()) - self.playback.t_start, 0.0), self.timeline.cget('to'))
+            self.position.set(offset)
+            self.seek(offset)
+            return
+        print('Unrecognised time "%s"' % text)
+
+    def frame(self):
+        self.master.after(FRAME_TIME, self.frame)
+        if not self.playing:
+            return
+        now = time.perf_counter()
+        t = min(self.playback.time + (now - self.last_frame) * self.speed.get(), self.playback.t_end)
+        self.last_frame = now
+        self.show(self.playback.advance(t))
+        self.position.set(t - self.playback.t_start)
+        if t >= self.playback.t_end:
+            self.toggle_play()
+
+    def show(self, channels):
+        values = self.playback.values
+        for channel in channels:
+            kind, cell = self.cells[channel]
+            text, background = show_value(kind, values[channel])
+            cell.config(text=text, bg=background)
+        self.clock.config(text=datetime.datetime.fromtimestamp(self.playback.time).strftime('%Y-%m-%d %H:%M:%S.%f')[:-5])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded TIMC telemetry session')
+    parser.add_argument('session', help='session directory, or part of a session name under --dir')
+    parser.add_argument('--dir', default=os.environ.get('TIMC_TELEMETRY', 'telemetry'),
+                        help='telemetry directory (TIMC_TELEMETRY)')
+    args = parser.parse_args()
+    session = find_session(args.session, args.dir)
+    root = Tk()
+    ReplayWindow(root, session)
+    root.mainloop()
+
+
+if __name__ == '__main__':
+    main()
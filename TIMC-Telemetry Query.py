@@ -0,0 +1,187 @@
+###################################################################
+# Tooling Inspection Motion Controller - Telemetry query
+#
+# Description:
+#   Answers questions about the recorded telemetry sessions (timc_telemetry)
+# from the command line, by channel name (as listed in channels.json) and
+# time range, across every session under the telemetry directory:
+#     python "TIMC-Telemetry Query.py" sessions
+#     python "TIMC-Telemetry Query.py" channels --session Electrical
+#     python "TIMC-Telemetry Query.py" stats "VARD VERT current" --from "2026-10-18 02:00" --to "2026-10-18 03:00"
+#     python "TIMC-Telemetry Query.py" events "Channel #3 low pressure" --above 0.5 --days 7
+#     python "TIMC-Telemetry Query.py" index
+#   A channel matches by exact name (case-insensitive), else by every name
+# containing the text. Ranges are answered from the per-block summaries of
+# the segment indexes, only the blocks at the edges of the range are read.
+# "index" writes the index of finished segments that have none (sessions
+# recorded before indexing, or left by a crash).
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import numpy as np
+
+import timc_telemetry
+
+TIME_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d']
+
+
+# "YYYY-MM-DD HH:MM[:SS]", "YYYY-MM-DD" or "HH:MM" (today), local time
+def parse_time(text):
+    for fmt in TIME_FORMATS:
+        try:
+            return time.mktime(datetime.datetime.strptime(text, fmt).timetuple())
+        except ValueError:
+            pass
+    try:
+        clock = datetime.datetime.strptime(text, '%H:%M').time()
+    except ValueError:
+        raise argparse.ArgumentTypeError('unrecognised time %r' % text)
+    return time.mktime(datetime.datetime.combine(datetime.date.today(), clock).timetuple())
+
+
+def show_time(t):
+    return datetime.datetime.fromtimestamp(t).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+def time_range(args):
+    t_from = args.t_from if args.t_from is not None else 0.0
+    t_to = args.t_to if args.t_to is not None else float('inf')
+    if args.days is not None:
+        t_from = max(t_from, time.time() - args.days * 86400)
+    return t_from, t_to
+
+
+def sessions(args):
+    return [session for session in timc_telemetry.find_sessions(args.dir)
+            if not args.session or args.session.lower() in session.name.lower()]
+
+
+def show_range(t_from, t_to):
+    return '%s and %s' % (show_time(t_from) if t_from > 0 else 'the first session',
+                          show_time(t_to) if t_to < float('inf') else 'now')
+
+
+# (session, channel id) for every session in the range with a channel matching the name
+def matches(args, t_from, t_to):
+    found, recorded = [], False
+    for session in sessions(args):
+        ids = session.find(args.channel)
+        if not ids:
+            continue
+        recorded = True
+        start, end = session.span()
+        if end < t_from or start > t_to:
+            continue
+        if len(ids) > 1:
+            names = ', '.join(session.channel_name(c) for c in ids)
+            sys.exit('%s: "%s" matches several channels (%s)' % (session.name, args.channel, names))
+        found.append((session, ids[0]))
+    if not recorded:
+        sys.exit('No recorded channel matches "%s"' % args.channel)
+    if not found:
+        sys.exit('No samples between %s' % show_range(t_from, t_to))
+    return found
+
+
+def list_sessions(args):
+    for session in sessions(args):
+        start, end = session.span()
+        print('%-40s %s - %s  %d segments, %d channels' % (session.name, show_time(start), show_time(end),
+                                                         len(session.segment_paths), len(session.channels)))
+
+
+def list_channels(args):
+    for session in sessions(args):
+        print(session.name)
+        for channel in session.channels:
+            print('  %4d  %-40s %-10s %s' % (channel['id'], channel['name'], channel['kind'], channel['unit']))
+
+
+def stats(args):
+    t_from, t_to = time_range(args)
+    total, low, high, weighted = 0, None, None, 0.0
+    for session, channel in matches(args, t_from, t_to):
+        count, s_low, s_high, mean = session.stats(channel, t_from, t_to)
+        if count == 0:
+            continue
+        print('%-40s %-30s %8d samples  min %10.4f  max %10.4f  mean %10.4f' % (
+            session.name, session.channel_name(channel), count, s_low, s_high, mean))
+        total += count
+        low = s_low if low is None else min(low, s_low)
+        high = s_high if high is None else max(high, s_high)
+        weighted += mean * count
+    if total == 0:
+        print('No samples between %s' % show_range(t_from, t_to))
+        return
+    print('Total: %d samples  min %.4f  max %.4f  peak %.4f  mean %.4f' % (
+        total, low, high, max(abs(low), abs(high)), weighted / total))
+
+
+def events(args):
+    if args.above is None and args.below is None:
+        sys.exit('events needs --above and/or --below')
+    t_from, t_to = time_range(args)
+    total = 0
+    for session, channel in matches(args, t_from, t_to):
+        for t, value in session.events(channel, t_from, t_to, args.above, args.below):
+            print('%s  %-40s %-30s %10.4f' % (show_time(t), session.name, session.channel_name(channel), value))
+            total += 1
+    print('%d events' % total)
+
+
+def index(args):
+    built = 0
+    for session in timc_telemetry.find_sessions(args.dir):
+        if args.session and args.session.lower() not in session.name.lower():
+            continue
+        paths = session.segment_paths
+        for i, path in enumerate(paths):
+            if os.path.exists(timc_telemetry.index_path(path)):
+                continue
+            # The last segment of a session that is still recording is not finished
+            if i == len(paths) - 1 and not args.all and time.time() - os.path.getmtime(path) < 60:
+                print('Skipping %s, still being written (use --all to index it anyway)' % path)
+                continue
+            records = timc_telemetry.valid_records(np.memmap(path, dtype=timc_telemetry.RECORD, mode='r'))
+            timc_telemetry.write_index(path, records)
+            built += 1
+            print('Indexed %s, %d records' % (path, len(records)))
+    print('%d segments indexed' % built)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query recorded TIMC telemetry')
+    parser.add_argument('--dir', default=os.environ.get('TIMC_TELEMETRY', 'telemetry'),
+                        help='telemetry directory (TIMC_TELEMETRY)')
+    parser.add_argument('--session', help='only sessions whose name contains this, e.g. Electrical or a date')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('sessions', help='list the recorded sessions').set_defaults(run=list_sessions)
+    commands.add_parser('channels', help='list the channels of each session').set_defaults(run=list_channels)
+
+    ranged = argparse.ArgumentParser(add_help=False)
+    ranged.add_argument('channel', help='channel name, e.g. "VARD VERT current"')
+    ranged.add_argument('--from', dest='t_from', type=parse_time, help='start, "YYYY-MM-DD HH:MM" or "HH:MM"')
+    ranged.add_argument('--to', dest='t_to', type=parse_time, help='end, as --from')
+    ranged.add_argument('--days', type=float, help='only the last N days')
+
+    command = commands.add_parser('stats', parents=[ranged], help='sample count, min, max, peak and mean')
+    command.set_defaults(run=stats)
+    command = commands.add_parser('events', parents=[ranged], help='times the value goes above/below a level')
+    command.add_argument('--above', type=float)
+    command.add_argument('--below', type=float)
+    command.set_defaults(run=events)
+    command = commands.add_parser('index', help='index finished segments that have no index')
+    command.add_argument('--all', action='store_true', help='also index segments that may still be recording')
+    command.set_defaults(run=index)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
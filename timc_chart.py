@@ -0,0 +1,148 @@
+###################################################################
+# Tooling Inspection Motion Controller - Strip chart
+#
+# Description:
+#   A strip chart of the last `span` seconds of several signals (motor
+# currents, pressures) in its own Toplevel, opened and closed from the
+# controller. The history is kept already decimated: the span is divided
+# into `columns` buckets, one per pixel column, and every sample only
+# updates the min and max of its bucket. A redraw draws the min/max envelope
+# of every series from those buckets, so its cost depends on the chart width
+# and not on how many samples arrived.
+#   add() may be called from any thread (the Phidget current handlers) and
+# keeps collecting while the window is closed, so opening it shows the
+# history. The window redraws at most `fps` times a second, and less often
+# if a redraw takes long, so drawing never uses more than about a tenth of
+# the Tk thread and the jog controls stay responsive.
+
+import threading
+import time
+from tkinter import Toplevel, Canvas, Frame, Label, LEFT
+
+import numpy as np
+
+from timc_tk import LOW
+
+MARGIN = 50
+
+
+class StripChart:
+    def __init__(self, title, unit, colors, scheduler, span=300.0, columns=600, height=300, max_series=16, fps=5):
+        self.title = title
+        self.scheduler = scheduler
+        self.unit = unit
+        self.colors = colors
+        self.span = span
+        self.columns = columns
+        self.height = height
+        self.fps = fps
+        self.bucket = span / columns
+        self.low = np.full((max_series, columns), np.nan)
+        self.high = np.full((max_series, columns), np.nan)
+        self.names = []
+        # Absolute bucket number (monotonic time / bucket) of the newest column
+        self.head = None
+        self.lock = threading.Lock()
+        self.window = None
+        self.redraw_task = None
+        self.draw_time = 0.0
+
+    def series(self, name):
+        if len(self.names) == len(self.low):
+            raise ValueError('StripChart is full, %d series' % len(self.names))
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def add(self, series, value, t=None):
+        bucket = int((time.monotonic() if t is None else t) // self.bucket)
+        head = self.head
+        if head is None or bucket > head:
+            self.advance(bucket)
+        elif bucket <= head - self.columns:
+            return
+        i = bucket % self.columns
+        value = float(value)
+        # NaN compares false, so the first sample of a bucket sets both
+        if not self.low[series, i] <= value:
+            self.low[series, i] = value
+        if not self.high[series, i] >= value:
+            self.high[series, i] = value
+
+    # Empties the columns between the old and the new head
+    def advance(self, bucket):
+        with self.lock:
+            if self.head is not None and bucket <= self.head:
+                return
+            first = bucket - self.columns + 1 if self.head is None else max(self.head + 1, bucket - self.columns + 1)
+            cleared = np.arange(first, bucket + 1) % self.columns
+            self.low[:, cleared] = np.nan
+            self.high[:, cleared] = np.nan
+            self.head = bucket
+
+    def toggle(self, master):
+        if self.window is not None:
+            self.close()
+        else:
+            self.open(master)
+
+    def open(self, master):
+        self.window = Toplevel(master)
+        self.window.title(self.title)
+        self.window.protocol('WM_DELETE_WINDOW', self.close)
+        self.canvas = Canvas(self.window, width=self.columns + MARGIN, height=self.height + 20, bg='gray15',
+                             highlightthickness=0)
+        self.canvas.pack()
+        self.canvas.create_line(MARGIN, 0, MARGIN, self.height, fill='gray50')
+        self.canvas.create_text(MARGIN, self.height + 10, text='-%d s' % self.span, fill='gray70', anchor='w')
+        self.canvas.create_text(MARGIN + self.columns, self.height + 10, text='now', fill='gray70', anchor='e')
+        self.top_label = self.canvas.create_text(MARGIN - 4, 8, fill='gray70', anchor='e')
+        self.bottom_label = self.canvas.create_text(MARGIN - 4, self.height - 8, fill='gray70', anchor='e')
+        self.lines = [self.canvas.create_line(0, 0, 0, 0, fill=self.colors[i % len(self.colors)])
+                      for i in range(len(self.names))]
+        legend = Frame(self.window, bg='gray15')
+        legend.pack(fill='x')
+        for i, name in enumerate(self.names):
+            Label(legend, text=name, fg=self.colors[i % len(self.colors)], bg='gray15').pack(side=LEFT, padx=2)
+        self.redraw()
+
+    def close(self):
+        if self.window is not None:
+            self.scheduler.cancel(self.redraw_task)
+            self.window.destroy()
+            self.window = None
+
+    def redraw(self):
+        if self.window is None:
+            return
+        # At most fps frames a second, fewer if drawing takes more than a tenth of the time
+        self.redraw_task = self.scheduler.after(max(int(1000 / self.fps), int(self.draw_time * 10000)), self.redraw, LOW,
+                                                'redraw', self.title)
+        if not self.window.winfo_viewable():
+            return
+        start = time.perf_counter()
+        self.advance(int(time.monotonic() // self.bucket))
+        order = np.arange(self.head + 1, self.head + 1 + self.columns) % self.columns
+        series = len(self.names)
+        low = self.low[:series, order]
+        high = self.high[:series, order]
+        seen = ~np.isnan(low)
+        if seen.any():
+            bottom = min(0.0, float(low[seen].min()))
+            top = float(high[seen].max())
+            top = top + 0.1 * (top - bottom) if top > bottom else bottom + 1.0
+            scale = self.height / (top - bottom)
+            self.canvas.itemconfigure(self.top_label, text='%.4g %s' % (top, self.unit))
+            self.canvas.itemconfigure(self.bottom_label, text='%.4g %s' % (bottom, self.unit))
+            x = np.arange(self.columns) + MARGIN
+            for i in range(series):
+                valid = seen[i]
+                if not valid.any():
+                    self.canvas.coords(self.lines[i], 0, 0, 0, 0)
+                    continue
+                # Down to the min and up to the max of every column, the envelope of the samples in it
+                points = np.empty((valid.sum(), 4))
+                points[:, 0] = points[:, 2] = x[valid]
+                points[:, 1] = self.height - (low[i, valid] - bottom) * scale
+                points[:, 3] = self.height - (high[i, valid] - bottom) * scale
+                self.canvas.coords(self.lines[i], *points.ravel().tolist())
+        self.draw_time = time.perf_counter() - start
@@ -0,0 +1,189 @@
+###################################################################
+# Tooling Inspection Motion Controller - Motor current statistics
+#
+# Description:
+#   One NumPy ring buffer (axes x samples) holds the motor current readings
+# of every axis with the time each arrived. A reading is written in place
+# from the Phidget handler, nothing is allocated per sample. update() works
+# out the mean, RMS, peak and slope (A/s) of every axis over each window
+# (1 s, 10 s and 60 s by default) in one vectorised step, called from the
+# Tk side at the display rate.
+#   The buffer holds `capacity` readings per axis; at the fastest data
+# interval (20 ms) the default of 4096 covers the 60 s window.
+#   ThermalModel is an I2t estimate of the motor winding heat of every axis,
+# theta = 1 being the trip point. Each update heats theta towards
+# (I_rms / I_rated)^2 with the motor thermal time constant tau, so a motor
+# run at its rated current settles just below the trip point, twice the
+# rated current trips after 0.29 tau, and a tripped motor is released once it
+# has cooled below `release` (tau * ln 2 = 7 s with no current for the
+# defaults).
+#   OverCurrentTimer is the fixed lockout kept as a backstop next to the I2t
+# model, which takes 12 s to trip at 60 % of the current limit and never trips
+# just above half of it: an axis whose 1 s mean current stays at or above
+# `fraction` of its current limit for `hold` seconds is locked out for
+# `lockout` seconds (3 s and 8 s, as the original per-axis timers).
+#   AdaptiveSampling picks the current data interval of each axis: fast while
+# the axis is commanded to move or draws current, slow once it has been idle
+# for `hold` seconds.
+
+import collections
+import time
+
+import numpy as np
+
+CurrentStats = collections.namedtuple('CurrentStats', 'mean rms peak slope count')
+
+
+class CurrentBuffer:
+    def __init__(self, max_axes=16, capacity=4096, windows=(1.0, 10.0, 60.0)):
+        self.capacity = capacity
+        self.windows = windows
+        self.values = np.zeros((max_axes, capacity))
+        self.times = np.full((max_axes, capacity), -np.inf)
+        # Plain lists so add() does not create NumPy scalars
+        self.head = [0] * max_axes
+        self.samples = [0] * max_axes
+        self.names = []
+        # window -> CurrentStats of arrays indexed by axis, refreshed by update()
+        self.stats = {}
+
+    def register(self, name):
+        if len(self.names) == len(self.head):
+            raise ValueError('CurrentBuffer is full, %d axes registered' % len(self.names))
+        self.names.append(name)
+        return len(self.names) - 1
+
+    # Called on the Phidget event thread for every reading
+    def add(self, axis, value, t=None):
+        head = self.head[axis]
+        self.values[axis, head] = value
+        self.times[axis, head] = time.perf_counter() if t is None else t
+        self.head[axis] = (head + 1) % self.capacity
+        self.samples[axis] += 1
+
+    def latest(self):
+        axes = len(self.names)
+        return self.values[np.arange(axes), (np.array(self.head[:axes]) - 1) % self.capacity]
+
+    def compute(self, window, now):
+        axes = len(self.names)
+        values = self.values[:axes]
+        mask = self.times[:axes] >= now - window
+        count = mask.sum(axis=1)
+        n = np.maximum(count, 1)
+
+        masked = np.where(mask, values, 0.0)
+        mean = masked.sum(axis=1) / n
+        rms = np.sqrt((masked * masked).sum(axis=1) / n)
+        peak = np.abs(masked).max(axis=1)
+
+        # Least squares slope of current against time
+        t = np.where(mask, self.times[:axes] - now, 0.0)
+        dt = np.where(mask, t - (t.sum(axis=1) / n)[:, None], 0.0)
+        dv = np.where(mask, values - mean[:, None], 0.0)
+        variance = (dt * dt).sum(axis=1)
+        slope = np.divide((dt * dv).sum(axis=1), variance, out=np.zeros(axes), where=variance > 0)
+
+        # A window without readings (slow sampling) reports the last reading
+        latest = self.latest()
+        empty = count == 0
+        mean = np.where(empty, latest, mean)
+        rms = np.where(empty, np.abs(latest), rms)
+        peak = np.where(empty, np.abs(latest), peak)
+        return CurrentStats(mean, rms, peak, slope, count)
+
+    def update(self, now=None):
+        if now is None:
+            now = time.perf_counter()
+        for window in self.windows:
+            self.stats[window] = self.compute(window, now)
+        return self.stats
+
+
+class ThermalModel:
+    def __init__(self, max_axes=16, tau=10.0, trip=1.0, release=0.5):
+        self.trip = trip
+        self.release = release
+        self.tau = np.full(max_axes, tau)
+        self.rated = np.ones(max_axes)
+        self.theta = np.zeros(max_axes)
+        self.locked = np.zeros(max_axes, dtype=bool)
+        self.last = None
+
+    # rated: the current the motor may carry continuously (A), tau: thermal time constant (s)
+    def configure(self, axis, rated=None, tau=None):
+        if rated is not None:
+            self.rated[axis] = rated
+        if tau is not None:
+            self.tau[axis] = tau
+
+    # Heats or cools every axis by the RMS current since the last update, returns the axes that tripped and released
+    def update(self, buffer, now, first_interval=0.1):
+        axes = len(buffer.names)
+        dt = first_interval if self.last is None else now - self.last
+        self.last = now
+        recent = buffer.compute(dt, now)
+        load = (recent.rms / self.rated[:axes]) ** 2
+        decay = np.exp(-dt / self.tau[:axes])
+        theta = self.theta[:axes]
+        theta[:] = load + (theta - load) * decay
+
+        locked = self.locked[:axes]
+        tripped = ~locked & (theta >= self.trip)
+        released = locked & (theta < self.release)
+        locked[tripped] = True
+        locked[released] = False
+        return np.flatnonzero(tripped), np.flatnonzero(released)
+
+
+class OverCurrentTimer:
+    def __init__(self, max_axes=16, fraction=0.5, hold=3.0, lockout=8.0):
+        self.fraction = fraction
+        self.hold = hold
+        self.lockout = lockout
+        self.limit = np.full(max_axes, np.inf)
+        # Last update each axis was below the threshold, NaN before its first update
+        self.last_below = np.full(max_axes, np.nan)
+        self.locked = np.zeros(max_axes, dtype=bool)
+        self.locked_at = np.full(max_axes, -np.inf)
+
+    # limit: the current limit of the axis (A)
+    def configure(self, axis, limit):
+        self.limit[axis] = limit
+
+    # current: mean current per axis (A). Returns the axes that tripped and released.
+    def update(self, now, current):
+        axes = len(current)
+        last_below = self.last_below[:axes]
+        below = np.abs(current) < self.fraction * self.limit[:axes]
+        last_below[below | np.isnan(last_below)] = now
+
+        locked = self.locked[:axes]
+        released = locked & (now - self.locked_at[:axes] >= self.lockout)
+        locked[released] = False
+        tripped = ~locked & (now - last_below >= self.hold)
+        locked[tripped] = True
+        self.locked_at[:axes][tripped] = now
+        # A stalled axis that is still over the threshold after the lockout needs another `hold` seconds to trip again
+        last_below[tripped] = now
+        return np.flatnonzero(tripped), np.flatnonzero(released)
+
+
+class AdaptiveSampling:
+    def __init__(self, max_axes=16, fast=50, slow=1000, threshold=0.1, hold=2.0):
+        self.fast = fast
+        self.slow = slow
+        self.threshold = threshold
+        self.hold = hold
+        self.interval = np.full(max_axes, slow)
+        self.last_active = np.full(max_axes, -np.inf)
+
+    # commanded: bool per axis, current: latest reading per axis (A). Returns the axes whose interval changed.
+    def update(self, now, commanded, current):
+        axes = len(commanded)
+        active = np.asarray(commanded) | (np.abs(current) > self.threshold)
+        self.last_active[:axes][active] = now
+        wanted = np.where(now - self.last_active[:axes] < self.hold, self.fast, self.slow)
+        changed = np.flatnonzero(wanted != self.interval[:axes])
+        self.interval[:axes] = wanted
+        return changed
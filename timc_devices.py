@@ -0,0 +1,374 @@
+###################################################################
+# Tooling Inspection Motion Controller - Phidget channel handling
+#
+# Description:
+#   Shared by the Digital MANTIS Electrical and Pneumatic controllers.
+# Channels are described by a ChannelSpec (type, hub serial number, hub
+# port, channel) and bound to the frame that uses them. A Phidget Manager
+# announces the channels present on the network and the engine opens the
+# matching channels as they appear, so nothing waits on attachment.
+#   When a channel detaches a background loop re-opens it with exponential
+# backoff until it is back. On every attach the safe state (e.g. velocity 0)
+# and then the remembered settings (current limit, light level...) are
+# written to the channel before the frame's attach handler runs.
+#   Commands from the Tk handlers go through the CommandDispatcher so the GUI
+# never waits on the network: each output keeps only its newest setpoint and
+# stop commands are sent ahead of everything else. The StopPath writes the
+# all-stop to every motion output in parallel and measures how long it took.
+#   The controllers import their channel classes from here. TIMC_BACKEND=sim
+# selects the simulated cabinet in timc_sim instead of the Phidget22 library,
+# TIMC_BACKEND=remote the stand-in network server through timc_remote.
+
+import collections
+import os
+import queue
+import threading
+import time
+
+from timc_tk import TkPump
+
+BACKEND = os.environ.get('TIMC_BACKEND', 'phidget')
+
+if BACKEND == 'sim':
+    print('Running against the simulated cabinet')
+    from timc_sim import DCMotor, CurrentInput, DigitalOutput, VoltageOutput, VoltageRatioInput, Manager, Net, \
+        PhidgetServerType, PhidgetException, link_regulator
+elif BACKEND == 'remote':
+    print('Running against the stand-in network server')
+    from timc_remote import DCMotor, CurrentInput, DigitalOutput, VoltageOutput, VoltageRatioInput, Manager, Net, \
+        PhidgetServerType, PhidgetException, link_regulator
+else:
+    from Phidget22.Devices.DCMotor import DCMotor
+    from Phidget22.Devices.CurrentInput import CurrentInput
+    from Phidget22.Devices.DigitalOutput import DigitalOutput
+    from Phidget22.Devices.VoltageOutput import VoltageOutput
+    from Phidget22.Devices.VoltageRatioInput import VoltageRatioInput
+    from Phidget22.Devices.Manager import Manager
+    from Phidget22.Net import Net
+    from Phidget22.PhidgetServerType import PhidgetServerType
+    from Phidget22.PhidgetException import PhidgetException
+
+    # Only the simulator needs to know which relay, output and input make up a regulator
+    def link_regulator(reg_pwr, reg_set, reg_get):
+        pass
+
+
+class ChannelSpec:
+    def __init__(self, channel_class, serial_number, hub_port, channel, is_hub_port_device=False):
+        self.channel_class = channel_class
+        self.serial_number = serial_number
+        # None for devices that are not on a VINT hub (e.g. the interface kit)
+        self.hub_port = hub_port
+        self.channel = channel
+        self.is_hub_port_device = is_hub_port_device
+
+    def create(self):
+        channel = self.channel_class()
+        channel.setDeviceSerialNumber(self.serial_number)
+        if self.hub_port is not None:
+            channel.setIsHubPortDevice(self.is_hub_port_device)
+            channel.setHubPort(self.hub_port)
+        channel.setChannel(self.channel)
+        return channel
+
+    def matches(self, channel_class, announced):
+        if channel_class != announced.getChannelClass():
+            return False
+        if self.serial_number != announced.getDeviceSerialNumber() or self.channel != announced.getChannel():
+            return False
+        if self.hub_port is None:
+            return True
+        return self.hub_port == announced.getHubPort() and self.is_hub_port_device == announced.getIsHubPortDevice()
+
+    def __str__(self):
+        return '%s %s/%s/%s' % (self.channel_class.__name__, self.serial_number, self.hub_port, self.channel)
+
+
+class Binding:
+    def __init__(self, spec, channel, on_attach, on_detach, safe_state):
+        self.spec = spec
+        self.channel = channel
+        self.channel_class = channel.getChannelClass()
+        self.on_attach = on_attach
+        self.on_detach = on_detach
+        self.opened = False
+        # Setter name: value, written on every attach. Safe state first, then the remembered settings in order.
+        self.safe_state = dict(safe_state or {})
+        self.settings = {}
+        self.attached = threading.Event()
+        self.reconnecting = False
+
+
+class CommandDispatcher:
+    def __init__(self, workers=4):
+        self.condition = threading.Condition()
+        # (channel, setter) -> newest value not sent yet, a newer setpoint replaces an older one
+        self.mailboxes = {}
+        self.urgent = collections.deque()
+        self.ready = collections.deque()
+        # At most one call in flight per mailbox so commands to an output keep their order
+        self.busy = set()
+        # (channel, setter) -> last value commanded, whether or not it has been sent yet
+        self.commanded = {}
+        # Called with (channel, setter, value) for every command submitted, e.g. the telemetry recorder
+        self.observers = []
+        self.sent = 0
+        self.replaced = 0
+        for i in range(workers):
+            threading.Thread(target=self.work, daemon=True).start()
+
+    # Queue a command without waiting, stop=True sends it before any pending setpoints
+    def submit(self, channel, setter, value, stop=False):
+        key = (id(channel), setter)
+        self.commanded[key] = value
+        for observer in self.observers:
+            observer(channel, setter, value)
+        with self.condition:
+            waiting = key in self.mailboxes
+            if waiting:
+                self.replaced += 1
+            self.mailboxes[key] = (channel, setter, value)
+            if stop:
+                if waiting and key in self.ready:
+                    self.ready.remove(key)
+                if key not in self.urgent:
+                    self.urgent.append(key)
+            elif not waiting:
+                self.ready.append(key)
+            self.condition.notify()
+
+    # Queue (channel, setter, value) outputs, a zero or False value is a stop
+    def submit_all(self, outputs):
+        for channel, setter, value in outputs:
+            self.submit(channel, setter, value, stop=not value)
+
+    def latest(self, channel, setter, default=None):
+        return self.commanded.get((id(channel), setter), default)
+
+    # Drop the pending command for an output, returns True if one is being sent right now
+    def cancel(self, channel, setter):
+        key = (id(channel), setter)
+        with self.condition:
+            if self.mailboxes.pop(key, None) is not None:
+                for lane in (self.urgent, self.ready):
+                    if key in lane:
+                        lane.remove(key)
+            return key in self.busy
+
+    def next_command(self):
+        for lane in (self.urgent, self.ready):
+            for key in lane:
+                if key not in self.busy:
+                    lane.remove(key)
+                    self.busy.add(key)
+                    return key, self.mailboxes.pop(key)
+        return None, None
+
+    def work(self):
+        while True:
+            with self.condition:
+                key, command = self.next_command()
+                while command is None:
+                    self.condition.wait()
+                    key, command = self.next_command()
+            channel, setter, value = command
+            try:
+                # Commands for a detached channel are dropped, the engine writes the safe state when it returns
+                if channel.getAttached():
+                    getattr(channel, setter)(value)
+                    self.sent += 1
+            except PhidgetException as e:
+                print('%s(%s) failed: %s' % (setter, value, e.details))
+            finally:
+                with self.condition:
+                    self.busy.discard(key)
+                    self.condition.notify_all()
+
+
+class StopRound:
+    def __init__(self, outputs):
+        self.started = time.perf_counter()
+        self.outputs = outputs
+        self.remaining = outputs
+        self.skipped = 0
+
+
+# All-stop path kept apart from the dispatcher queues. Every motion output has its own thread waiting for a
+# stop, so trigger() writes all the zeros at once and the stop takes one round trip instead of one per output.
+# Each trigger is a round handed to every output thread through its queue, so a second stop (Escape then focus
+# lost) while the first is still being written is a round of its own and each reports its own latency.
+class StopPath:
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        self.lock = threading.Lock()
+        self.queues = []
+        self.latency = None
+        self.latencies = collections.deque(maxlen=100)
+
+    def add(self, channel, setter, value):
+        rounds = queue.SimpleQueue()
+        self.queues.append(rounds)
+        threading.Thread(target=self.wait_for_stop, args=(rounds, channel, setter, value), daemon=True).start()
+
+    # Safe to call from the Tk thread, returns without waiting for the outputs
+    def trigger(self):
+        stop_round = StopRound(len(self.queues))
+        for rounds in self.queues:
+            rounds.put(stop_round)
+
+    def wait_for_stop(self, rounds, channel, setter, value):
+        while True:
+            stop_round = rounds.get()
+            # A setpoint waiting in the dispatcher must not follow the stop, one already being sent is chased by a
+            # second stop queued behind it
+            in_flight = self.dispatcher.cancel(channel, setter)
+            self.dispatcher.commanded[(id(channel), setter)] = value
+            for observer in self.dispatcher.observers:
+                observer(channel, setter, value)
+            sent = False
+            try:
+                if channel.getAttached():
+                    getattr(channel, setter)(value)
+                    sent = True
+            except PhidgetException as e:
+                print('All stop %s(%s) failed: %s' % (setter, value, e.details))
+            if in_flight:
+                self.dispatcher.submit(channel, setter, value, stop=True)
+            self.finished(stop_round, sent)
+
+    def finished(self, stop_round, sent):
+        with self.lock:
+            if not sent:
+                stop_round.skipped += 1
+            stop_round.remaining -= 1
+            if stop_round.remaining > 0:
+                return
+            self.latency = time.perf_counter() - stop_round.started
+            self.latencies.append(self.latency)
+        print('All stop: %d outputs stopped in %.1f ms (%d not attached)'
+              % (stop_round.outputs - stop_round.skipped, self.latency * 1000, stop_round.skipped))
+
+
+class AttachmentEngine:
+    def __init__(self, dispatcher=None, reconnect_min=0.5, reconnect_max=30.0):
+        self.dispatcher = dispatcher
+        self.bindings = []
+        self.by_channel = {}
+        self.lock = threading.Lock()
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        # Callbacks that must run on the Tk thread, drained in batches once pump() has started
+        self.gui = TkPump()
+        self.start_time = time.perf_counter()
+        self.hub_seen = {}
+        self.hub_channels = {}
+        self.manager = None
+
+    # Register a channel for a frame. on_attach and on_detach run on the Phidget event thread; use post() for Tk work.
+    # The channel object is returned immediately and is opened once the Manager reports it on the network.
+    def bind(self, spec, on_attach=None, on_detach=None, safe_state=None):
+        channel = spec.create()
+        binding = Binding(spec, channel, on_attach, on_detach, safe_state)
+        channel.setOnAttachHandler(lambda ch: self.channel_attached(binding))
+        channel.setOnDetachHandler(lambda ch: self.channel_detached(binding))
+        with self.lock:
+            self.bindings.append(binding)
+            self.by_channel[id(channel)] = binding
+        return channel
+
+    # Cache a setting so it is written again after a reconnect
+    def remember(self, channel, setter, value):
+        self.by_channel[id(channel)].settings[setter] = value
+
+    def recall(self, channel, setter, default=None):
+        return self.by_channel[id(channel)].settings.get(setter, default)
+
+    # Cache a setting and write it now if the channel is attached, through the dispatcher if there is one
+    def apply(self, channel, setter, value):
+        self.remember(channel, setter, value)
+        if self.dispatcher is not None:
+            self.dispatcher.submit(channel, setter, value)
+        elif channel.getAttached():
+            getattr(channel, setter)(value)
+
+    def post(self, func, key=None):
+        self.gui.post(func, key)
+
+    def start(self):
+        self.manager = Manager()
+        self.manager.setOnAttachHandler(self.manager_attached)
+        self.manager.setOnDetachHandler(self.manager_detached)
+        self.manager.open()
+
+    def pump(self, scheduler, interval=50):
+        self.gui.interval = interval
+        self.gui.start(scheduler)
+
+    def manager_attached(self, manager, announced):
+        serial_number = announced.getDeviceSerialNumber()
+        with self.lock:
+            if serial_number not in self.hub_seen:
+                self.hub_seen[serial_number] = time.perf_counter() - self.start_time
+            elif self.hub_channels.get(serial_number, 0) == 0:
+                print('Device %s is back on the network' % serial_number)
+            self.hub_channels[serial_number] = self.hub_channels.get(serial_number, 0) + 1
+            to_open = [b for b in self.bindings if not b.opened and b.spec.matches(b.channel_class, announced)]
+            for binding in to_open:
+                binding.opened = True
+        # Opened channels re-attach by themselves when their hub comes back, they are only opened once
+        for binding in to_open:
+            binding.channel.open()
+
+    def manager_detached(self, manager, announced):
+        serial_number = announced.getDeviceSerialNumber()
+        with self.lock:
+            self.hub_channels[serial_number] = self.hub_channels.get(serial_number, 1) - 1
+            if self.hub_channels[serial_number] == 0:
+                print('Device %s has left the network' % serial_number)
+
+    def channel_attached(self, binding):
+        try:
+            for setter, value in list(binding.safe_state.items()) + list(binding.settings.items()):
+                getattr(binding.channel, setter)(value)
+        except PhidgetException as e:
+            print('Could not restore %s: %s' % (binding.spec, e.details))
+        binding.attached.set()
+        if binding.on_attach is not None:
+            binding.on_attach()
+
+    def channel_detached(self, binding):
+        binding.attached.clear()
+        if binding.on_detach is not None:
+            binding.on_detach()
+        with self.lock:
+            if binding.reconnecting:
+                return
+            binding.reconnecting = True
+        threading.Thread(target=self.reconnect, args=(binding,), daemon=True).start()
+
+    # Background loop for one detached channel, re-opens it with exponential backoff until it attaches again
+    def reconnect(self, binding):
+        detached_at = time.perf_counter()
+        delay = self.reconnect_min
+        attempt = 0
+        while not binding.attached.wait(delay):
+            attempt += 1
+            print('%s detached, reconnect attempt %d' % (binding.spec, attempt))
+            try:
+                binding.channel.close()
+                binding.channel.open()
+            except PhidgetException as e:
+                print('Reconnect of %s failed: %s' % (binding.spec, e.details))
+            delay = min(delay * 2, self.reconnect_max)
+        with self.lock:
+            binding.reconnecting = False
+        print('%s reconnected after %.1f s' % (binding.spec, time.perf_counter() - detached_at))
+
+    # Print which hubs were found within the startup budget, called from the Tk loop so nothing blocks
+    def report_hubs(self, hubs, budget):
+        for name, serial_number in hubs.items():
+            if serial_number in self.hub_seen:
+                print('%s (%s): on-line, found after %.2f s' % (name, serial_number, self.hub_seen[serial_number]))
+            else:
+                print('%s (%s): off-line, not found within %.1f s, its channels open if it appears later'
+                      % (name, serial_number, budget))
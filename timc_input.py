@@ -0,0 +1,94 @@
+###################################################################
+# Tooling Inspection Motion Controller - Keyboard/gamepad input engine
+#
+# Description:
+#   Replaces one KeyPress/KeyRelease binding per key and direction with a
+# model of the keys being held. Key events only update the held set; a
+# control tick (50 Hz by default) works out the output every control should
+# have from the held keys and sends the outputs that changed through the
+# CommandDispatcher, so a held jog is one command instead of a stream of
+# autorepeat jog("+")/jog("0") pairs.
+#   X11 autorepeat delivers a KeyRelease immediately followed by a KeyPress
+# for a held key. A release is only acted on once it is older than
+# release_delay without a new press, which keeps the stop latency under one
+# tick plus release_delay.
+#   A control is a function taking a direction ("+", "-", "0", "L", "R"...)
+# and returning the (channel, setter, value) outputs it wants for that
+# direction. Two keys of one control held together mean "0".
+
+import time
+
+from timc_tk import HIGH
+
+
+class KeyStateEngine:
+    def __init__(self, dispatcher, tick=20, release_delay=0.01):
+        self.dispatcher = dispatcher
+        self.tick_interval = tick
+        self.release_delay = release_delay
+        self.keys = {}
+        self.controls = []
+        self.held = set()
+        self.released = {}
+        # (id(channel), setter) -> (channel, setter, value) last sent by the engine
+        self.driven = {}
+        self.events = 0
+        self.commands = 0
+
+    def map(self, keysym, control, direction):
+        self.keys[keysym] = (control, direction)
+        if control not in self.controls:
+            self.controls.append(control)
+
+    def attach(self, widget):
+        widget.bind('<KeyPress>', self.key_press, add='+')
+        widget.bind('<KeyRelease>', self.key_release, add='+')
+
+    def start(self, scheduler):
+        scheduler.every(self.tick_interval, self.tick, HIGH, 'key input')
+
+    def key_press(self, event):
+        if event.keysym in self.keys:
+            self.events += 1
+            self.released.pop(event.keysym, None)
+            self.held.add(event.keysym)
+
+    def key_release(self, event):
+        if event.keysym in self.keys:
+            self.events += 1
+            self.released[event.keysym] = time.perf_counter()
+
+    # Forget every held key, the next tick stops whatever the keys were driving
+    def release_all(self):
+        self.held.clear()
+        self.released.clear()
+
+    def directions(self):
+        held = dict((control, set()) for control in self.controls)
+        for keysym in self.held:
+            control, direction = self.keys[keysym]
+            held[control].add(direction)
+        return [(control, directions.pop() if len(directions) == 1 else "0") for control, directions in held.items()]
+
+    def tick(self):
+        now = time.perf_counter()
+        for keysym, released_at in list(self.released.items()):
+            if now - released_at >= self.release_delay:
+                del self.released[keysym]
+                self.held.discard(keysym)
+
+        desired = {}
+        for control, direction in self.directions():
+            for channel, setter, value in control(direction):
+                desired[(id(channel), setter)] = (channel, setter, value)
+        # An output a control no longer reports (e.g. a camera unlinked from the gamepad) is returned to zero
+        for key, (channel, setter, value) in self.driven.items():
+            if key not in desired and value:
+                desired[key] = (channel, setter, type(value)(0))
+
+        for key, (channel, setter, value) in desired.items():
+            previous = self.driven.get(key)
+            if (previous[2] if previous is not None else 0) != value:
+                self.dispatcher.submit(channel, setter, value, stop=not value)
+                self.commands += 1
+        self.driven = desired
@@ -0,0 +1,83 @@
+###################################################################
+# Tooling Inspection Motion Controller - Closed loop pressure regulation
+#
+# Description:
+#   The regulators are set open loop: the set pressure is converted to a
+# command voltage and the regulator is trusted to reach it. PressureLoop trims
+# that command against the measured pressure with a PI controller, for every
+# channel in one vectorised update called at a fixed rate from the Tk side.
+#   The command (PSI, converted to volts by the caller) is the set pressure
+# plus kp * error plus the integral, the correction limited to +/- `trim` PSI
+# and the command to the channel's `high` limit (the top of its set pressure
+# scale), so a low reading can never drive a channel past what the operator
+# could set. The proportional part drives a
+# channel to a new set pressure faster than the regulator alone, the integral
+# holds it against a leak. Anti-windup: the integral does not grow while the
+# command is limited in the direction of the error.
+#   A channel is only regulated while it is enabled, its reading is valid
+# (regulator powered, recent reading) and its set pressure is above zero.
+# Otherwise the integral is reset and the command falls back to the set
+# pressure, so venting (set pressure 0) always commands 0 exactly.
+
+import numpy as np
+
+
+class PressureLoop:
+    def __init__(self, max_channels=16, kp=0.4, ki=0.8, trim=15.0, low=0.0, high=130.5, deadband=0.05):
+        self.trim = trim
+        self.low = low
+        self.deadband = deadband
+        self.kp = np.full(max_channels, kp)
+        self.ki = np.full(max_channels, ki)
+        self.high = np.full(max_channels, high)
+        self.enabled = np.zeros(max_channels, dtype=bool)
+        self.setpoint = np.zeros(max_channels)
+        self.integral = np.zeros(max_channels)
+        self.command = np.zeros(max_channels)
+        # Last command sent to each regulator, a change smaller than the deadband is not sent
+        self.sent = np.zeros(max_channels)
+        self.last = None
+
+    # kp: PSI of correction per PSI of error, ki: PSI of correction per PSI of error and second, high: max command (PSI)
+    def configure(self, channel, kp=None, ki=None, high=None):
+        if kp is not None:
+            self.kp[channel] = kp
+        if ki is not None:
+            self.ki[channel] = ki
+        if high is not None:
+            self.high[channel] = high
+
+    # A new set pressure, returns the command to send for it straight away (keeps the integral of a regulated channel)
+    def set(self, channel, setpoint):
+        self.setpoint[channel] = setpoint
+        command = min(setpoint, float(self.high[channel]))
+        if self.enabled[channel] and setpoint > 0:
+            command = float(min(max(setpoint + self.integral[channel], self.low), self.high[channel]))
+        self.command[channel] = self.sent[channel] = command
+        return command
+
+    # measured: newest pressure per channel (PSI), valid: bool per channel. Returns the channels whose command changed.
+    def update(self, now, measured, valid, first_interval=0.1):
+        channels = len(measured)
+        dt = first_interval if self.last is None else now - self.last
+        self.last = now
+        setpoint = self.setpoint[:channels]
+        integral = self.integral[:channels]
+        active = self.enabled[:channels] & np.asarray(valid) & (setpoint > 0)
+        error = np.where(active, setpoint - np.where(active, measured, 0.0), 0.0)
+
+        proportional = self.kp[:channels] * error
+        candidate = integral + self.ki[:channels] * error * dt
+        high = self.high[:channels]
+        upper = np.minimum(setpoint + self.trim, high)
+        lower = np.minimum(np.maximum(setpoint - self.trim, self.low), upper)
+        wanted = setpoint + proportional + candidate
+        # Anti-windup: hold the integral while the command is limited and the error pushes further into the limit
+        hold = ((wanted > upper) & (error > 0)) | ((wanted < lower) & (error < 0))
+        integral[:] = np.where(active, np.where(hold, integral, candidate), 0.0)
+
+        command = np.minimum(np.where(active, np.clip(setpoint + proportional + integral, lower, upper), setpoint), high)
+        self.command[:channels] = command
+        changed = np.flatnonzero(np.abs(command - self.sent[:channels]) > self.deadband)
+        self.sent[changed] = command[changed]
+        return changed
@@ -0,0 +1,469 @@
+###################################################################
+# Tooling Inspection Motion Controller - Stand-in server client
+#
+# Description:
+#   Channel classes that talk to "TIMC-Phidget Standin Server.py" over
+# TCP, selected with TIMC_BACKEND=remote (see timc_devices). The server
+# runs the simulated cabinet from timc_sim and can inject latency, jitter
+# and packet loss, so the controllers see a slow network the way they do
+# on the rig: every set call is a blocking round trip, getters return the
+# last value received, and the channels detach when the link drops.
+#   TIMC_REMOTE=host:port selects the server, localhost:5661 by default.
+# The protocol is one JSON message per line; it is not the Phidget22
+# network protocol, only its timing behaviour is reproduced.
+
+import json
+import os
+import queue
+import socket
+import threading
+import time
+
+from timc_sim import ChannelClass, ErrorCode, PhidgetException, PhidgetServerType
+
+CALL_TIMEOUT = 5.0
+RECONNECT_MIN = 0.5
+RECONNECT_MAX = 10.0
+
+
+class Net:
+    @staticmethod
+    def enableServerDiscovery(server_type):
+        link.start()
+
+
+class RemoteLink:
+    def __init__(self, address):
+        host, port = address.rsplit(':', 1)
+        self.address = (host, int(port))
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.sock = None
+        self.started = False
+        self.next_id = 0
+        self.proxies = {}
+        self.managers = []
+        self.regulators = []
+        self.replies = {}
+        # Handlers run one at a time on this thread, like the Phidget22 event thread
+        self.events = queue.Queue()
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self.event_loop, daemon=True).start()
+        threading.Thread(target=self.connect_loop, daemon=True).start()
+
+    def event_loop(self):
+        while True:
+            func, args = self.events.get()
+            try:
+                func(*args)
+            except Exception as e:
+                print('Remote event handler raised %r' % e)
+
+    def fire(self, func, *args):
+        if func is not None:
+            self.events.put((func, args))
+
+    def new_id(self):
+        with self.lock:
+            self.next_id += 1
+            return self.next_id
+
+    def add(self, proxy):
+        with self.lock:
+            self.proxies[proxy.id] = proxy
+        self.start()
+        self.send({'op': 'create', 'id': proxy.id, 'address': proxy.address()})
+
+    def add_regulator(self, parts):
+        with self.lock:
+            self.regulators.append(parts)
+        self.start()
+        self.send({'op': 'regulator', 'parts': parts})
+
+    def add_manager(self, manager):
+        with self.lock:
+            self.managers.append(manager)
+        self.start()
+        self.send({'op': 'manager'})
+
+    def send(self, message):
+        line = (json.dumps(message) + '\n').encode()
+        with self.send_lock:
+            if self.sock is None:
+                return False
+            try:
+                self.sock.sendall(line)
+                return True
+            except OSError:
+                return False
+
+    def call(self, proxy, method, args):
+        seq = self.new_id()
+        reply = [threading.Event(), None]
+        with self.lock:
+            self.replies[seq] = reply
+        sent = self.send({'op': 'call', 'id': proxy.id, 'seq': seq, 'method': method, 'args': list(args),
+                          'sent': time.time()})
+        try:
+            if not sent or not reply[0].wait(CALL_TIMEOUT):
+                raise PhidgetException(ErrorCode.EPHIDGET_TIMEOUT, 'No reply from the stand-in server')
+        finally:
+            with self.lock:
+                self.replies.pop(seq, None)
+        message = reply[1]
+        if message['op'] == 'error':
+            raise PhidgetException(message['code'], message['details'])
+        return message.get('value')
+
+    # Connects, replays every channel and manager, then reads until the link drops and starts again with backoff
+    def connect_loop(self):
+        delay = RECONNECT_MIN
+        while True:
+            try:
+                sock = socket.create_connection(self.address, timeout=CALL_TIMEOUT)
+            except OSError:
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+                continue
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            delay = RECONNECT_MIN
+            print('Connected to stand-in server %s:%d' % self.address)
+            with self.send_lock:
+                self.sock = sock
+            with self.lock:
+                proxies = list(self.proxies.values())
+                managers = len(self.managers)
+                regulators = list(self.regulators)
+            for parts in regulators:
+                self.send({'op': 'regulator', 'parts': parts})
+            for proxy in proxies:
+                self.send({'op': 'create', 'id': proxy.id, 'address': proxy.address()})
+                if proxy.is_open:
+                    self.send({'op': 'open', 'id': proxy.id})
+            for i in range(managers):
+                self.send({'op': 'manager'})
+            self.read(sock)
+            print('Lost stand-in server %s:%d' % self.address)
+            with self.send_lock:
+                self.sock = None
+            for proxy in proxies:
+                proxy.detach()
+            with self.lock:
+                managers = list(self.managers)
+            for manager in managers:
+                manager.withdraw_all()
+
+    def read(self, sock):
+        stream = sock.makefile('r')
+        try:
+            for line in stream:
+                self.handle(json.loads(line))
+        except (OSError, ValueError):
+            pass
+        finally:
+            sock.close()
+
+    def handle(self, message):
+        op = message['op']
+        if op in ('return', 'error'):
+            with self.lock:
+                reply = self.replies.get(message['seq'])
+            if reply is not None:
+                reply[1] = message
+                reply[0].set()
+            return
+        if op in ('announce', 'withdraw'):
+            with self.lock:
+                managers = list(self.managers)
+            for manager in managers:
+                if op == 'announce':
+                    manager.announce(tuple(message['address']))
+                else:
+                    manager.withdraw(tuple(message['address']))
+            return
+        with self.lock:
+            proxy = self.proxies.get(message['id'])
+        if proxy is None:
+            return
+        if op == 'attach':
+            proxy.attach()
+        elif op == 'detach':
+            proxy.detach()
+        elif op == 'event':
+            proxy.event(message['value'])
+
+
+link = RemoteLink(os.environ.get('TIMC_REMOTE', 'localhost:5661'))
+
+
+class RemoteChannel:
+    channel_class = None
+
+    def __init__(self):
+        self.id = link.new_id()
+        self.serial_number = -1
+        self.hub_port = -1
+        self.is_hub_port_device = False
+        self.channel = -1
+        self.attached = False
+        self.is_open = False
+        self.attach_handler = None
+        self.detach_handler = None
+
+    def address(self):
+        return [type(self).__name__, self.serial_number, self.hub_port, self.channel, self.is_hub_port_device]
+
+    def setDeviceSerialNumber(self, serial_number):
+        self.serial_number = serial_number
+
+    def getDeviceSerialNumber(self):
+        return self.serial_number
+
+    def setIsHubPortDevice(self, is_hub_port_device):
+        self.is_hub_port_device = is_hub_port_device
+
+    def getIsHubPortDevice(self):
+        return self.is_hub_port_device
+
+    def setHubPort(self, hub_port):
+        self.hub_port = hub_port
+
+    def getHubPort(self):
+        return self.hub_port
+
+    # The channel is the last part of the address to be set, the server creates its channel from it
+    def setChannel(self, ch):
+        self.channel = ch
+        link.add(self)
+
+    def getChannel(self):
+        return self.channel
+
+    def getChannelClass(self):
+        return self.channel_class
+
+    def getChannelClassName(self):
+        return 'Phidget' + type(self).__name__
+
+    def setOnAttachHandler(self, handler):
+        self.attach_handler = handler
+
+    def setOnDetachHandler(self, handler):
+        self.detach_handler = handler
+
+    def getAttached(self):
+        return self.attached
+
+    def open(self):
+        self.is_open = True
+        link.send({'op': 'open', 'id': self.id})
+
+    def openWaitForAttachment(self, timeout):
+        self.open()
+        deadline = time.perf_counter() + timeout / 1000.0
+        while not self.attached:
+            if time.perf_counter() > deadline:
+                raise PhidgetException(ErrorCode.EPHIDGET_TIMEOUT, 'Timed out waiting for attachment')
+            time.sleep(0.01)
+
+    def close(self):
+        self.is_open = False
+        link.send({'op': 'close', 'id': self.id})
+        self.detach()
+
+    def attach(self):
+        if self.is_open and not self.attached:
+            self.reset()
+            self.attached = True
+            link.fire(self.attach_handler, self)
+
+    def detach(self):
+        if self.attached:
+            self.attached = False
+            link.fire(self.detach_handler, self)
+
+    def reset(self):
+        pass
+
+    def event(self, value):
+        pass
+
+    def check(self):
+        if not self.attached:
+            raise PhidgetException(ErrorCode.EPHIDGET_NOTATTACHED, 'Not attached')
+
+    def write(self, setter, *args):
+        self.check()
+        return link.call(self, setter, args)
+
+
+class DCMotor(RemoteChannel):
+    channel_class = ChannelClass.PHIDCHCLASS_DCMOTOR
+
+    def reset(self):
+        self.target_velocity = 0.0
+
+    def setTargetVelocity(self, velocity):
+        self.write('setTargetVelocity', velocity)
+        self.target_velocity = float(velocity)
+
+    def getTargetVelocity(self):
+        self.check()
+        return self.target_velocity
+
+    def setAcceleration(self, acceleration):
+        self.write('setAcceleration', acceleration)
+
+    def setCurrentLimit(self, current_limit):
+        self.write('setCurrentLimit', current_limit)
+
+
+class RemoteInput(RemoteChannel):
+    def __init__(self):
+        RemoteChannel.__init__(self)
+        self.change_handler = None
+
+    def reset(self):
+        self.value = 0.0
+
+    def setDataInterval(self, interval):
+        self.write('setDataInterval', interval)
+
+    # Values stream from the server whether or not a handler is set, as they do from a Phidget network server
+    def event(self, value):
+        self.value = value
+        link.fire(self.change_handler, self, value)
+
+
+class CurrentInput(RemoteInput):
+    channel_class = ChannelClass.PHIDCHCLASS_CURRENTINPUT
+
+    def setCurrentChangeTrigger(self, trigger):
+        self.write('setCurrentChangeTrigger', trigger)
+
+    def setOnCurrentChangeHandler(self, handler):
+        self.change_handler = handler
+
+    def getCurrent(self):
+        self.check()
+        return self.value
+
+
+class VoltageRatioInput(RemoteInput):
+    channel_class = ChannelClass.PHIDCHCLASS_VOLTAGERATIOINPUT
+
+    def setVoltageRatioChangeTrigger(self, trigger):
+        self.write('setVoltageRatioChangeTrigger', trigger)
+
+    def setOnVoltageRatioChangeHandler(self, handler):
+        self.change_handler = handler
+
+    def getVoltageRatio(self):
+        self.check()
+        return self.value
+
+    def getSensorValue(self):
+        return self.getVoltageRatio()
+
+
+class DigitalOutput(RemoteChannel):
+    channel_class = ChannelClass.PHIDCHCLASS_DIGITALOUTPUT
+
+    def reset(self):
+        self.state = False
+
+    def setState(self, state):
+        self.write('setState', bool(state))
+        self.state = bool(state)
+
+    def getState(self):
+        self.check()
+        return self.state
+
+
+class VoltageOutput(RemoteChannel):
+    channel_class = ChannelClass.PHIDCHCLASS_VOLTAGEOUTPUT
+
+    def reset(self):
+        self.voltage = 0.0
+
+    def setVoltage(self, voltage):
+        self.write('setVoltage', float(voltage))
+        self.voltage = float(voltage)
+
+    def getVoltage(self):
+        self.check()
+        return self.voltage
+
+
+class Announcement:
+    def __init__(self, address):
+        self.address = address
+
+    def getChannelClass(self):
+        return self.address[0]
+
+    def getDeviceSerialNumber(self):
+        return self.address[1]
+
+    def getHubPort(self):
+        return self.address[2]
+
+    def getChannel(self):
+        return self.address[3]
+
+    def getIsHubPortDevice(self):
+        return self.address[4]
+
+
+class Manager:
+    def __init__(self):
+        self.attach_handler = None
+        self.detach_handler = None
+        self.announced = set()
+        self.lock = threading.Lock()
+
+    def setOnAttachHandler(self, handler):
+        self.attach_handler = handler
+
+    def setOnDetachHandler(self, handler):
+        self.detach_handler = handler
+
+    def open(self):
+        link.add_manager(self)
+
+    def close(self):
+        with link.lock:
+            if self in link.managers:
+                link.managers.remove(self)
+
+    def announce(self, address):
+        with self.lock:
+            if address in self.announced:
+                return
+            self.announced.add(address)
+        link.fire(self.attach_handler, self, Announcement(address))
+
+    def withdraw(self, address):
+        with self.lock:
+            if address not in self.announced:
+                return
+            self.announced.discard(address)
+        link.fire(self.detach_handler, self, Announcement(address))
+
+    def withdraw_all(self):
+        with self.lock:
+            addresses = list(self.announced)
+        for address in addresses:
+            self.withdraw(address)
+
+
+# Only the server's simulator needs to know which relay, output and input make up a regulator
+def link_regulator(reg_pwr, reg_set, reg_get):
+    link.add_regulator([list(reg_pwr), list(reg_set), list(reg_get)])
@@ -0,0 +1,545 @@
+###################################################################
+# Tooling Inspection Motion Controller - Simulated Phidget cabinet
+#
+# Description:
+#   In-process stand-in for the Phidget22 channels used by the Digital
+# MANTIS controllers. Selected with TIMC_BACKEND=sim (see timc_devices),
+# it lets the full GUI run on a machine without a cabinet.
+#   Every hub serial number is present unless listed in TIMC_SIM_OFFLINE.
+# Channels attach after TIMC_SIM_LATENCY seconds (+/- 50% jitter). A DC
+# motor ramps to its target velocity at its acceleration and draws a
+# current that the CurrentInput on the same hub port reports. A regulator
+# linked with link_regulator() builds pressure towards its set voltage
+# while its power relay is on and the pressure is read back through the
+# VoltageRatioInput. TIMC_SIM_DROPOUT=<seconds> unplugs a random hub for a
+# few seconds at about that interval for soak testing.
+
+import os
+import queue
+import random
+import threading
+import time
+
+ATTACH_LATENCY = float(os.environ.get('TIMC_SIM_LATENCY', '0.25'))
+PHYSICS_STEP = 0.01
+
+# Motor model, amps drawn at no load and per unit of duty cycle
+NO_LOAD_CURRENT = 0.3
+CURRENT_PER_DUTY = 4.0
+CURRENT_NOISE = 0.02
+
+# Regulator model, ITV1050 full scale at 5 V and the transducer scaling used by the pneumatic controllers
+REGULATOR_FULL_SCALE = 130.5
+REGULATOR_TIME_CONSTANT = 0.3
+VENT_TIME_CONSTANT = 0.8
+
+
+class PhidgetServerType:
+    PHIDGETSERVER_DEVICEREMOTE = 2
+
+
+class ChannelClass:
+    PHIDCHCLASS_CURRENTINPUT = 2
+    PHIDCHCLASS_DCMOTOR = 4
+    PHIDCHCLASS_DIGITALOUTPUT = 7
+    PHIDCHCLASS_VOLTAGEOUTPUT = 30
+    PHIDCHCLASS_VOLTAGERATIOINPUT = 31
+
+
+class ErrorCode:
+    EPHIDGET_TIMEOUT = 3
+    EPHIDGET_NOTATTACHED = 52
+
+
+class PhidgetException(Exception):
+    def __init__(self, code, details=''):
+        Exception.__init__(self, details)
+        self.code = code
+        self.details = details
+
+
+class Net:
+    @staticmethod
+    def enableServerDiscovery(server_type):
+        pass
+
+
+class SimCabinet:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.offline = set(int(s) for s in os.environ.get('TIMC_SIM_OFFLINE', '').split(',') if s.strip())
+        self.addresses = []
+        self.channels = []
+        self.managers = []
+        self.regulators = []
+        self.pressures = {}
+        # Observers of every command written to an output, e.g. the latency benchmark
+        self.command_listeners = []
+        # Handlers run one at a time on the event thread, like the Phidget22 event thread
+        self.events = queue.Queue()
+        self.started = False
+
+    # The threads only start once something is opened, importing the module for its classes costs nothing
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self.event_loop, daemon=True).start()
+        threading.Thread(target=self.physics_loop, daemon=True).start()
+        dropout = float(os.environ.get('TIMC_SIM_DROPOUT', '0'))
+        if dropout > 0:
+            threading.Thread(target=self.dropout_loop, args=(dropout,), daemon=True).start()
+
+    def event_loop(self):
+        while True:
+            func, args = self.events.get()
+            try:
+                func(*args)
+            except Exception as e:
+                print('Simulated event handler raised %r' % e)
+
+    def fire(self, func, *args):
+        if func is not None:
+            self.events.put((func, args))
+
+    def later(self, delay, func, *args):
+        timer = threading.Timer(delay, func, args)
+        timer.daemon = True
+        timer.start()
+
+    def latency(self):
+        return ATTACH_LATENCY * random.uniform(0.5, 1.5)
+
+    def is_present(self, serial_number):
+        return serial_number not in self.offline
+
+    def register(self, address):
+        with self.lock:
+            if address in self.addresses:
+                return
+            self.addresses.append(address)
+            managers = list(self.managers)
+        if self.is_present(address[1]):
+            for manager in managers:
+                self.later(self.latency(), manager.announce, address)
+
+    def opened(self, channel):
+        self.start()
+        with self.lock:
+            if channel not in self.channels:
+                self.channels.append(channel)
+        if self.is_present(channel.serial_number):
+            self.later(self.latency(), channel.attach)
+
+    def closed(self, channel):
+        with self.lock:
+            if channel in self.channels:
+                self.channels.remove(channel)
+
+    def unplug(self, serial_number):
+        with self.lock:
+            self.offline.add(serial_number)
+            channels = [c for c in self.channels if c.serial_number == serial_number]
+            addresses = [a for a in self.addresses if a[1] == serial_number]
+            managers = list(self.managers)
+        for channel in channels:
+            channel.detach()
+        for manager in managers:
+            for address in addresses:
+                manager.withdraw(address)
+
+    def plug(self, serial_number):
+        with self.lock:
+            self.offline.discard(serial_number)
+            channels = [c for c in self.channels if c.serial_number == serial_number]
+            addresses = [a for a in self.addresses if a[1] == serial_number]
+            managers = list(self.managers)
+        for manager in managers:
+            for address in addresses:
+                self.later(self.latency(), manager.announce, address)
+        # Open channels re-attach by themselves, as they do with the Phidget22 library
+        for channel in channels:
+            self.later(self.latency(), channel.attach)
+
+    def dropout_loop(self, interval):
+        while True:
+            time.sleep(random.expovariate(1.0 / interval))
+            with self.lock:
+                serials = sorted(set(a[1] for a in self.addresses) - self.offline)
+            if not serials:
+                continue
+            serial_number = random.choice(serials)
+            print('Simulated dropout of hub %s' % serial_number)
+            self.unplug(serial_number)
+            time.sleep(random.uniform(2, 5))
+            self.plug(serial_number)
+
+    def command(self, channel, setter, value):
+        for listener in self.command_listeners:
+            listener(channel, setter, value)
+
+    def find(self, channel_class, serial_number, hub_port, ch):
+        with self.lock:
+            for channel in self.channels:
+                if isinstance(channel, channel_class) and channel.serial_number == serial_number \
+                        and channel.channel == ch and (hub_port is None or channel.hub_port == hub_port):
+                    return channel
+        return None
+
+    def link_regulator(self, reg_pwr, reg_set, reg_get):
+        with self.lock:
+            self.regulators.append((tuple(reg_pwr), tuple(reg_set), tuple(reg_get)))
+
+    def physics_loop(self):
+        last = time.perf_counter()
+        while True:
+            time.sleep(PHYSICS_STEP)
+            now = time.perf_counter()
+            dt = now - last
+            last = now
+            with self.lock:
+                channels = list(self.channels)
+                regulators = list(self.regulators)
+            for channel in channels:
+                if isinstance(channel, DCMotor):
+                    channel.step(dt)
+            for reg_pwr, reg_set, reg_get in regulators:
+                self.step_regulator(reg_pwr, reg_set, reg_get, dt)
+            for channel in channels:
+                if isinstance(channel, (CurrentInput, VoltageRatioInput)):
+                    channel.sample(now)
+
+    def step_regulator(self, reg_pwr, reg_set, reg_get, dt):
+        power = self.find(DigitalOutput, reg_pwr[0], reg_pwr[1], reg_pwr[2])
+        setpoint = self.find(VoltageOutput, reg_set[0], reg_set[1], reg_set[2])
+        key = (reg_get[0], reg_get[1])
+        pressure = self.pressures.get(key, 0.0)
+        if power is not None and power.attached and power.state and setpoint is not None and setpoint.attached:
+            target = setpoint.voltage * REGULATOR_FULL_SCALE / 5
+            pressure += (target - pressure) * min(1.0, dt / REGULATOR_TIME_CONSTANT)
+        else:
+            pressure -= pressure * min(1.0, dt / VENT_TIME_CONSTANT)
+        self.pressures[key] = pressure
+
+    def motor_current(self, serial_number, hub_port, ch):
+        motor = self.find(DCMotor, serial_number, hub_port, ch)
+        if motor is None or not motor.attached:
+            return 0.0
+        current = NO_LOAD_CURRENT * (motor.velocity != 0) + CURRENT_PER_DUTY * abs(motor.velocity)
+        current = min(current, motor.current_limit) + random.gauss(0, CURRENT_NOISE)
+        return current if motor.velocity >= 0 else -current
+
+    def pressure(self, serial_number, ch):
+        return self.pressures.get((serial_number, ch), 0.0)
+
+
+cabinet = SimCabinet()
+
+
+def link_regulator(reg_pwr, reg_set, reg_get):
+    cabinet.link_regulator(reg_pwr, reg_set, reg_get)
+
+
+class SimChannel:
+    channel_class = None
+
+    def __init__(self):
+        self.serial_number = -1
+        self.hub_port = -1
+        self.is_hub_port_device = False
+        self.channel = -1
+        self.attached = False
+        self.is_open = False
+        self.attach_handler = None
+        self.detach_handler = None
+
+    def setDeviceSerialNumber(self, serial_number):
+        self.serial_number = serial_number
+
+    def getDeviceSerialNumber(self):
+        return self.serial_number
+
+    def setIsHubPortDevice(self, is_hub_port_device):
+        self.is_hub_port_device = is_hub_port_device
+
+    def getIsHubPortDevice(self):
+        return self.is_hub_port_device
+
+    def setHubPort(self, hub_port):
+        self.hub_port = hub_port
+
+    def getHubPort(self):
+        return self.hub_port
+
+    # The channel is the last part of the address to be set, the cabinet then knows the channel exists
+    def setChannel(self, ch):
+        self.channel = ch
+        cabinet.register((self.channel_class, self.serial_number, self.hub_port, self.channel, self.is_hub_port_device))
+
+    def getChannel(self):
+        return self.channel
+
+    def getChannelClass(self):
+        return self.channel_class
+
+    def getChannelClassName(self):
+        return 'Phidget' + type(self).__name__
+
+    def setOnAttachHandler(self, handler):
+        self.attach_handler = handler
+
+    def setOnDetachHandler(self, handler):
+        self.detach_handler = handler
+
+    def getAttached(self):
+        return self.attached
+
+    def open(self):
+        self.is_open = True
+        cabinet.opened(self)
+
+    def openWaitForAttachment(self, timeout):
+        self.open()
+        deadline = time.perf_counter() + timeout / 1000.0
+        while not self.attached:
+            if time.perf_counter() > deadline:
+                raise PhidgetException(ErrorCode.EPHIDGET_TIMEOUT, 'Timed out waiting for attachment')
+            time.sleep(0.01)
+
+    def close(self):
+        was_attached = self.attached
+        self.is_open = False
+        self.attached = False
+        cabinet.closed(self)
+        if was_attached:
+            cabinet.fire(self.detach_handler, self)
+
+    def attach(self):
+        if not self.is_open or self.attached or not cabinet.is_present(self.serial_number):
+            return
+        self.reset()
+        self.attached = True
+        cabinet.fire(self.attach_handler, self)
+
+    def detach(self):
+        if self.attached:
+            self.attached = False
+            cabinet.fire(self.detach_handler, self)
+
+    # Attaching restores the device defaults, as a real power cycled hub does
+    def reset(self):
+        pass
+
+    def check(self):
+        if not self.attached:
+            raise PhidgetException(ErrorCode.EPHIDGET_NOTATTACHED, 'Not attached')
+
+    def write(self, setter, value):
+        self.check()
+        cabinet.command(self, setter, value)
+
+
+class DCMotor(SimChannel):
+    channel_class = ChannelClass.PHIDCHCLASS_DCMOTOR
+
+    def reset(self):
+        self.target_velocity = 0.0
+        self.velocity = 0.0
+        self.acceleration = 1.0
+        self.current_limit = 2.0
+
+    def setTargetVelocity(self, velocity):
+        self.write('setTargetVelocity', velocity)
+        self.target_velocity = max(-1.0, min(1.0, float(velocity)))
+
+    def getTargetVelocity(self):
+        self.check()
+        return self.target_velocity
+
+    def getVelocity(self):
+        self.check()
+        return self.velocity
+
+    def setAcceleration(self, acceleration):
+        self.write('setAcceleration', acceleration)
+        self.acceleration = float(acceleration)
+
+    def setCurrentLimit(self, current_limit):
+        self.write('setCurrentLimit', current_limit)
+        self.current_limit = float(current_limit)
+
+    def step(self, dt):
+        if not self.attached:
+            return
+        change = self.target_velocity - self.velocity
+        limit = self.acceleration * dt
+        self.velocity += max(-limit, min(limit, change))
+
+
+class SimInput(SimChannel):
+    def __init__(self):
+        SimChannel.__init__(self)
+        self.change_handler = None
+
+    def reset(self):
+        self.data_interval = 250
+        self.change_trigger = 0.0
+        self.value = 0.0
+        self.last_reported = None
+        self.last_event = 0.0
+
+    def setDataInterval(self, interval):
+        self.check()
+        self.data_interval = int(interval)
+
+    def getDataInterval(self):
+        self.check()
+        return self.data_interval
+
+    def read(self):
+        return 0.0
+
+    def sample(self, now):
+        if not self.attached:
+            return
+        self.value = self.read()
+        if self.change_handler is None or now - self.last_event < self.data_interval / 1000.0:
+            return
+        if self.last_reported is not None and abs(self.value - self.last_reported) < self.change_trigger:
+            return
+        self.last_event = now
+        self.last_reported = self.value
+        cabinet.fire(self.change_handler, self, self.value)
+
+
+class CurrentInput(SimInput):
+    channel_class = ChannelClass.PHIDCHCLASS_CURRENTINPUT
+
+    def setCurrentChangeTrigger(self, trigger):
+        self.check()
+        self.change_trigger = float(trigger)
+
+    def setOnCurrentChangeHandler(self, handler):
+        self.change_handler = handler
+
+    def getCurrent(self):
+        self.check()
+        return self.value
+
+    def read(self):
+        return cabinet.motor_current(self.serial_number, self.hub_port, self.channel)
+
+
+class VoltageRatioInput(SimInput):
+    channel_class = ChannelClass.PHIDCHCLASS_VOLTAGERATIOINPUT
+
+    def setVoltageRatioChangeTrigger(self, trigger):
+        self.check()
+        self.change_trigger = float(trigger)
+
+    def setOnVoltageRatioChangeHandler(self, handler):
+        self.change_handler = handler
+
+    def getVoltageRatio(self):
+        self.check()
+        return self.value
+
+    def getSensorValue(self):
+        return self.getVoltageRatio()
+
+    # Inverse of the PSI = ratio * 165.63 - 30.855 transducer scaling in the pneumatic controllers
+    def read(self):
+        return (cabinet.pressure(self.serial_number, self.channel) + 30.855) / 165.63
+
+
+class DigitalOutput(SimChannel):
+    channel_class = ChannelClass.PHIDCHCLASS_DIGITALOUTPUT
+
+    def reset(self):
+        self.state = False
+
+    def setState(self, state):
+        self.write('setState', state)
+        self.state = bool(state)
+
+    def getState(self):
+        self.check()
+        return self.state
+
+
+class VoltageOutput(SimChannel):
+    channel_class = ChannelClass.PHIDCHCLASS_VOLTAGEOUTPUT
+
+    def reset(self):
+        self.voltage = 0.0
+
+    def setVoltage(self, voltage):
+        self.write('setVoltage', voltage)
+        self.voltage = float(voltage)
+
+    def getVoltage(self):
+        self.check()
+        return self.voltage
+
+
+class Announcement:
+    def __init__(self, address):
+        self.address = address
+
+    def getChannelClass(self):
+        return self.address[0]
+
+    def getDeviceSerialNumber(self):
+        return self.address[1]
+
+    def getHubPort(self):
+        return self.address[2]
+
+    def getChannel(self):
+        return self.address[3]
+
+    def getIsHubPortDevice(self):
+        return self.address[4]
+
+
+class Manager:
+    def __init__(self):
+        self.attach_handler = None
+        self.detach_handler = None
+        self.announced = set()
+        self.lock = threading.Lock()
+
+    def setOnAttachHandler(self, handler):
+        self.attach_handler = handler
+
+    def setOnDetachHandler(self, handler):
+        self.detach_handler = handler
+
+    def open(self):
+        cabinet.start()
+        with cabinet.lock:
+            cabinet.managers.append(self)
+            addresses = list(cabinet.addresses)
+        for address in addresses:
+            if cabinet.is_present(address[1]):
+                cabinet.later(cabinet.latency(), self.announce, address)
+
+    def close(self):
+        with cabinet.lock:
+            if self in cabinet.managers:
+                cabinet.managers.remove(self)
+
+    def announce(self, address):
+        with self.lock:
+            if address in self.announced or not cabinet.is_present(address[1]):
+                return
+            self.announced.add(address)
+        cabinet.fire(self.attach_handler, self, Announcement(address))
+
+    def withdraw(self, address):
+        with self.lock:
+            if address not in self.announced:
+                return
+            self.announced.discard(address)
+        cabinet.fire(self.detach_handler, self, Announcement(address))
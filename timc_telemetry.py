@@ -0,0 +1,407 @@
+###################################################################
+# Tooling Inspection Motion Controller - Telemetry recorder
+#
+# Description:
+#   Records timestamped samples (motor currents, commanded velocities,
+# lockouts, pressures, set pressures, relay states...) for a whole shift.
+# Every sample is a fixed-width 16 byte record (time, channel id, value)
+# written to preallocated, memory-mapped segment files; a new segment is
+# started when one is full. A session is one directory:
+#     channels.json       channel id -> name, kind and unit, record layout
+#     segment_00000.tlm   SEGMENT_RECORDS records, unused records have t = 0
+#   record() only writes three numbers into a preallocated staging array
+# under a lock, from whichever thread has the sample. A writer thread swaps
+# the two staging arrays every flush_interval and copies the batch into the
+# segment in one slice, so the Tk thread never touches the disk.
+#   When a segment is finished an index is written next to it
+# (segment_00000.idx.npz): the time range of every block of BLOCK_RECORDS
+# records and, per block and channel, the sample count, time range,
+# min, max and sum. Session answers range and event queries from the
+# summaries and only reads the blocks at the edges of the time range, see
+# "TIMC-Telemetry Query.py".
+#   Playback is a cursor over a session for the replay viewer ("TIMC-Session
+# Replay.py"): seek() finds the block holding a time by binary search and
+# rebuilds the value of every channel from a table of the last block each
+# channel appears in, so a seek reads a few blocks whatever the position;
+# advance() then applies the records up to the next time.
+#   TIMC_TELEMETRY sets the directory the sessions are written under
+# (./telemetry by default), TIMC_TELEMETRY=off turns recording off.
+
+import glob
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+RECORD = np.dtype([('t', '<f8'), ('channel', '<u4'), ('value', '<f4')])
+SEGMENT_RECORDS = 1 << 20  # 16 MB, about 1.5 h at 200 samples/s
+STAGE_RECORDS = 1 << 16
+BLOCK_RECORDS = 4096
+BLOCK = np.dtype([('start', '<u8'), ('count', '<u4'), ('t_min', '<f8'), ('t_max', '<f8')])
+SUMMARY = np.dtype([('block', '<u4'), ('channel', '<u4'), ('count', '<u4'), ('t_min', '<f8'), ('t_max', '<f8'),
+                    ('v_min', '<f4'), ('v_max', '<f4'), ('v_sum', '<f8')])
+
+
+def open_recorder(label):
+    base = os.environ.get('TIMC_TELEMETRY', 'telemetry')
+    if base == 'off':
+        return Recorder(None)
+    return Recorder(os.path.join(base, time.strftime('%Y%m%d-%H%M%S') + '_' + label))
+
+
+class Recorder:
+    def __init__(self, directory, segment_records=SEGMENT_RECORDS, stage_records=STAGE_RECORDS, flush_interval=0.5):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.stage_records = stage_records
+        self.flush_interval = flush_interval
+        self.channels = []
+        self.watched = {}
+        self.lock = threading.Lock()
+        self.stages = [(np.zeros(stage_records), np.zeros(stage_records, dtype=np.uint32),
+                        np.zeros(stage_records, dtype=np.float32)) for i in range(2)]
+        self.active = 0
+        self.fill = 0
+        self.segment = None
+        self.segment_number = -1
+        self.position = 0
+        self.written = 0
+        self.dropped = 0
+        self.stopping = threading.Event()
+        self.writer = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.started = time.time()
+            self.save_channels()
+            self.writer = threading.Thread(target=self.run, daemon=True)
+            self.writer.start()
+            print('Recording telemetry to %s' % directory)
+
+    def channel(self, name, kind, unit=''):
+        self.channels.append({'id': len(self.channels), 'name': name, 'kind': kind, 'unit': unit})
+        if self.directory is not None:
+            self.save_channels()
+        return len(self.channels) - 1
+
+    # Record every value commanded to an output through the dispatcher, see command()
+    def watch(self, output, setter, name, kind='command', unit=''):
+        self.watched[(id(output), setter)] = self.channel(name, kind, unit)
+
+    # CommandDispatcher observer
+    def command(self, output, setter, value):
+        channel = self.watched.get((id(output), setter))
+        if channel is not None:
+            self.record(channel, value)
+
+    def save_channels(self):
+        manifest = {'started': self.started, 'record': [[name, RECORD.fields[name][0].str] for name in RECORD.names],
+                    'segment_records': self.segment_records, 'channels': self.channels}
+        with open(os.path.join(self.directory, 'channels.json'), 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+    # Safe from any thread, drops the sample if the writer has fallen a whole staging array behind
+    def record(self, channel, value, t=None):
+        if self.directory is None:
+            return
+        if t is None:
+            t = time.time()
+        with self.lock:
+            i = self.fill
+            if i == self.stage_records:
+                self.dropped += 1
+                return
+            times, channels, values = self.stages[self.active]
+            times[i] = t
+            channels[i] = channel
+            values[i] = value
+            self.fill = i + 1
+
+    def run(self):
+        while not self.stopping.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+        if self.segment is not None:
+            self.finish_segment()
+
+    def finish_segment(self):
+        self.segment.flush()
+        write_index(self.segment.filename, self.segment[:self.position])
+
+    def flush(self):
+        with self.lock:
+            times, channels, values = self.stages[self.active]
+            count = self.fill
+            self.active ^= 1
+            self.fill = 0
+        done = 0
+        while done < count:
+            if self.segment is None or self.position == self.segment_records:
+                self.rotate()
+            n = min(count - done, self.segment_records - self.position)
+            records = self.segment[self.position:self.position + n]
+            records['t'] = times[done:done + n]
+            records['channel'] = channels[done:done + n]
+            records['value'] = values[done:done + n]
+            self.position += n
+            done += n
+        self.written += count
+
+    def rotate(self):
+        if self.segment is not None:
+            self.finish_segment()
+        self.segment_number += 1
+        path = os.path.join(self.directory, 'segment_%05d.tlm' % self.segment_number)
+        self.segment = np.memmap(path, dtype=RECORD, mode='w+', shape=(self.segment_records,))
+        self.position = 0
+
+    def close(self):
+        if self.writer is not None:
+            self.stopping.set()
+            self.writer.join()
+            print('Telemetry: %d samples recorded, %d dropped' % (self.written, self.dropped))
+
+
+def index_path(segment_path):
+    return segment_path[:-len('.tlm')] + '.idx.npz'
+
+
+# Records up to the first unused one (t = 0), for a segment still being written or left by a crash
+def valid_records(records):
+    unused = np.flatnonzero(records['t'] == 0)
+    return records[:unused[0]] if len(unused) else records
+
+
+def build_index(records):
+    n = len(records)
+    starts = np.arange(0, n, BLOCK_RECORDS)
+    blocks = np.zeros(len(starts), dtype=BLOCK)
+    summary = np.zeros(0, dtype=SUMMARY)
+    if n == 0:
+        return blocks, summary
+    t = np.asarray(records['t'])
+    blocks['start'] = starts
+    blocks['count'] = np.diff(np.append(starts, n))
+    blocks['t_min'] = np.minimum.reduceat(t, starts)
+    blocks['t_max'] = np.maximum.reduceat(t, starts)
+
+    # One summary row per (block, channel) present, from the records sorted by block then channel
+    block = np.arange(n) // BLOCK_RECORDS
+    channel = np.asarray(records['channel'])
+    order = np.lexsort((channel, block))
+    key = block[order].astype(np.uint64) << np.uint64(32) | channel[order].astype(np.uint64)
+    first = np.flatnonzero(np.append(True, key[1:] != key[:-1]))
+    values = np.asarray(records['value'])[order]
+    times = t[order]
+    summary = np.zeros(len(first), dtype=SUMMARY)
+    summary['block'] = block[order][first]
+    summary['channel'] = channel[order][first]
+    summary['count'] = np.diff(np.append(first, n))
+    summary['t_min'] = np.minimum.reduceat(times, first)
+    summary['t_max'] = np.maximum.reduceat(times, first)
+    summary['v_min'] = np.minimum.reduceat(values, first)
+    summary['v_max'] = np.maximum.reduceat(values, first)
+    summary['v_sum'] = np.add.reduceat(values.astype(np.float64), first)
+    return blocks, summary
+
+
+def write_index(segment_path, records):
+    blocks, summary = build_index(records)
+    with open(index_path(segment_path), 'wb') as f:
+        np.savez(f, blocks=blocks, summary=summary)
+
+
+class Segment:
+    def __init__(self, path):
+        self.path = path
+        self.records = np.memmap(path, dtype=RECORD, mode='r')
+        # A segment without an index is still being written (or the recorder stopped), index it in memory
+        if os.path.exists(index_path(path)):
+            with np.load(index_path(path)) as index:
+                self.blocks = index['blocks']
+                self.summary = index['summary']
+        else:
+            self.blocks, self.summary = build_index(valid_records(self.records))
+        self.t_min = self.blocks['t_min'].min() if len(self.blocks) else None
+        self.t_max = self.blocks['t_max'].max() if len(self.blocks) else None
+
+    def rows(self, channel, t_from, t_to):
+        summary = self.summary
+        return summary[(summary['channel'] == channel) & (summary['t_max'] >= t_from) & (summary['t_min'] <= t_to)]
+
+    # The samples of one channel in a block, limited to the time range
+    def block_samples(self, block, channel, t_from, t_to):
+        start = int(self.blocks['start'][block])
+        records = self.records[start:start + int(self.blocks['count'][block])]
+        keep = (records['channel'] == channel) & (records['t'] >= t_from) & (records['t'] <= t_to)
+        return np.asarray(records['t'][keep]), np.asarray(records['value'][keep])
+
+
+class Session:
+    def __init__(self, directory):
+        self.directory = directory
+        self.name = os.path.basename(os.path.normpath(directory))
+        with open(os.path.join(directory, 'channels.json')) as f:
+            manifest = json.load(f)
+        self.started = manifest['started']
+        self.channels = manifest['channels']
+        self.segment_paths = sorted(glob.glob(os.path.join(directory, 'segment_*.tlm')))
+        self.loaded = None
+
+    def segments(self):
+        if self.loaded is None:
+            self.loaded = [Segment(path) for path in self.segment_paths]
+        return self.loaded
+
+    def span(self):
+        times = [(s.t_min, s.t_max) for s in self.segments() if s.t_min is not None]
+        if not times:
+            return self.started, self.started
+        return min(t[0] for t in times), max(t[1] for t in times)
+
+    # Channel ids whose name matches, exact (case-insensitive) first, else every name containing the text
+    def find(self, name):
+        exact = [c['id'] for c in self.channels if c['name'].lower() == name.lower()]
+        if exact:
+            return exact
+        return [c['id'] for c in self.channels if name.lower() in c['name'].lower()]
+
+    def channel_name(self, channel):
+        return self.channels[channel]['name']
+
+    # count, min, max, mean of a channel; blocks inside the range come from the summaries, edge blocks are read
+    def stats(self, channel, t_from, t_to):
+        count, low, high, total = 0, np.inf, -np.inf, 0.0
+        for segment in self.segments():
+            for row in segment.rows(channel, t_from, t_to):
+                if row['t_min'] >= t_from and row['t_max'] <= t_to:
+                    count += int(row['count'])
+                    low = min(low, float(row['v_min']))
+                    high = max(high, float(row['v_max']))
+                    total += float(row['v_sum'])
+                else:
+                    values = segment.block_samples(row['block'], channel, t_from, t_to)[1]
+                    if len(values):
+                        count += len(values)
+                        low = min(low, float(values.min()))
+                        high = max(high, float(values.max()))
+                        total += float(values.sum(dtype=np.float64))
+        if count == 0:
+            return 0, None, None, None
+        return count, low, high, total / count
+
+    # Times at which the condition (value above/below a level) becomes true. Blocks where the summary shows the
+    # condition cannot hold are skipped, the condition is false throughout them.
+    def events(self, channel, t_from, t_to, above=None, below=None):
+        events = []
+        previous = False
+        for segment in self.segments():
+            for row in segment.rows(channel, t_from, t_to):
+                if (above is not None and row['v_max'] <= above) or (below is not None and row['v_min'] >= below):
+                    previous = False
+                    continue
+                times, values = segment.block_samples(row['block'], channel, t_from, t_to)
+                condition = np.ones(len(values), dtype=bool)
+                if above is not None:
+                    condition &= values > above
+                if below is not None:
+                    condition &= values < below
+                rising = condition & ~np.append(previous, condition[:-1])
+                events.extend(zip(times[rising].tolist(), values[rising].tolist()))
+                if len(condition):
+                    previous = bool(condition[-1])
+        return events
+
+    # Every sample of a channel in the time range, in recorded order
+    def samples(self, channel, t_from, t_to):
+        times, values = [], []
+        for segment in self.segments():
+            for row in segment.rows(channel, t_from, t_to):
+                t, v = segment.block_samples(row['block'], channel, t_from, t_to)
+                times.append(t)
+                values.append(v)
+        if not times:
+            return np.zeros(0), np.zeros(0, dtype=np.float32)
+        return np.concatenate(times), np.concatenate(values)
+
+
+class Playback:
+    def __init__(self, session):
+        self.session = session
+        segments = session.segments()
+        # Every block of the session in order: segment number, first record, record count
+        self.block_segment = np.concatenate([np.full(len(s.blocks), i) for i, s in enumerate(segments)] + [[]]).astype(int)
+        self.block_start = np.concatenate([s.blocks['start'] for s in segments] + [[]]).astype(int)
+        self.block_count = np.concatenate([s.blocks['count'] for s in segments] + [[]]).astype(int)
+        # Running maximum so it can be searched even if the clock stepped back
+        t_max = np.concatenate([s.blocks['t_max'] for s in segments] + [[]])
+        self.block_t_max = np.maximum.accumulate(t_max) if len(t_max) else t_max
+        self.t_start, self.t_end = session.span()
+
+        # last_block[channel, b]: the last block up to and including b holding a sample of the channel, -1 if none
+        channels = len(session.channels)
+        blocks = len(self.block_start)
+        present = np.zeros((channels, blocks), dtype=bool)
+        first = 0
+        for segment in segments:
+            summary = segment.summary
+            present[summary['channel'], first + summary['block'].astype(int)] = True
+            first += len(segment.blocks)
+        self.last_block = np.maximum.accumulate(np.where(present, np.arange(blocks), -1), axis=1) if blocks else present
+
+        self.values = np.full(channels, np.nan)
+        self.time = self.t_start
+        self.block = 0
+        self.position = 0
+
+    def read(self, block, start=0):
+        segment = self.session.segments()[self.block_segment[block]]
+        first = self.block_start[block]
+        return segment.records[first + start:first + self.block_count[block]]
+
+    # Last value per channel of a run of records, applied to values; returns the channels changed
+    def apply(self, records):
+        channels = np.asarray(records['channel'])
+        if not len(channels):
+            return np.zeros(0, dtype=int)
+        found, last = np.unique(channels[::-1], return_index=True)
+        last = len(channels) - 1 - last
+        self.values[found] = np.asarray(records['value'])[last]
+        return found
+
+    # The value of every channel at time t (NaN before its first sample)
+    def seek(self, t):
+        self.values[:] = np.nan
+        self.time = t
+        blocks = len(self.block_start)
+        self.block = min(int(np.searchsorted(self.block_t_max, t)), blocks)
+        if self.block > 0:
+            # Each channel from the last earlier block that holds it
+            earlier = self.last_block[:, self.block - 1]
+            for block in np.unique(earlier[earlier >= 0]):
+                records = self.read(block)
+                self.apply(records[np.isin(records['channel'], np.flatnonzero(earlier == block))])
+        self.position = 0
+        self.advance(t)
+        return self.values
+
+    # Applies the records from the cursor up to time t, returns the channels changed
+    def advance(self, t):
+        self.time = t
+        changed = []
+        while self.block < len(self.block_start):
+            records = self.read(self.block, self.position)
+            after = np.flatnonzero(records['t'] > t)
+            count = after[0] if len(after) else len(records)
+            changed.append(self.apply(records[:count]))
+            if len(after):
+                self.position += count
+                break
+            self.block += 1
+            self.position = 0
+        return np.unique(np.concatenate(changed + [np.zeros(0, dtype=int)]))
+
+
+def find_sessions(base):
+    return [Session(os.path.dirname(path)) for path in sorted(glob.glob(os.path.join(base, '*', 'channels.json')))]
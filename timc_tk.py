@@ -0,0 +1,337 @@
+###################################################################
+# Tooling Inspection Motion Controller - Tk thread helpers
+#
+# Description:
+#   Tk may only be used from the thread running mainloop(). Phidget
+# handlers (attach/detach, current and voltage ratio changes) run on the
+# Phidget event thread, so they post a callable to a TkPump instead of
+# touching widgets. The pump drains everything posted since the last cycle
+# in one batch at a fixed rate from a Scheduler task.
+#   Posting never blocks or takes a lock: deque.append and dict assignment
+# are atomic. A callable posted with a key replaces any callable with the
+# same key that has not run yet, so a display that is updated faster than
+# the pump rate only shows its newest value.
+#   Scheduler owns the periodic and one-shot work of the Tk thread (input
+# tick, pump, displays, pressure polls, delayed starts) with a single
+# root.after hook armed for the earliest deadline. Periodic deadlines are
+# aligned to multiples of their interval, so tasks with the same interval run
+# in the same tick, and everything due within `resolution` of a tick runs in
+# it, highest priority first. LOW priority work is put off to the next tick
+# once a tick has run for `budget`. How late each task ran is kept per task
+# and in a histogram, see report(). sequence() runs timed steps one after
+# the other (e.g. zero the pressure, wait, cut the power) without blocking.
+#   A task may be given an owner (the axis or air channel it works for):
+# starting a task with the owner and name of one still active replaces it,
+# so restarting a channel never leaves a second loop running, and
+# cancel_owner() stops everything a channel has scheduled. listing() shows
+# the active tasks per owner with their measured rate.
+#   LagMonitor is a heartbeat task (every 10 ms by default) that keeps a
+# histogram of how late the event loop runs it. A watchdog thread checks the
+# heartbeat; once it is `threshold` overdue the Tk thread is blocked (a
+# sleep, a blocking Phidget call...) and the watchdog prints the Python stack
+# of the Tk thread while it is still stuck, so the blocking call can be
+# found. report() counts the stalls by the line they were stuck on.
+
+import bisect
+import collections
+import heapq
+import itertools
+import math
+import sys
+import threading
+import time
+import traceback
+
+HIGH, NORMAL, LOW = 0, 1, 2
+LATENESS_BINS = [1, 2, 5, 10, 20, 50, 100, 200, 500]  # ms
+
+
+class TkPump:
+    def __init__(self, interval=50):
+        self.interval = interval
+        self.calls = collections.deque()
+        self.latest = {}
+        self.root = None
+        self.posted = 0
+        self.coalesced = 0
+        self.largest_batch = 0
+
+    def post(self, func, key=None):
+        self.posted += 1
+        if key is None:
+            self.calls.append((None, func))
+            return
+        if key in self.latest:
+            self.coalesced += 1
+        self.latest[key] = func
+        self.calls.append((key, None))
+
+    def start(self, scheduler):
+        self.root = scheduler.root
+        scheduler.every(self.interval, self.drain, NORMAL, 'Phidget callbacks')
+
+    # Runs what was posted before the batch started, anything posted meanwhile waits for the next cycle
+    def drain(self):
+        batch = len(self.calls)
+        self.largest_batch = max(self.largest_batch, batch)
+        for i in range(batch):
+            key, func = self.calls.popleft()
+            if key is not None:
+                # The newest callable for the key runs on its first marker, the later markers find nothing
+                func = self.latest.pop(key, None)
+                if func is None:
+                    continue
+            try:
+                func()
+            except Exception:
+                self.root.report_callback_exception(*sys.exc_info())
+
+
+class Task:
+    def __init__(self, func, interval, priority, name, owner):
+        self.func = func
+        self.interval = interval
+        self.priority = priority
+        self.name = name
+        self.owner = owner
+        self.created = time.perf_counter()
+        self.deadline = None
+        self.cancelled = False
+        self.runs = 0
+        self.late_total = 0.0
+        self.late_max = 0.0
+
+
+# Only to be used from the Tk thread, post from other threads through a TkPump
+class Scheduler:
+    def __init__(self, resolution=0.005, budget=0.02):
+        self.resolution = resolution
+        self.budget = budget
+        self.root = None
+        self.heap = []
+        self.order = itertools.count()
+        self.hook = None
+        self.hook_deadline = None
+        self.ticks = 0
+        self.deferred = 0
+        self.replaced = 0
+        self.histogram = [0] * (len(LATENESS_BINS) + 1)
+        # (owner, name) -> newest task
+        self.owned = {}
+
+    # interval in ms like root.after
+    def every(self, interval, func, priority=NORMAL, name=None, owner=None):
+        task = Task(func, interval / 1000.0, priority, name or func.__name__, owner)
+        task.deadline = (math.floor(time.perf_counter() / task.interval) + 1) * task.interval
+        self.push(task)
+        return task
+
+    def after(self, delay, func, priority=NORMAL, name=None, owner=None):
+        task = Task(func, None, priority, name or func.__name__, owner)
+        task.deadline = time.perf_counter() + delay / 1000.0
+        self.push(task)
+        return task
+
+    def cancel(self, task):
+        if task is not None:
+            task.cancelled = True
+
+    def cancel_owner(self, owner):
+        for (task_owner, name), task in self.owned.items():
+            if task_owner == owner:
+                task.cancelled = True
+
+    # steps: (delay in ms counted from the previous step, func)
+    def sequence(self, steps, priority=NORMAL, name='sequence', owner=None):
+        sequence = Sequence(self, steps, priority, name, owner)
+        sequence.next()
+        return sequence
+
+    def push(self, task):
+        if task.owner is not None:
+            previous = self.owned.get((task.owner, task.name))
+            if previous is not None and not previous.cancelled:
+                previous.cancelled = True
+                self.replaced += 1
+            self.owned[(task.owner, task.name)] = task
+        heapq.heappush(self.heap, (task.deadline, task.priority, next(self.order), task))
+        self.arm()
+
+    def start(self, root):
+        self.root = root
+        self.arm()
+
+    # One root.after for the earliest deadline, moved if an earlier task is added
+    def arm(self):
+        if self.root is None:
+            return
+        while self.heap and self.heap[0][3].cancelled:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return
+        deadline = self.heap[0][0]
+        if self.hook is not None:
+            if self.hook_deadline <= deadline:
+                return
+            self.root.after_cancel(self.hook)
+        delay = max(0, int(math.ceil((deadline - time.perf_counter()) * 1000)))
+        self.hook = self.root.after(delay, self.tick)
+        self.hook_deadline = deadline
+
+    def tick(self):
+        self.hook = None
+        self.ticks += 1
+        start = time.perf_counter()
+        due = []
+        while self.heap and self.heap[0][0] <= start + self.resolution:
+            due.append(heapq.heappop(self.heap))
+        due.sort(key=lambda entry: (entry[1], entry[0]))
+        for entry in due:
+            deadline, priority, order, task = entry
+            if task.cancelled:
+                continue
+            now = time.perf_counter()
+            if priority == LOW and now - start > self.budget:
+                self.deferred += 1
+                heapq.heappush(self.heap, entry)
+                continue
+            late = max(0.0, now - deadline)
+            task.runs += 1
+            task.late_total += late
+            task.late_max = max(task.late_max, late)
+            self.histogram[bisect.bisect_left(LATENESS_BINS, late * 1000)] += 1
+            if task.interval is not None:
+                # The next deadline on the grid, a task running more than a period late skips the runs it missed
+                task.deadline = deadline + task.interval * max(1, math.ceil((now - deadline) / task.interval))
+                heapq.heappush(self.heap, (task.deadline, task.priority, next(self.order), task))
+            else:
+                task.cancelled = True
+            try:
+                task.func()
+            except Exception:
+                self.root.report_callback_exception(*sys.exc_info())
+        self.arm()
+
+    def tasks(self):
+        return sorted(set(entry[3] for entry in self.heap if not entry[3].cancelled), key=lambda task: task.name)
+
+    def report(self):
+        lines = ['Scheduler: %d ticks, %d low priority runs deferred' % (self.ticks, self.deferred)]
+        for task in self.tasks():
+            every = '%6d ms' % round(task.interval * 1000) if task.interval is not None else '   once  '
+            mean = task.late_total / task.runs * 1000 if task.runs else 0.0
+            lines.append('  %-30s %s  %7d runs  late mean %6.2f ms  max %7.2f ms'
+                         % (task.name, every, task.runs, mean, task.late_max * 1000))
+        bins = ['<%d' % limit for limit in LATENESS_BINS] + ['>=%d' % LATENESS_BINS[-1]]
+        lines.append('  lateness (ms) ' + '  '.join('%s:%d' % (b, n) for b, n in zip(bins, self.histogram) if n))
+        return '\n'.join(lines)
+
+    # The active tasks grouped by owner, with how often each has actually run since it was started
+    def listing(self):
+        now = time.perf_counter()
+        tasks = self.tasks()
+        lines = ['Scheduled tasks: %d active, %d replaced by a restart' % (len(tasks), self.replaced)]
+        for owner in sorted(set(task.owner or '' for task in tasks)):
+            lines.append('  ' + (owner or 'Shared'))
+            for task in tasks:
+                if (task.owner or '') == owner:
+                    every = 'every %5d ms' % round(task.interval * 1000) if task.interval is not None else 'once         '
+                    lines.append('    %-28s %s  %6.1f runs/s' % (task.name, every, task.runs / (now - task.created)))
+        return '\n'.join(lines)
+
+
+class Sequence:
+    def __init__(self, scheduler, steps, priority, name, owner):
+        self.scheduler = scheduler
+        self.steps = list(steps)
+        self.priority = priority
+        self.name = name
+        self.owner = owner
+        self.step = 0
+        self.task = None
+        self.done = False
+
+    def next(self):
+        if self.step == len(self.steps):
+            self.done = True
+            return
+        delay = self.steps[self.step][0]
+        # Every step has the sequence name, so a new sequence of the same owner and name replaces this one
+        self.task = self.scheduler.after(delay, self.run, self.priority, self.name, self.owner)
+
+    # A step that raises is reported by the scheduler, the remaining steps still run
+    def run(self):
+        func = self.steps[self.step][1]
+        self.step += 1
+        try:
+            func()
+        finally:
+            self.next()
+
+    def cancel(self):
+        self.scheduler.cancel(self.task)
+        self.done = True
+
+
+class LagMonitor:
+    def __init__(self, interval=10, threshold=100):
+        self.interval = interval / 1000.0
+        self.threshold = threshold / 1000.0
+        self.histogram = [0] * (len(LATENESS_BINS) + 1)
+        self.beats = 0
+        self.worst = 0.0
+        self.last_beat = None
+        self.reported_beat = None
+        # innermost line of the Tk thread stack -> [stalls, longest stall (s)]
+        self.stalls = {}
+        self.stall_location = None
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def start(self, scheduler):
+        self.tk_thread = threading.current_thread().ident
+        self.last_beat = time.perf_counter()
+        scheduler.every(self.interval * 1000, self.beat, HIGH, 'lag monitor')
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+        self.thread.start()
+
+    def beat(self):
+        now = time.perf_counter()
+        lag = max(0.0, now - self.last_beat - self.interval)
+        self.last_beat = now
+        self.beats += 1
+        self.worst = max(self.worst, lag)
+        self.histogram[bisect.bisect_left(LATENESS_BINS, lag * 1000)] += 1
+        if self.stall_location is not None:
+            stall = self.stalls[self.stall_location]
+            stall[1] = max(stall[1], lag)
+            print('Event loop stalled for %.0f ms at %s' % (lag * 1000, self.stall_location))
+            self.stall_location = None
+
+    # Watchdog thread, dumps the Tk thread stack once per stall while it is blocked
+    def watch(self):
+        while not self.stopping.wait(self.threshold / 4):
+            last_beat = self.last_beat
+            if time.perf_counter() - last_beat - self.interval < self.threshold or self.reported_beat == last_beat:
+                continue
+            frame = sys._current_frames().get(self.tk_thread)
+            if frame is None:
+                continue
+            self.reported_beat = last_beat
+            stack = traceback.extract_stack(frame)
+            location = '%s:%d in %s' % (stack[-1].filename, stack[-1].lineno, stack[-1].name)
+            self.stalls.setdefault(location, [0, 0.0])[0] += 1
+            self.stall_location = location
+            print('Event loop blocked for more than %.0f ms, Tk thread stack:\n%s'
+                  % (self.threshold * 1000, ''.join(traceback.format_list(stack))))
+
+    def stop(self):
+        self.stopping.set()
+
+    def report(self):
+        bins = ['<%d' % limit for limit in LATENESS_BINS] + ['>=%d' % LATENESS_BINS[-1]]
+        lines = ['Event loop lag: %d beats, worst %.1f ms' % (self.beats, self.worst * 1000),
+                 '  lag (ms) ' + '  '.join('%s:%d' % (b, n) for b, n in zip(bins, self.histogram) if n)]
+        for location, (count, longest) in sorted(self.stalls.items(), key=lambda item: -item[1][0]):
+            lines.append('  %3d stalls, longest %6.0f ms  %s' % (count, longest * 1000, location))
+        return '\n'.join(lines)